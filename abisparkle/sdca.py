@@ -19,6 +19,7 @@
 
 """Entrypoint to the Sparkle object for the Sparkle Detection and Characterization Algorithm (SDCA)"""
 
+import copy
 import importlib
 import time
 
@@ -38,6 +39,7 @@ from abisparkle import (
     sparklemeta,
     sparklenav,
     sparkleparams,
+    sparkleproduct,
     sparklestats,
 )
 
@@ -45,13 +47,30 @@ importlib.reload(sparkleparams)
 
 
 class Sparkle:
-    def __init__(self, c02_nc, c05_nc, c07_nc, c14_nc, water_mask=None, nav=None):
+    def __init__(
+        self,
+        c02_nc,
+        c05_nc,
+        c07_nc,
+        c14_nc,
+        water_mask=None,
+        nav=None,
+        nav_cache=None,
+        backend="window",
+        num_threads=None,
+    ):
         self.c02_nc = c02_nc
         self.c05_nc = c05_nc
         self.c07_nc = c07_nc
         self.c14_nc = c14_nc
         self.water_mask = water_mask
         self.nav = nav
+        self.nav_cache = nav_cache
+        self.backend = backend
+        self.num_threads = num_threads
+
+        # the windowed deviation stage can run on any backend registered in sparklealgo, see sparklealgo.register_backend()
+        self.algo = sparklealgo.get_backend(self.backend, num_threads=self.num_threads)
 
         # sets C02 as the "source" image - all datasets will be resized to the size of C02
         self.source_abi_data = load(self.c02_nc)
@@ -81,9 +100,14 @@ class Sparkle:
 
         if self.nav is None:
             s_time = time.time()
-            self.nav = sparklenav.SparkleNavigation(
-                self.source_abi_data, precise_sun=False
-            )
+            # a sparklenav.NavigationCache reuses the static navigation of fixed sectors between scans
+            if self.nav_cache is not None:
+                self.nav = self.nav_cache.get(self.source_abi_data, precise_sun=False)
+
+            else:
+                self.nav = sparklenav.SparkleNavigation(
+                    self.source_abi_data, precise_sun=False
+                )
             print("setup nav:", time.time() - s_time)
         #############################################################################
         #############################################################################
@@ -124,21 +148,26 @@ class Sparkle:
         #############################################################################
         ###############################run algorithm#################################
         s_time = time.time()
-        self.SDCAMask.validated_mask = sparklealgo.sparkle(
+        self.SDCAMask.packed_validated_mask = self.algo(
             c02_rf=self.c02_image.cmi,
             c05_rf=self.c05_image.cmi,
             c07_rf=self.c07_nirrefl.rf,
             c14_bt=self.c14_image.cmi,
-            validated_mask=self.SDCAMask.validated_mask,
+            validated_mask=self.SDCAMask.packed_validated_mask,
             discard_mask=self.SDCAMask.discard_mask,
-            skip_mask=self.SDCAMask.skip_mask,
-            bad_dqf_mask=self.SDCAMask.bad_dqf_mask,
+            skip_mask=self.SDCAMask.packed_skip_mask,
+            near_bad_dqf_mask=self.SDCAMask.packed_near_bad_dqf_mask,
             algo_params=self.SDCAParams.algo_params,
             algo_flags=self.SDCAFlags,
             algo_stats=self.SDCAStats,
         )
-        self.valid_sparkles = self.SDCAMask.validated_mask
+        # the validated mask is unpacked once as the result of the scene, which the metadata, images and product read
+        self.valid_sparkles = self.SDCAMask.unpack_validated_mask()
         print("sparkle algo:", time.time() - s_time)
+        print(
+            "avoided re-evaluations:",
+            self.SDCAStats.get_counter("avoided_reevaluations"),
+        )
         #############################################################################
         #############################################################################
 
@@ -149,6 +178,7 @@ class Sparkle:
         self.SDCAMeta = sparklemeta.SDCAMeta(self)
         self.SDCAImage = sparkleimage.SDCAImage(self)
         self.SDCADebug = sparkledebug.SDCADebug(self)
+        self.SDCAProduct = sparkleproduct.SDCAProduct(self)
 
         print("algorithm meta:", time.time() - s_time)
 
@@ -157,6 +187,31 @@ class Sparkle:
         #############################################################################
         #############################################################################
 
+    def compare_backends(self, names=None, reference="window"):
+        """
+        Runs the windowed deviation stage of this scene on each backend in names with sparklealgo.compare_backends(),
+        starting from freshly built pre-algorithm masks and flags so the results of this Sparkle object are left unchanged
+        """
+        scene = copy.copy(self)
+        scene.SDCAFlags = sparkleflags.SDCAFlags(self.source_shape)
+        scene_mask = sparklemask.SDCAMask(scene)
+
+        return sparklealgo.compare_backends(
+            c02_rf=self.c02_image.cmi,
+            c05_rf=self.c05_image.cmi,
+            c07_rf=self.c07_nirrefl.rf,
+            c14_bt=self.c14_image.cmi,
+            validated_mask=scene_mask.packed_validated_mask,
+            discard_mask=scene_mask.discard_mask,
+            skip_mask=scene_mask.packed_skip_mask,
+            near_bad_dqf_mask=scene_mask.packed_near_bad_dqf_mask,
+            algo_params=self.SDCAParams.algo_params,
+            algo_flags=scene.SDCAFlags,
+            names=names,
+            reference=reference,
+            num_threads=self.num_threads,
+        )
+
     def check_daylit_land_portion(self):
         """This is meant to quickly test whether enough of an image is "daylit land" to be worth running the full algorithm on"""
 
@@ -19,10 +19,31 @@
 
 """Windowed deviation detection algorithm"""
 
+import functools
+import time
+
+import numba
 import numpy as np
 from heregoes.util import njit, window_slice
 from numba.core import types as ntypes
 
+from abisparkle import sparklebits, sparkleflags, sparklestats, sparklewindow
+
+
+# outcomes of evaluating a candidate pixel in the windowed deviation stage
+outcome_invalidated_by_window_sizing = 0
+outcome_not_validated = 1
+outcome_validated = 2
+outcome_unchanged = 3
+
+# sparkle validation tests of the windowed deviation stage, which are also their bits in the unevaluated_tests debug statistic
+test_c02_rf_deviation = 0
+test_c05_rf_deviation = 1
+test_c07_rf_deviation = 2
+test_c14_bt_deviation = 3
+test_c14_bt_standard_deviation = 4
+num_tests = 5
+
 
 @njit.heregoes_njit_noparallel
 def sparkle(
@@ -33,170 +54,1213 @@ def sparkle(
     validated_mask,
     discard_mask,
     skip_mask,
-    bad_dqf_mask,
+    near_bad_dqf_mask,
     algo_params,
     algo_flags,
     algo_stats,
+    window_tables=None,
 ):
-    def validate(idx):
-        # when we find a valid sparkle pixel:
-        validated_mask[idx] = True  # mark as valid
-        skip_mask[idx] = True  # remove from the iteration loop
-        discard_mask[
-            idx
-        ] = True  # remove from the statistical background of other sparkles
+    invalidate_dqf_neighbors(near_bad_dqf_mask, skip_mask, algo_flags)
 
-    def invalidate(idx):
-        # when we find an invalid pixel that shouldn't be considered again:
-        skip_mask[idx] = True  # remove from the iteration loop
+    max_radius = np.int64(
+        algo_params["first_window_radius"] * algo_params["max_window_radius_iter"]
+    )
+
+    # every candidate is evaluated on the first pass
+    dirty_mask = np.ones(discard_mask.shape, dtype=np.bool_)
 
     algo_passes = 1
     while algo_passes <= algo_params["max_algo_passes"]:
         # loop over every pixel marked "False" in skip_mask
-        for idx in np.argwhere(~skip_mask):
-            idx = tuple((ntypes.int64(idx[0]), ntypes.int64(idx[1])))
+        candidates = sparklebits.mask_not(skip_mask).nonzero()
 
-            algo_flags.set_flag(
-                idx,
-                algo_flags.algo_flag_def["flag_offset_algo_passes"] + algo_passes,
-            )
+        # determine the appropriate size of every background window at once based on clean proportions of discard_mask
+        window_sizing = window_sizer_bulk(
+            discard_mask,
+            candidates,
+            first_radius=algo_params["first_window_radius"],
+            max_window_iter=algo_params["max_window_radius_iter"],
+            min_window_clean_proportion_threshold=algo_params[
+                "min_window_clean_proportion_threshold"
+            ],
+        )
 
-            # skip pixels that are within exclude_dqf_radius of a bad DQF
-            bad_dqf_window = window_slice(
-                bad_dqf_mask,
-                idx,
-                outer_radius=algo_params["exclude_dqf_radius"],
-                replace_inner=False,
+        # the order of the sparkle validation tests for this pass
+        order = test_order(algo_params, algo_stats)
+
+        # pixels validated during this pass, which change the windows of the candidates that follow them
+        validations = np.empty((candidates.shape[0], 2), dtype=np.int64)
+        num_validations = 0
+        num_avoided = 0
+
+        for candidate in range(candidates.shape[0]):
+            idx = (
+                ntypes.int64(candidates[candidate, 0]),
+                ntypes.int64(candidates[candidate, 1]),
             )
-            if bad_dqf_window.any():
-                invalidate(idx)
+
+            if not dirty_mask[idx] and not validated_nearby(
+                idx, validations, num_validations, max_radius
+            ):
+                # the window is unchanged since the previous pass, so the previous result and statistics still stand
                 algo_flags.set_flag(
                     idx,
-                    algo_flags.algo_flag_def["pixel_invalidated_by_dqf_neighbor"],
+                    algo_flags.algo_flag_def["flag_offset_algo_passes"] + algo_passes,
+                )
+                algo_stats.set_value(
+                    algo_stats.row(idx), sparklestats.algo_passes_column, algo_passes
                 )
+                num_avoided += 1
                 continue
 
-            # determine the appropriate size of the background window based on clean proportions of discard_mask
-            (
-                window_valid,
-                window_radius,
-                window_iter,
-                window_valid_proportion,
-            ) = window_sizer(
+            result = evaluate(
+                c02_rf,
+                c05_rf,
+                c07_rf,
+                c14_bt,
                 discard_mask,
                 idx,
-                first_radius=algo_params["first_window_radius"],
-                max_window_iter=algo_params["max_window_radius_iter"],
-                min_window_clean_proportion_threshold=algo_params[
-                    "min_window_clean_proportion_threshold"
-                ],
+                candidate_window(
+                    discard_mask,
+                    idx,
+                    candidate,
+                    window_sizing,
+                    validations,
+                    num_validations,
+                    algo_params,
+                ),
+                algo_params,
+                order,
+                window_tables=window_tables,
             )
-            algo_flags.set_flag(
+            record(
                 idx,
-                algo_flags.algo_flag_def["flag_offset_window_iterations"]
-                + np.int64(window_iter),
+                algo_passes,
+                result,
+                validated_mask,
+                discard_mask,
+                skip_mask,
+                algo_flags,
+                algo_stats,
+                window_tables=window_tables,
             )
 
-            algo_stats.set_debug(idx, "algo_passes", algo_passes)
-            algo_stats.set_debug(idx, "window_radius", window_radius)
-            algo_stats.set_debug(idx, "window_iterations", window_iter)
-            algo_stats.set_debug(
-                idx, "window_valid_proportion", window_valid_proportion
-            )
+            if result[0] == outcome_validated:
+                validations[num_validations, 0] = idx[0]
+                validations[num_validations, 1] = idx[1]
+                num_validations += 1
 
-            # skip pixels where we couldn't get a clean window
-            if not window_valid:
-                # the clean window proportion will never increase on subsequent passes, so invalidate this pixel
-                invalidate(idx)
-                algo_flags.set_flag(
-                    idx,
-                    algo_flags.algo_flag_def["pixel_invalidated_by_window_sizing"],
-                )
-                continue
+        algo_stats.add_counter("avoided_reevaluations", num_avoided)
 
-            # take windows of each image and discard validated and invalidated pixels from the statistical background
-            discard_mask_window = window_slice(
-                discard_mask, idx, outer_radius=window_radius, replace_inner=True
+        # only candidates whose windows overlap pixels validated on this pass can have a different background on the next
+        if algo_params["reuse_unchanged_windows"] != 0:
+            dirty_mask = validated_neighborhood(
+                discard_mask.shape, validations, num_validations, max_radius
             )
 
-            c02_rf_window = window_slice(
-                c02_rf, idx, outer_radius=window_radius, replace_inner=True
-            )
-            c02_rf_window.ravel()[np.nonzero(discard_mask_window.ravel())] = np.nan
+        algo_passes += 1
 
-            c05_rf_window = window_slice(
-                c05_rf, idx, outer_radius=window_radius, replace_inner=True
-            )
-            c05_rf_window.ravel()[np.nonzero(discard_mask_window.ravel())] = np.nan
+        # do not do another pass if nothing was found in the first place
+        if validated_mask.count() == 0:
+            break
 
-            c07_rf_window = window_slice(
-                c07_rf, idx, outer_radius=window_radius, replace_inner=True
-            )
-            c07_rf_window.ravel()[np.nonzero(discard_mask_window.ravel())] = np.nan
+    return validated_mask
 
-            c14_bt_window = window_slice(
-                c14_bt, idx, outer_radius=window_radius, replace_inner=True
-            )
-            c14_bt_window.ravel()[np.nonzero(discard_mask_window.ravel())] = np.nan
 
-            # record the window statistics
-            algo_stats.set_deviation(
-                idx, "c02_rf_deviation", c02_rf[idx] - np.nanmean(c02_rf_window)
-            )
-            algo_stats.set_deviation(
-                idx, "c05_rf_deviation", c05_rf[idx] - np.nanmean(c05_rf_window)
-            )
-            algo_stats.set_deviation(
-                idx, "c07_rf_deviation", c07_rf[idx] - np.nanmean(c07_rf_window)
+@njit.heregoes_njit_noparallel
+def invalidate_dqf_neighbors(near_bad_dqf_mask, skip_mask, algo_flags):
+    """
+    Invalidates every candidate pixel that is within exclude_dqf_radius of a bad DQF before the first pass.
+    near_bad_dqf_mask is a PackedMask, so only its set pixels are visited.
+    These pixels are never considered again, so they are flagged as considered on the first pass only.
+    """
+    for i in near_bad_dqf_mask.nonzero():
+        idx = (i[0], i[1])
+        if skip_mask.get(idx):
+            continue
+
+        algo_flags.set_flag(
+            idx,
+            algo_flags.algo_flag_def["flag_offset_algo_passes"] + 1,
+        )
+        algo_flags.set_flag(
+            idx,
+            algo_flags.algo_flag_def["pixel_invalidated_by_dqf_neighbor"],
+        )
+
+        # remove from the iteration loop
+        skip_mask.set(idx, True)
+
+
+@njit.heregoes_njit_noparallel
+def candidate_window(
+    discard_mask,
+    idx,
+    candidate,
+    window_sizing,
+    validations,
+    num_validations,
+    algo_params,
+):
+    """
+    Returns the window sizing of a candidate pixel from the arrays of window_sizer_bulk(), which were sized at the start of the pass.
+    If a pixel within the largest window of idx has been validated since then, the window is sized again against the current discard_mask
+    """
+    max_radius = np.int64(
+        algo_params["first_window_radius"] * algo_params["max_window_radius_iter"]
+    )
+    if validated_nearby(idx, validations, num_validations, max_radius):
+        return window_sizer(
+            discard_mask,
+            idx,
+            first_radius=algo_params["first_window_radius"],
+            max_window_iter=algo_params["max_window_radius_iter"],
+            min_window_clean_proportion_threshold=algo_params[
+                "min_window_clean_proportion_threshold"
+            ],
+        )
+
+    return (
+        window_sizing[0][candidate],
+        window_sizing[1][candidate],
+        window_sizing[2][candidate],
+        window_sizing[3][candidate],
+    )
+
+
+@njit.heregoes_njit_noparallel
+def validated_nearby(idx, validations, num_validations, radius):
+    # validations are in raster order, so search back only as far as the rows within radius
+    for i in range(num_validations - 1, -1, -1):
+        if validations[i, 0] < idx[0] - radius:
+            break
+        if abs(validations[i, 1] - idx[1]) <= radius:
+            return True
+
+    return False
+
+
+@njit.heregoes_njit_noparallel
+def validated_neighborhood(shape, validations, num_validations, radius):
+    """Returns a mask of every pixel within radius of the first num_validations indices in validations"""
+    neighborhood_mask = np.zeros(shape, dtype=np.bool_)
+    for i in range(num_validations):
+        neighborhood_mask[
+            max(validations[i, 0] - radius, 0) : validations[i, 0] + radius + 1,
+            max(validations[i, 1] - radius, 0) : validations[i, 1] + radius + 1,
+        ] = True
+
+    return neighborhood_mask
+
+
+@njit.heregoes_njit_noparallel
+def test_name(test):
+    if test == test_c02_rf_deviation:
+        return "c02_rf_deviation"
+    elif test == test_c05_rf_deviation:
+        return "c05_rf_deviation"
+    elif test == test_c07_rf_deviation:
+        return "c07_rf_deviation"
+    elif test == test_c14_bt_deviation:
+        return "c14_bt_deviation"
+    else:
+        return "c14_bt_standard_deviation"
+
+
+@njit.heregoes_njit_noparallel
+def test_passed(test, window_stats, algo_params):
+    # window statistics are compared at the float32 precision they are recorded with
+    if test == test_c14_bt_standard_deviation:
+        return (
+            np.float32(window_stats[7])
+            <= algo_params["c14_bt_standard_deviation_max_threshold"]
+        )
+
+    return (
+        np.float32(window_stats[test]) > algo_params[test_name(test) + "_min_threshold"]
+    )
+
+
+@njit.heregoes_njit_noparallel
+def test_order(algo_params, algo_stats):
+    """
+    Returns the order to evaluate the sparkle validation tests in, set by the *_test_order parameters.
+    With learn_test_order, tests that have rejected the largest proportion of the candidates they evaluated so far in the scene are moved first
+    """
+    configured_order = np.empty(num_tests, dtype=np.float64)
+    for test in range(num_tests):
+        configured_order[test] = algo_params[test_name(test) + "_test_order"]
+    order = np.argsort(configured_order, kind="mergesort")
+
+    if algo_params["learn_test_order"] == 0:
+        return order
+
+    rejection_rates = np.zeros(num_tests, dtype=np.float64)
+    for i in range(num_tests):
+        evaluations = algo_stats.test_counts[
+            order[i], sparklestats.test_evaluations_column
+        ]
+        if evaluations > 0:
+            rejection_rates[i] = (
+                algo_stats.test_counts[order[i], sparklestats.test_rejections_column]
+                / evaluations
             )
-            algo_stats.set_deviation(
-                idx, "c14_bt_deviation", c14_bt[idx] - np.nanmean(c14_bt_window)
+
+    # ties keep the configured order
+    return order[np.argsort(-rejection_rates, kind="mergesort")]
+
+
+@njit.heregoes_njit_noparallel
+def evaluate(
+    c02_rf,
+    c05_rf,
+    c07_rf,
+    c14_bt,
+    discard_mask,
+    idx,
+    window_sizing,
+    algo_params,
+    order,
+    window_tables=None,
+):
+    """
+    Evaluates a candidate pixel against the current discard_mask without changing any masks, flags or statistics.
+    window_sizing is the result of window_sizer() for the candidate, usually taken from candidate_window(), and order is the result of test_order().
+    The statistics of each band are only taken once a test needs them, and evaluation stops at the first failed test unless full_window_statistics is set.
+    Returns the outcome along with the window sizing and statistics that led to it, and bitfields of the tests that were evaluated and failed, to be applied with record()
+    """
+    (
+        window_valid,
+        window_radius,
+        window_iter,
+        window_valid_proportion,
+    ) = window_sizing
+
+    # deviations and standard deviations of each band, left as nan for bands that are never needed
+    window_stats = np.full(8, np.nan, dtype=np.float64)
+
+    # skip pixels where we couldn't get a clean window
+    if not window_valid:
+        return (
+            outcome_invalidated_by_window_sizing,
+            np.float64(window_radius),
+            np.int64(window_iter),
+            np.float64(window_valid_proportion),
+            (
+                window_stats[0],
+                window_stats[1],
+                window_stats[2],
+                window_stats[3],
+                window_stats[4],
+                window_stats[5],
+                window_stats[6],
+                window_stats[7],
+            ),
+            np.int64(0),
+            np.int64(0),
+        )
+
+    full_window_statistics = algo_params["full_window_statistics"] != 0
+    if full_window_statistics:
+        # take the statistics of each image's window with validated and invalidated pixels discarded from the background
+        if window_tables is None:
+            (
+                c02_rf_mean,
+                c05_rf_mean,
+                c07_rf_mean,
+                c14_bt_mean,
+                c02_rf_stdev,
+                c05_rf_stdev,
+                c07_rf_stdev,
+                c14_bt_stdev,
+            ) = window_statistics(
+                c02_rf, c05_rf, c07_rf, c14_bt, discard_mask, idx, window_radius
             )
+        else:
+            (
+                c02_rf_mean,
+                c05_rf_mean,
+                c07_rf_mean,
+                c14_bt_mean,
+                c02_rf_stdev,
+                c05_rf_stdev,
+                c07_rf_stdev,
+                c14_bt_stdev,
+            ) = window_tables.window_statistics(idx, window_radius)
 
-            # record the window statistics
-            algo_stats.set_deviation(idx, "c02_rf_stdev", np.nanstd(c02_rf_window))
-            algo_stats.set_deviation(idx, "c05_rf_stdev", np.nanstd(c05_rf_window))
-            algo_stats.set_deviation(idx, "c07_rf_stdev", np.nanstd(c07_rf_window))
-            algo_stats.set_deviation(idx, "c14_bt_stdev", np.nanstd(c14_bt_window))
+        window_stats[0] = c02_rf[idx] - c02_rf_mean
+        window_stats[1] = c05_rf[idx] - c05_rf_mean
+        window_stats[2] = c07_rf[idx] - c07_rf_mean
+        window_stats[3] = c14_bt[idx] - c14_bt_mean
+        window_stats[4] = c02_rf_stdev
+        window_stats[5] = c05_rf_stdev
+        window_stats[6] = c07_rf_stdev
+        window_stats[7] = c14_bt_stdev
 
-            # sparkle validation parameters based on window statistics
-            if (
-                (
-                    algo_stats.get_deviation(idx, "c02_rf_deviation")
-                    > algo_params["c02_rf_deviation_min_threshold"]
-                )
-                and (
-                    algo_stats.get_deviation(idx, "c05_rf_deviation")
-                    > algo_params["c05_rf_deviation_min_threshold"]
+    outcome = outcome_validated
+    tests_evaluated = np.int64(0)
+    tests_failed = np.int64(0)
+    for test in order:
+        # the standard deviation test uses the C14 BT band statistics
+        band = min(test, 3)
+        if np.isnan(window_stats[4 + band]) and not full_window_statistics:
+            if window_tables is None:
+                band_value, band_mean, band_stdev = band_window_statistics(
+                    band,
+                    c02_rf,
+                    c05_rf,
+                    c07_rf,
+                    c14_bt,
+                    discard_mask,
+                    idx,
+                    window_radius,
                 )
-                and (
-                    algo_stats.get_deviation(idx, "c07_rf_deviation")
-                    > algo_params["c07_rf_deviation_min_threshold"]
+            else:
+                band_value = window_tables._band(band)[idx]
+                band_mean, band_stdev = window_tables.band_statistics(
+                    band, idx, window_radius
                 )
-                and (
-                    algo_stats.get_deviation(idx, "c14_bt_deviation")
-                    > algo_params["c14_bt_deviation_min_threshold"]
+
+            window_stats[band] = band_value - band_mean
+            window_stats[4 + band] = band_stdev
+
+        tests_evaluated |= np.int64(1) << test
+        if not test_passed(test, window_stats, algo_params):
+            outcome = outcome_not_validated
+            tests_failed |= np.int64(1) << test
+            if not full_window_statistics:
+                break
+
+    return (
+        outcome,
+        np.float64(window_radius),
+        np.int64(window_iter),
+        np.float64(window_valid_proportion),
+        (
+            window_stats[0],
+            window_stats[1],
+            window_stats[2],
+            window_stats[3],
+            window_stats[4],
+            window_stats[5],
+            window_stats[6],
+            window_stats[7],
+        ),
+        tests_evaluated,
+        tests_failed,
+    )
+
+
+@njit.heregoes_njit_noparallel
+def record(
+    idx,
+    algo_passes,
+    result,
+    validated_mask,
+    discard_mask,
+    skip_mask,
+    algo_flags,
+    algo_stats,
+    window_tables=None,
+):
+    """Applies the result of evaluate() for a candidate pixel to the masks, flags and statistics"""
+    (
+        outcome,
+        window_radius,
+        window_iter,
+        window_valid_proportion,
+        (
+            c02_rf_deviation,
+            c05_rf_deviation,
+            c07_rf_deviation,
+            c14_bt_deviation,
+            c02_rf_stdev,
+            c05_rf_stdev,
+            c07_rf_stdev,
+            c14_bt_stdev,
+        ),
+        tests_evaluated,
+        tests_failed,
+    ) = result
+
+    algo_flags.set_flag(
+        idx,
+        algo_flags.algo_flag_def["flag_offset_algo_passes"] + algo_passes,
+    )
+
+    algo_flags.set_flag(
+        idx,
+        algo_flags.algo_flag_def["flag_offset_window_iterations"]
+        + np.int64(window_iter),
+    )
+
+    row = algo_stats.row(idx)
+    algo_stats.set_value(row, sparklestats.algo_passes_column, algo_passes)
+    algo_stats.set_value(row, sparklestats.window_radius_column, window_radius)
+    algo_stats.set_value(row, sparklestats.window_iterations_column, window_iter)
+    algo_stats.set_value(
+        row, sparklestats.window_valid_proportion_column, window_valid_proportion
+    )
+    algo_stats.set_value(
+        row,
+        sparklestats.unevaluated_tests_column,
+        ((np.int64(1) << num_tests) - 1) & ~tests_evaluated,
+    )
+
+    # rejection rates of each test for test_order()
+    algo_stats.add_test_counts(tests_evaluated, tests_failed)
+
+    # record the window statistics of the bands that were evaluated, and clear those left from an earlier pass for the bands that were not
+    record_band_stats(
+        algo_stats,
+        row,
+        tests_evaluated & (np.int64(1) << test_c02_rf_deviation),
+        sparklestats.c02_rf_deviation_column,
+        c02_rf_deviation,
+        sparklestats.c02_rf_stdev_column,
+        c02_rf_stdev,
+    )
+    record_band_stats(
+        algo_stats,
+        row,
+        tests_evaluated & (np.int64(1) << test_c05_rf_deviation),
+        sparklestats.c05_rf_deviation_column,
+        c05_rf_deviation,
+        sparklestats.c05_rf_stdev_column,
+        c05_rf_stdev,
+    )
+    record_band_stats(
+        algo_stats,
+        row,
+        tests_evaluated & (np.int64(1) << test_c07_rf_deviation),
+        sparklestats.c07_rf_deviation_column,
+        c07_rf_deviation,
+        sparklestats.c07_rf_stdev_column,
+        c07_rf_stdev,
+    )
+    record_band_stats(
+        algo_stats,
+        row,
+        tests_evaluated
+        & (
+            (np.int64(1) << test_c14_bt_deviation)
+            | (np.int64(1) << test_c14_bt_standard_deviation)
+        ),
+        sparklestats.c14_bt_deviation_column,
+        c14_bt_deviation,
+        sparklestats.c14_bt_stdev_column,
+        c14_bt_stdev,
+    )
+
+    if outcome == outcome_invalidated_by_window_sizing:
+        # the clean window proportion will never increase on subsequent passes, so invalidate this pixel
+        skip_mask.set(idx, True)  # remove from the iteration loop
+        algo_flags.set_flag(
+            idx,
+            algo_flags.algo_flag_def["pixel_invalidated_by_window_sizing"],
+        )
+        return
+
+    if outcome == outcome_validated:
+        # when we find a valid sparkle pixel:
+        validated_mask.set(idx, True)  # mark as valid
+        skip_mask.set(idx, True)  # remove from the iteration loop
+        discard_mask[
+            idx
+        ] = True  # remove from the statistical background of other sparkles
+        if window_tables is not None:
+            window_tables.discard(idx)  # keep the summed-area tables in step
+        algo_flags.set_flag(
+            idx,
+            algo_flags.algo_flag_def["pixel_validated_by_window_deviation"],
+        )
+
+
+@njit.heregoes_njit_noparallel
+def record_band_stats(
+    algo_stats, row, evaluated, deviation_column, deviation, stdev_column, stdev
+):
+    if evaluated:
+        algo_stats.set_value(row, deviation_column, deviation)
+        algo_stats.set_value(row, stdev_column, stdev)
+    else:
+        algo_stats.clear_value(row, deviation_column)
+        algo_stats.clear_value(row, stdev_column)
+
+
+def sparkle_sat(
+    c02_rf,
+    c05_rf,
+    c07_rf,
+    c14_bt,
+    validated_mask,
+    discard_mask,
+    skip_mask,
+    near_bad_dqf_mask,
+    algo_params,
+    algo_flags,
+    algo_stats,
+):
+    """
+    Runs the windowed deviation detection algorithm with window statistics taken from summed-area tables of each image.
+    Each candidate's window mean and standard deviation are found in constant time regardless of the window radius.
+    """
+    window_tables = sparklewindow.SDCAWindowTables(
+        np.ascontiguousarray(c02_rf, dtype=np.float32),
+        np.ascontiguousarray(c05_rf, dtype=np.float32),
+        np.ascontiguousarray(c07_rf, dtype=np.float32),
+        np.ascontiguousarray(c14_bt, dtype=np.float32),
+        discard_mask,
+        int(algo_params["first_window_radius"] * algo_params["max_window_radius_iter"]),
+        int(algo_params["window_table_advance_rows"]),
+    )
+
+    return sparkle(
+        c02_rf=c02_rf,
+        c05_rf=c05_rf,
+        c07_rf=c07_rf,
+        c14_bt=c14_bt,
+        validated_mask=validated_mask,
+        discard_mask=discard_mask,
+        skip_mask=skip_mask,
+        near_bad_dqf_mask=near_bad_dqf_mask,
+        algo_params=algo_params,
+        algo_flags=algo_flags,
+        algo_stats=algo_stats,
+        window_tables=window_tables,
+    )
+
+
+def set_num_threads(num_threads):
+    """
+    Sets the number of threads used by parallel numba code to num_threads, clamped to the NUMBA_NUM_THREADS that numba was started with,
+    and returns the previous number so that it can be restored. The number of threads is left unchanged if num_threads is None
+    """
+    previous_num_threads = numba.get_num_threads()
+    if num_threads is not None:
+        numba.set_num_threads(
+            max(1, min(int(num_threads), numba.config.NUMBA_NUM_THREADS))
+        )
+
+    return previous_num_threads
+
+
+def sparkle_tiled(
+    c02_rf,
+    c05_rf,
+    c07_rf,
+    c14_bt,
+    validated_mask,
+    discard_mask,
+    skip_mask,
+    near_bad_dqf_mask,
+    algo_params,
+    algo_flags,
+    algo_stats,
+    num_threads=None,
+    tile_size=256,
+):
+    """
+    Runs the windowed deviation detection algorithm with candidate pixels split into tiles that are evaluated on separate threads.
+    Each tile is evaluated against its own copy of discard_mask with a halo as wide as the largest window, then the tile results are
+    reconciled in raster order so that the masks, flags and statistics are identical to sparkle().
+    Threads are only used when heregoes is set up for parallel execution with HEREGOES_ENV_PARALLEL, and num_threads sets the number used for this run.
+    """
+    previous_num_threads = set_num_threads(num_threads)
+
+    try:
+        return _sparkle_tiled(
+            c02_rf,
+            c05_rf,
+            c07_rf,
+            c14_bt,
+            validated_mask,
+            discard_mask,
+            skip_mask,
+            near_bad_dqf_mask,
+            algo_params,
+            algo_flags,
+            algo_stats,
+            tile_size,
+        )
+
+    finally:
+        numba.set_num_threads(previous_num_threads)
+
+
+@njit.heregoes_njit
+def _sparkle_tiled(
+    c02_rf,
+    c05_rf,
+    c07_rf,
+    c14_bt,
+    validated_mask,
+    discard_mask,
+    skip_mask,
+    near_bad_dqf_mask,
+    algo_params,
+    algo_flags,
+    algo_stats,
+    tile_size,
+):
+    # every window a candidate pixel can read fits within this many pixels of it
+    halo = np.int64(
+        algo_params["first_window_radius"] * algo_params["max_window_radius_iter"]
+    )
+    tiles_y = (discard_mask.shape[0] + tile_size - 1) // tile_size
+    tiles_x = (discard_mask.shape[1] + tile_size - 1) // tile_size
+    num_tiles = tiles_y * tiles_x
+
+    invalidate_dqf_neighbors(near_bad_dqf_mask, skip_mask, algo_flags)
+
+    # every candidate is evaluated on the first pass
+    dirty_mask = np.ones(discard_mask.shape, dtype=np.bool_)
+
+    algo_passes = 1
+    while algo_passes <= algo_params["max_algo_passes"]:
+        candidates = sparklebits.mask_not(skip_mask).nonzero()
+        num_candidates = candidates.shape[0]
+
+        # group the raster-ordered candidates by tile, keeping them in raster order within each tile
+        candidate_tiles = (candidates[:, 0] // tile_size) * tiles_x + (
+            candidates[:, 1] // tile_size
+        )
+        tile_order = np.argsort(candidate_tiles, kind="mergesort")
+        tile_bounds = np.searchsorted(
+            candidate_tiles[tile_order], np.arange(num_tiles + 1)
+        )
+
+        window_sizing = window_sizer_bulk(
+            discard_mask,
+            candidates,
+            first_radius=algo_params["first_window_radius"],
+            max_window_iter=algo_params["max_window_radius_iter"],
+            min_window_clean_proportion_threshold=algo_params[
+                "min_window_clean_proportion_threshold"
+            ],
+        )
+
+        # the order of the sparkle validation tests for this pass
+        order = test_order(algo_params, algo_stats)
+
+        outcomes = np.empty(num_candidates, dtype=np.int64)
+        window_radii = np.empty(num_candidates, dtype=np.float64)
+        window_iters = np.empty(num_candidates, dtype=np.int64)
+        window_valid_proportions = np.empty(num_candidates, dtype=np.float64)
+        window_stats = np.empty((num_candidates, 8), dtype=np.float64)
+        tests_evaluated = np.empty(num_candidates, dtype=np.int64)
+        tests_failed = np.empty(num_candidates, dtype=np.int64)
+
+        for tile in numba.prange(num_tiles):
+            if tile_bounds[tile] == tile_bounds[tile + 1]:
+                continue
+
+            # each tile sees discard_mask as it was at the start of the pass plus its own validations
+            y0 = max((tile // tiles_x) * tile_size - halo, 0)
+            y1 = min((tile // tiles_x + 1) * tile_size + halo, discard_mask.shape[0])
+            x0 = max((tile % tiles_x) * tile_size - halo, 0)
+            x1 = min((tile % tiles_x + 1) * tile_size + halo, discard_mask.shape[1])
+            tile_discard_mask = discard_mask[y0:y1, x0:x1].copy()
+            tile_validations = np.empty(
+                (tile_bounds[tile + 1] - tile_bounds[tile], 2), dtype=np.int64
+            )
+            num_tile_validations = 0
+
+            for i in range(tile_bounds[tile], tile_bounds[tile + 1]):
+                candidate = tile_order[i]
+                tile_idx = (
+                    candidates[candidate, 0] - y0,
+                    candidates[candidate, 1] - x0,
                 )
-                and (
-                    algo_stats.get_deviation(idx, "c14_bt_stdev")
-                    <= algo_params["c14_bt_standard_deviation_max_threshold"]
+
+                if not dirty_mask[
+                    candidates[candidate, 0], candidates[candidate, 1]
+                ] and not validated_nearby(
+                    tile_idx, tile_validations, num_tile_validations, halo
+                ):
+                    outcomes[candidate] = outcome_unchanged
+                    continue
+
+                result = evaluate(
+                    c02_rf[y0:y1, x0:x1],
+                    c05_rf[y0:y1, x0:x1],
+                    c07_rf[y0:y1, x0:x1],
+                    c14_bt[y0:y1, x0:x1],
+                    tile_discard_mask,
+                    tile_idx,
+                    candidate_window(
+                        tile_discard_mask,
+                        tile_idx,
+                        candidate,
+                        window_sizing,
+                        tile_validations,
+                        num_tile_validations,
+                        algo_params,
+                    ),
+                    algo_params,
+                    order,
                 )
+                outcomes[candidate] = result[0]
+                window_radii[candidate] = result[1]
+                window_iters[candidate] = result[2]
+                window_valid_proportions[candidate] = result[3]
+                for j in range(8):
+                    window_stats[candidate, j] = result[4][j]
+                tests_evaluated[candidate] = result[5]
+                tests_failed[candidate] = result[6]
+
+                if result[0] == outcome_validated:
+                    tile_discard_mask[tile_idx] = True
+                    tile_validations[num_tile_validations, 0] = tile_idx[0]
+                    tile_validations[num_tile_validations, 1] = tile_idx[1]
+                    num_tile_validations += 1
+
+        # reconcile the tiles in raster order. A tile's result for a candidate pixel is kept unless a pixel within the halo was validated
+        # by another tile, or had its result changed by this reconciliation, before the candidate was reached
+        validations = np.empty((num_candidates, 3), dtype=np.int64)
+        num_validations = 0
+        changes = np.empty((num_candidates, 3), dtype=np.int64)
+        num_changes = 0
+        num_avoided = 0
+
+        for candidate in range(num_candidates):
+            idx = (candidates[candidate, 0], candidates[candidate, 1])
+            tile = candidate_tiles[candidate]
+
+            if _tile_result_stale(
+                idx, tile, validations, num_validations, changes, num_changes, halo
             ):
-                validate(idx)
+                tile_validated = outcomes[candidate] == outcome_validated
+
+                if not dirty_mask[idx] and not validated_nearby(
+                    idx, validations, num_validations, halo
+                ):
+                    outcomes[candidate] = outcome_unchanged
+
+                else:
+                    result = evaluate(
+                        c02_rf,
+                        c05_rf,
+                        c07_rf,
+                        c14_bt,
+                        discard_mask,
+                        idx,
+                        candidate_window(
+                            discard_mask,
+                            idx,
+                            candidate,
+                            window_sizing,
+                            validations,
+                            num_validations,
+                            algo_params,
+                        ),
+                        algo_params,
+                        order,
+                    )
+                    outcomes[candidate] = result[0]
+                    window_radii[candidate] = result[1]
+                    window_iters[candidate] = result[2]
+                    window_valid_proportions[candidate] = result[3]
+                    for j in range(8):
+                        window_stats[candidate, j] = result[4][j]
+                    tests_evaluated[candidate] = result[5]
+                    tests_failed[candidate] = result[6]
+
+                if (outcomes[candidate] == outcome_validated) != tile_validated:
+                    changes[num_changes, 0] = idx[0]
+                    changes[num_changes, 1] = idx[1]
+                    changes[num_changes, 2] = tile
+                    num_changes += 1
+
+            if outcomes[candidate] == outcome_unchanged:
+                # the window is unchanged since the previous pass, so the previous result and statistics still stand
                 algo_flags.set_flag(
                     idx,
-                    algo_flags.algo_flag_def["pixel_validated_by_window_deviation"],
+                    algo_flags.algo_flag_def["flag_offset_algo_passes"] + algo_passes,
+                )
+                algo_stats.set_value(
+                    algo_stats.row(idx), sparklestats.algo_passes_column, algo_passes
                 )
+                num_avoided += 1
+                continue
+
+            result = (
+                outcomes[candidate],
+                window_radii[candidate],
+                window_iters[candidate],
+                window_valid_proportions[candidate],
+                (
+                    window_stats[candidate, 0],
+                    window_stats[candidate, 1],
+                    window_stats[candidate, 2],
+                    window_stats[candidate, 3],
+                    window_stats[candidate, 4],
+                    window_stats[candidate, 5],
+                    window_stats[candidate, 6],
+                    window_stats[candidate, 7],
+                ),
+                tests_evaluated[candidate],
+                tests_failed[candidate],
+            )
+            record(
+                idx,
+                algo_passes,
+                result,
+                validated_mask,
+                discard_mask,
+                skip_mask,
+                algo_flags,
+                algo_stats,
+            )
+
+            if result[0] == outcome_validated:
+                validations[num_validations, 0] = idx[0]
+                validations[num_validations, 1] = idx[1]
+                validations[num_validations, 2] = tile
+                num_validations += 1
+
+        algo_stats.add_counter("avoided_reevaluations", num_avoided)
+
+        # only candidates whose windows overlap pixels validated on this pass can have a different background on the next
+        if algo_params["reuse_unchanged_windows"] != 0:
+            dirty_mask = validated_neighborhood(
+                discard_mask.shape, validations, num_validations, halo
+            )
 
         algo_passes += 1
 
         # do not do another pass if nothing was found in the first place
-        if np.count_nonzero(validated_mask) == 0:
+        if validated_mask.count() == 0:
+            break
+
+    return validated_mask
+
+
+@njit.heregoes_njit_noparallel
+def _tile_result_stale(
+    idx, tile, validations, num_validations, changes, num_changes, halo
+):
+    # both lists are in raster order, so search back only as far as the rows within the halo
+    for i in range(num_validations - 1, -1, -1):
+        if validations[i, 0] < idx[0] - halo:
+            break
+        if abs(validations[i, 1] - idx[1]) <= halo and validations[i, 2] != tile:
+            return True
+
+    for i in range(num_changes - 1, -1, -1):
+        if changes[i, 0] < idx[0] - halo:
+            break
+        if abs(changes[i, 1] - idx[1]) <= halo and changes[i, 2] == tile:
+            return True
+
+    return False
+
+
+def sparkle_frozen(
+    c02_rf,
+    c05_rf,
+    c07_rf,
+    c14_bt,
+    validated_mask,
+    discard_mask,
+    skip_mask,
+    near_bad_dqf_mask,
+    algo_params,
+    algo_flags,
+    algo_stats,
+    num_threads=None,
+):
+    """
+    Runs the windowed deviation detection algorithm with every candidate pixel in a pass evaluated against discard_mask as it was at the start of the pass.
+    The validations of a pass are applied together once it is finished, and passes repeat until one validates nothing or max_frozen_algo_passes is reached, which is limited to the number of pixel_considered_on_*_pass flags.
+    Results do not depend on the order of the candidates, so they can differ from sparkle() where validated pixels share a background window.
+    Threads are only used when heregoes is set up for parallel execution with HEREGOES_ENV_PARALLEL, and num_threads sets the number used for this run.
+    """
+    previous_num_threads = set_num_threads(num_threads)
+
+    try:
+        return _sparkle_frozen(
+            c02_rf,
+            c05_rf,
+            c07_rf,
+            c14_bt,
+            validated_mask,
+            discard_mask,
+            skip_mask,
+            near_bad_dqf_mask,
+            algo_params,
+            algo_flags,
+            algo_stats,
+        )
+
+    finally:
+        numba.set_num_threads(previous_num_threads)
+
+
+@njit.heregoes_njit
+def _sparkle_frozen(
+    c02_rf,
+    c05_rf,
+    c07_rf,
+    c14_bt,
+    validated_mask,
+    discard_mask,
+    skip_mask,
+    near_bad_dqf_mask,
+    algo_params,
+    algo_flags,
+    algo_stats,
+):
+    max_radius = np.int64(
+        algo_params["first_window_radius"] * algo_params["max_window_radius_iter"]
+    )
+
+    invalidate_dqf_neighbors(near_bad_dqf_mask, skip_mask, algo_flags)
+
+    # every candidate is evaluated on the first pass
+    dirty_mask = np.ones(discard_mask.shape, dtype=np.bool_)
+
+    # each pass is recorded with its own flag, so there can be no more passes than there are pass flags
+    max_passes = min(
+        np.int64(algo_params["max_frozen_algo_passes"]),
+        algo_flags.num_algo_pass_flags(),
+    )
+
+    algo_passes = 1
+    while algo_passes <= max_passes:
+        candidates = sparklebits.mask_not(skip_mask).nonzero()
+        num_candidates = candidates.shape[0]
+
+        window_sizing = window_sizer_bulk(
+            discard_mask,
+            candidates,
+            first_radius=algo_params["first_window_radius"],
+            max_window_iter=algo_params["max_window_radius_iter"],
+            min_window_clean_proportion_threshold=algo_params[
+                "min_window_clean_proportion_threshold"
+            ],
+        )
+
+        # the order of the sparkle validation tests for this pass
+        order = test_order(algo_params, algo_stats)
+
+        outcomes = np.empty(num_candidates, dtype=np.int64)
+        window_radii = np.empty(num_candidates, dtype=np.float64)
+        window_iters = np.empty(num_candidates, dtype=np.int64)
+        window_valid_proportions = np.empty(num_candidates, dtype=np.float64)
+        window_stats = np.empty((num_candidates, 8), dtype=np.float64)
+        tests_evaluated = np.empty(num_candidates, dtype=np.int64)
+        tests_failed = np.empty(num_candidates, dtype=np.int64)
+
+        # discard_mask is not changed until every candidate has been evaluated, so they are independent of each other
+        for candidate in numba.prange(num_candidates):
+            idx = (candidates[candidate, 0], candidates[candidate, 1])
+
+            if not dirty_mask[idx]:
+                outcomes[candidate] = outcome_unchanged
+                continue
+
+            result = evaluate(
+                c02_rf,
+                c05_rf,
+                c07_rf,
+                c14_bt,
+                discard_mask,
+                idx,
+                (
+                    window_sizing[0][candidate],
+                    window_sizing[1][candidate],
+                    window_sizing[2][candidate],
+                    window_sizing[3][candidate],
+                ),
+                algo_params,
+                order,
+            )
+            outcomes[candidate] = result[0]
+            window_radii[candidate] = result[1]
+            window_iters[candidate] = result[2]
+            window_valid_proportions[candidate] = result[3]
+            for j in range(8):
+                window_stats[candidate, j] = result[4][j]
+            tests_evaluated[candidate] = result[5]
+            tests_failed[candidate] = result[6]
+
+        # apply the results of the pass together
+        validations = np.empty((num_candidates, 2), dtype=np.int64)
+        num_validations = 0
+        num_avoided = 0
+
+        for candidate in range(num_candidates):
+            idx = (candidates[candidate, 0], candidates[candidate, 1])
+
+            if outcomes[candidate] == outcome_unchanged:
+                # the window is unchanged since the previous pass, so the previous result and statistics still stand
+                algo_flags.set_flag(
+                    idx,
+                    algo_flags.algo_flag_def["flag_offset_algo_passes"] + algo_passes,
+                )
+                algo_stats.set_value(
+                    algo_stats.row(idx), sparklestats.algo_passes_column, algo_passes
+                )
+                num_avoided += 1
+                continue
+
+            record(
+                idx,
+                algo_passes,
+                (
+                    outcomes[candidate],
+                    window_radii[candidate],
+                    window_iters[candidate],
+                    window_valid_proportions[candidate],
+                    (
+                        window_stats[candidate, 0],
+                        window_stats[candidate, 1],
+                        window_stats[candidate, 2],
+                        window_stats[candidate, 3],
+                        window_stats[candidate, 4],
+                        window_stats[candidate, 5],
+                        window_stats[candidate, 6],
+                        window_stats[candidate, 7],
+                    ),
+                    tests_evaluated[candidate],
+                    tests_failed[candidate],
+                ),
+                validated_mask,
+                discard_mask,
+                skip_mask,
+                algo_flags,
+                algo_stats,
+            )
+
+            if outcomes[candidate] == outcome_validated:
+                validations[num_validations, 0] = idx[0]
+                validations[num_validations, 1] = idx[1]
+                num_validations += 1
+
+        algo_stats.add_counter("avoided_reevaluations", num_avoided)
+
+        algo_passes += 1
+
+        # a pass without validations leaves discard_mask unchanged, so every following pass would have the same results
+        if num_validations == 0:
             break
 
+        if algo_params["reuse_unchanged_windows"] != 0:
+            dirty_mask = validated_neighborhood(
+                discard_mask.shape, validations, num_validations, max_radius
+            )
+
     return validated_mask
 
 
+@njit.heregoes_njit_noparallel
+def window_statistics(c02_rf, c05_rf, c07_rf, c14_bt, discard_mask, idx, window_radius):
+    """
+    Returns the mean and standard deviation of each image in the window of window_radius around idx,
+    excluding idx and pixels in discard_mask.
+    All four images are accumulated together in a single traversal of the window without copying it
+    """
+    radius = np.int64(window_radius)
+    y_min = max(idx[0] - radius, 0)
+    y_max = min(idx[0] + radius + 1, discard_mask.shape[0])
+    x_min = max(idx[1] - radius, 0)
+    x_max = min(idx[1] + radius + 1, discard_mask.shape[1])
+
+    c02_rf_acc = (0, 0.0, 0.0)
+    c05_rf_acc = (0, 0.0, 0.0)
+    c07_rf_acc = (0, 0.0, 0.0)
+    c14_bt_acc = (0, 0.0, 0.0)
+
+    for y in range(y_min, y_max):
+        for x in range(x_min, x_max):
+            # the center pixel is never part of its own statistical background
+            if discard_mask[y, x] or (y == idx[0] and x == idx[1]):
+                continue
+
+            c02_rf_acc = welford_update(c02_rf_acc, c02_rf[y, x])
+            c05_rf_acc = welford_update(c05_rf_acc, c05_rf[y, x])
+            c07_rf_acc = welford_update(c07_rf_acc, c07_rf[y, x])
+            c14_bt_acc = welford_update(c14_bt_acc, c14_bt[y, x])
+
+    c02_rf_mean, c02_rf_stdev = welford_finalize(c02_rf_acc)
+    c05_rf_mean, c05_rf_stdev = welford_finalize(c05_rf_acc)
+    c07_rf_mean, c07_rf_stdev = welford_finalize(c07_rf_acc)
+    c14_bt_mean, c14_bt_stdev = welford_finalize(c14_bt_acc)
+
+    return (
+        c02_rf_mean,
+        c05_rf_mean,
+        c07_rf_mean,
+        c14_bt_mean,
+        c02_rf_stdev,
+        c05_rf_stdev,
+        c07_rf_stdev,
+        c14_bt_stdev,
+    )
+
+
+@njit.heregoes_njit_noparallel
+def band_window_statistics(
+    band, c02_rf, c05_rf, c07_rf, c14_bt, discard_mask, idx, window_radius
+):
+    """
+    Returns the value of idx and the mean and standard deviation of the window of window_radius around idx for one image,
+    where band is 0 to 3 for C02 RF, C05 RF, C07 RF and C14 BT
+    """
+    if band == 0:
+        arr = c02_rf
+    elif band == 1:
+        arr = c05_rf
+    elif band == 2:
+        arr = c07_rf
+    else:
+        arr = c14_bt
+
+    radius = np.int64(window_radius)
+    y_min = max(idx[0] - radius, 0)
+    y_max = min(idx[0] + radius + 1, discard_mask.shape[0])
+    x_min = max(idx[1] - radius, 0)
+    x_max = min(idx[1] + radius + 1, discard_mask.shape[1])
+
+    acc = (0, 0.0, 0.0)
+    for y in range(y_min, y_max):
+        for x in range(x_min, x_max):
+            if discard_mask[y, x] or (y == idx[0] and x == idx[1]):
+                continue
+
+            acc = welford_update(acc, arr[y, x])
+
+    mean, stdev = welford_finalize(acc)
+
+    return arr[idx], mean, stdev
+
+
+@njit.heregoes_njit_noparallel
+def welford_update(acc, value):
+    # adds a value to a running (count, mean, sum of squared differences from the mean), ignoring nans
+    count, mean, m2 = acc
+    if np.isnan(value):
+        return acc
+
+    count += 1
+    delta = np.float64(value) - mean
+    mean += delta / count
+    m2 += delta * (np.float64(value) - mean)
+
+    return count, mean, m2
+
+
+@njit.heregoes_njit_noparallel
+def welford_finalize(acc):
+    # returns the mean and population standard deviation of a running accumulation, matching np.nanmean and np.nanstd
+    count, mean, m2 = acc
+    if count == 0:
+        return np.nan, np.nan
+
+    return mean, np.sqrt(m2 / count)
+
+
 @njit.heregoes_njit_noparallel
 def window_sizer(
     arr,
@@ -227,3 +1291,231 @@ def window_sizer(
     # invalidate the window if we exceed max_window_iter iterations without getting a clean window
     window_valid = False
     return window_valid, window_radius, window_iter, window_valid_proportion
+
+
+@njit.heregoes_njit_noparallel
+def window_sizer_bulk(
+    arr,
+    candidates,
+    first_radius=15,
+    max_window_iter=3,
+    min_window_clean_proportion_threshold=0.75,
+    strip_rows=512,
+):
+    """
+    Sizes the windows of every candidate index at once with the same rules as window_sizer(), counting the True pixels of arr in each window from a cumulative count table.
+    candidates must be in raster order as returned by np.argwhere(). The table only covers strip_rows rows plus the largest window at a time to bound its memory on full disk scenes.
+    Returns arrays of window_valid, window_radius, window_iter and window_valid_proportion with one element per candidate
+    """
+    num_candidates = candidates.shape[0]
+    window_valid = np.zeros(num_candidates, dtype=np.bool_)
+    window_radius = np.empty(num_candidates, dtype=np.float64)
+    window_iter = np.empty(num_candidates, dtype=np.int64)
+    window_valid_proportion = np.zeros(num_candidates, dtype=np.float64)
+
+    max_radius = np.int64(first_radius * max_window_iter)
+    counts = np.zeros(
+        (min(strip_rows + 2 * max_radius, arr.shape[0]) + 1, arr.shape[1] + 1),
+        dtype=np.int32,
+    )
+    y0 = 0
+    y1 = 0
+
+    for candidate in range(num_candidates):
+        y = candidates[candidate, 0]
+        x = candidates[candidate, 1]
+
+        # move the count table down the image once the largest window runs past it
+        if max(y - max_radius, 0) < y0 or min(y + max_radius + 1, arr.shape[0]) > y1:
+            y0 = max(y - max_radius, 0)
+            y1 = min(y0 + counts.shape[0] - 1, arr.shape[0])
+            for row in range(y0, y1):
+                row_count = 0
+                for col in range(arr.shape[1]):
+                    if arr[row, col]:
+                        row_count += 1
+                    counts[row - y0 + 1, col + 1] = (
+                        counts[row - y0, col + 1] + row_count
+                    )
+
+        # the center pixel is never part of its own window
+        center_clean = 0 if arr[y, x] else 1
+
+        window_iter[candidate] = 1
+        while window_iter[candidate] <= max_window_iter:
+            window_radius[candidate] = first_radius * window_iter[candidate]
+            radius = np.int64(window_radius[candidate])
+
+            # windows that are cut off by the edge of the image are never valid
+            if (
+                y - radius >= 0
+                and y + radius + 1 <= arr.shape[0]
+                and x - radius >= 0
+                and x + radius + 1 <= arr.shape[1]
+            ):
+                r0 = y - radius - y0
+                r1 = y + radius + 1 - y0
+                window_size = (2 * radius + 1) ** 2
+                window_count = (
+                    counts[r1, x + radius + 1]
+                    - counts[r0, x + radius + 1]
+                    - counts[r1, x - radius]
+                    + counts[r0, x - radius]
+                )
+                window_valid_proportion[candidate] = (
+                    window_size - window_count - center_clean
+                ) / window_size
+
+                if (
+                    window_valid_proportion[candidate]
+                    > min_window_clean_proportion_threshold
+                ):
+                    window_valid[candidate] = True
+                    break
+
+            window_iter[candidate] += 1
+
+    return window_valid, window_radius, window_iter, window_valid_proportion
+
+
+# windowed deviation backends that Sparkle can select by name, with whether each one takes num_threads
+backends = {}
+
+
+def register_backend(name, algo, threaded=False):
+    """
+    Registers algo as a windowed deviation backend that Sparkle can select with backend=name.
+    algo takes the same arguments as sparkle(), except window_tables, and returns validated_mask. validated_mask, skip_mask and near_bad_dqf_mask are PackedMasks
+    and discard_mask is a boolean array. Threaded backends also take num_threads
+    """
+    backends[name] = (algo, threaded)
+
+
+def get_backend(name, num_threads=None):
+    if name not in backends:
+        raise Exception("Unknown algorithm backend " + str(name))
+
+    algo, threaded = backends[name]
+    if threaded:
+        return functools.partial(algo, num_threads=num_threads)
+
+    return algo
+
+
+register_backend("window", sparkle)
+register_backend("sat", sparkle_sat)
+register_backend("tiled", sparkle_tiled, threaded=True)
+register_backend("frozen", sparkle_frozen, threaded=True)
+
+
+def compare_backends(
+    c02_rf,
+    c05_rf,
+    c07_rf,
+    c14_bt,
+    validated_mask,
+    discard_mask,
+    skip_mask,
+    near_bad_dqf_mask,
+    algo_params,
+    algo_flags,
+    names=None,
+    reference="window",
+    num_threads=None,
+):
+    """
+    Runs each backend in names (every registered backend by default) on its own copy of the masks and flags from before the windowed deviation stage,
+    then compares the validated masks, flags and statistics of each backend with those of the reference backend.
+    Prints and returns a report of the run time and number of differing pixels for each backend. Each backend is run once beforehand so that
+    its time does not include JIT compilation, and the time of that first run is reported as compile_time
+    """
+    if names is None:
+        names = list(backends.keys())
+    if reference not in names:
+        names = [reference] + list(names)
+
+    def run(name):
+        run_flags = sparkleflags.SDCAFlags(algo_flags.algo_flags.shape)
+        run_flags.algo_flags[:] = algo_flags.algo_flags
+        run_stats = sparklestats.SDCAStats()
+
+        s_time = time.time()
+        run_validated_mask = get_backend(name, num_threads=num_threads)(
+            c02_rf=c02_rf,
+            c05_rf=c05_rf,
+            c07_rf=c07_rf,
+            c14_bt=c14_bt,
+            validated_mask=sparklebits.mask_copy(validated_mask),
+            discard_mask=discard_mask.copy(),
+            skip_mask=sparklebits.mask_copy(skip_mask),
+            near_bad_dqf_mask=near_bad_dqf_mask,
+            algo_params=algo_params,
+            algo_flags=run_flags,
+            algo_stats=run_stats,
+        )
+        return time.time() - s_time, run_validated_mask, run_flags, run_stats
+
+    runs = {}
+    compile_times = {}
+    for name in names:
+        # the first run of a backend includes its JIT compilation, so it is timed separately from the run that is compared
+        compile_times[name] = run(name)[0]
+        runs[name] = run(name)
+
+    _, reference_validated_mask, reference_flags, reference_stats = runs[reference]
+
+    reference_coords, reference_table, reference_assigned = reference_stats.export()
+    reference_pixels = (
+        reference_coords[:, 0] * validated_mask.shape[1] + reference_coords[:, 1]
+    )
+
+    report = {}
+    for name, (run_time, run_validated_mask, run_flags, run_stats) in runs.items():
+        # match the rows of the statistics tables by pixel, counting pixels with statistics in only one run as differences
+        coords, table, assigned = run_stats.export()
+        pixels = coords[:, 0] * validated_mask.shape[1] + coords[:, 1]
+        _, rows, reference_rows = np.intersect1d(
+            pixels, reference_pixels, assume_unique=True, return_indices=True
+        )
+        stats_differences = (
+            pixels.shape[0] + reference_pixels.shape[0] - 2 * rows.shape[0]
+        ) + np.count_nonzero(
+            (assigned[rows] != reference_assigned[reference_rows])
+            | ~np.isclose(
+                table[rows], reference_table[reference_rows], rtol=1e-5, equal_nan=True
+            ).all(axis=1)
+        )
+
+        report[name] = {
+            "time": run_time,
+            "compile_time": compile_times[name],
+            "validated_mask_differences": sparklebits.mask_xor(
+                run_validated_mask, reference_validated_mask
+            ).count(),
+            "algo_flags_differences": np.count_nonzero(
+                run_flags.algo_flags != reference_flags.algo_flags
+            ),
+            "stats_differences": stats_differences,
+        }
+        report[name]["equivalent"] = (
+            report[name]["validated_mask_differences"]
+            == report[name]["algo_flags_differences"]
+            == report[name]["stats_differences"]
+            == 0
+        )
+
+        print(
+            name + ":",
+            "time:",
+            report[name]["time"],
+            "| first run time:",
+            report[name]["compile_time"],
+            "| validated mask differences:",
+            report[name]["validated_mask_differences"],
+            "| flag differences:",
+            report[name]["algo_flags_differences"],
+            "| statistics differences:",
+            report[name]["stats_differences"],
+        )
+
+    return report
@@ -0,0 +1,192 @@
+# Copyright (c) 2021-2023.
+
+# Author(s):
+
+#   Harry Dove-Robinson <admin@wx-star.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Bit-packed boolean masks that store 8 pixels per byte for full disk scenes"""
+
+import numba
+import numpy as np
+from heregoes.util import njit
+from numba.core import types as ntypes
+from numba.experimental import jitclass
+
+# number of set bits in each byte value
+popcounts = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+spec = [
+    ("shape", ntypes.UniTuple(ntypes.int64, 2)),
+    ("bits", ntypes.uint8[:, ::1]),
+]
+
+
+@jitclass(spec)
+class PackedMask:
+    def __init__(self, shape, bits):
+        # each row is packed separately with x // 8 as the byte and x % 8 as the bit, so rows can be written by separate threads
+        self.shape = (np.int64(shape[0]), np.int64(shape[1]))
+        self.bits = bits
+
+    def get(self, idx):
+        return (self.bits[idx[0], idx[1] >> 3] >> (idx[1] & 7)) & 1 == 1
+
+    def set(self, idx, value):
+        if value:
+            self.bits[idx[0], idx[1] >> 3] |= np.uint8(1 << (idx[1] & 7))
+        else:
+            self.bits[idx[0], idx[1] >> 3] &= np.uint8(~(1 << (idx[1] & 7)) & 0xFF)
+
+    def count(self):
+        total = 0
+        for y in range(self.bits.shape[0]):
+            for i in range(self.bits.shape[1]):
+                total += popcounts[self.bits[y, i]]
+
+        return total
+
+    def window_count(self, idx, radius):
+        # number of set pixels in the window of radius around idx, cut off at the edges of the mask
+        y_min = max(idx[0] - radius, 0)
+        y_max = min(idx[0] + radius + 1, self.shape[0])
+        x_min = max(idx[1] - radius, 0)
+        x_max = min(idx[1] + radius + 1, self.shape[1])
+
+        total = 0
+        for y in range(y_min, y_max):
+            x = x_min
+            while x < x_max:
+                if x & 7 == 0 and x + 8 <= x_max:
+                    # count whole bytes at a time
+                    total += popcounts[self.bits[y, x >> 3]]
+                    x += 8
+                else:
+                    total += (self.bits[y, x >> 3] >> (x & 7)) & 1
+                    x += 1
+
+        return total
+
+    def nonzero(self):
+        # indices of the set pixels in raster order, as returned by np.argwhere()
+        idx = np.empty((self.count(), 2), dtype=np.int64)
+        n = 0
+        for y in range(self.bits.shape[0]):
+            for i in range(self.bits.shape[1]):
+                byte = self.bits[y, i]
+                if byte == 0:
+                    continue
+
+                for bit in range(8):
+                    if (byte >> bit) & 1:
+                        idx[n, 0] = y
+                        idx[n, 1] = 8 * i + bit
+                        n += 1
+
+        return idx
+
+    def unpack(self):
+        return unpack_bits(self.bits, self.shape)
+
+
+# new masks are built outside of the class, since a @jitclass cannot construct itself within its own methods
+@njit.heregoes_njit_noparallel
+def mask_copy(mask):
+    return PackedMask(mask.shape, mask.bits.copy())
+
+
+@njit.heregoes_njit_noparallel
+def mask_or(mask, other):
+    return PackedMask(mask.shape, mask.bits | other.bits)
+
+
+@njit.heregoes_njit_noparallel
+def mask_and(mask, other):
+    return PackedMask(mask.shape, mask.bits & other.bits)
+
+
+@njit.heregoes_njit_noparallel
+def mask_xor(mask, other):
+    return PackedMask(mask.shape, mask.bits ^ other.bits)
+
+
+@njit.heregoes_njit_noparallel
+def mask_not(mask):
+    bits = ~mask.bits
+
+    # keep the padding bits past the last column of each row clear
+    if mask.shape[1] & 7 != 0:
+        bits[:, -1] &= np.uint8((1 << (mask.shape[1] & 7)) - 1)
+
+    return PackedMask(mask.shape, bits)
+
+
+@njit.heregoes_njit
+def dilate(mask, radius):
+    """
+    Returns a PackedMask of the pixels within radius of a set pixel of mask along both axes,
+    as a square maximum filter of size 2 * radius + 1 would find, without unpacking mask
+    """
+    num_rows, num_bytes = mask.bits.shape
+
+    # dilate each row by one pixel at a time, carrying bits across the bytes of the row
+    row_bits = np.empty_like(mask.bits)
+    for y in numba.prange(num_rows):
+        row = mask.bits[y].copy()
+        for _ in range(radius):
+            last = row.copy()
+            for i in range(num_bytes):
+                byte = last[i] | ((last[i] << 1) & 0xFF) | (last[i] >> 1)
+                if i > 0:
+                    byte |= last[i - 1] >> 7
+                if i < num_bytes - 1:
+                    byte |= (last[i + 1] & 1) << 7
+                row[i] = np.uint8(byte)
+
+        # keep the padding bits past the last column of the row clear
+        if mask.shape[1] & 7 != 0:
+            row[-1] &= np.uint8((1 << (mask.shape[1] & 7)) - 1)
+
+        row_bits[y] = row
+
+    # then combine the dilated rows within radius of each row
+    bits = np.zeros_like(mask.bits)
+    for y in numba.prange(num_rows):
+        for other in range(max(y - radius, 0), min(y + radius + 1, num_rows)):
+            bits[y] |= row_bits[other]
+
+    return PackedMask(mask.shape, bits)
+
+
+@njit.heregoes_njit
+def pack(arr):
+    """Returns a PackedMask of the boolean array arr"""
+    bits = np.zeros((arr.shape[0], (arr.shape[1] + 7) // 8), dtype=np.uint8)
+    for y in numba.prange(arr.shape[0]):
+        for x in range(arr.shape[1]):
+            if arr[y, x]:
+                bits[y, x >> 3] |= np.uint8(1 << (x & 7))
+
+    return PackedMask(arr.shape, bits)
+
+
+@njit.heregoes_njit
+def unpack_bits(bits, shape):
+    arr = np.empty(shape, dtype=np.bool_)
+    for y in numba.prange(shape[0]):
+        for x in range(shape[1]):
+            arr[y, x] = (bits[y, x >> 3] >> (x & 7)) & 1 == 1
+
+    return arr
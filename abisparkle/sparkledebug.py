@@ -19,11 +19,32 @@
 
 """Debug tool for evaluating algorithm decisions by pixel index"""
 
+import numpy as np
+
+from abisparkle import sparklealgo
+
 
 class SDCADebug:
     def __init__(self, sparkle):
         self.sparkle = sparkle
 
+    def max_algo_passes(self):
+        # the frozen background backend repeats passes until it reaches a fixed point
+        if self.sparkle.backend == "frozen":
+            return min(
+                self.sparkle.SDCAParams.algo_params["max_frozen_algo_passes"],
+                self.sparkle.SDCAFlags.num_algo_pass_flags(),
+            )
+
+        return self.sparkle.SDCAParams.algo_params["max_algo_passes"]
+
+    def unevaluated_test(self, idx, test):
+        # sparkle validation tests after the first failed test are not evaluated unless full_window_statistics is set
+        unevaluated_tests = int(
+            self.sparkle.SDCAStats.get_debug(idx, "unevaluated_tests", 0.0)
+        )
+        return unevaluated_tests & (1 << test) != 0
+
     def idx_debug(self, idx):
         deviation_default = 999.0
         debug_default = 0.0
@@ -95,7 +116,9 @@ class SDCADebug:
             idx, "c02_rf_deviation", deviation_default
         )
         print("C02 RF deviation:", c02_rf_deviation, end="")
-        if c02_rf_deviation != deviation_default:
+        if self.unevaluated_test(idx, sparklealgo.test_c02_rf_deviation):
+            print(" | NOT EVALUATED")
+        elif c02_rf_deviation != deviation_default:
             if (
                 c02_rf_deviation
                 > self.sparkle.SDCAParams.algo_params["c02_rf_deviation_min_threshold"]
@@ -110,7 +133,9 @@ class SDCADebug:
             idx, "c05_rf_deviation", deviation_default
         )
         print("C05 RF deviation:", c05_rf_deviation, end="")
-        if c05_rf_deviation != deviation_default:
+        if self.unevaluated_test(idx, sparklealgo.test_c05_rf_deviation):
+            print(" | NOT EVALUATED")
+        elif c05_rf_deviation != deviation_default:
             if (
                 c05_rf_deviation
                 > self.sparkle.SDCAParams.algo_params["c05_rf_deviation_min_threshold"]
@@ -125,7 +150,9 @@ class SDCADebug:
             idx, "c07_rf_deviation", deviation_default
         )
         print("C07 RF deviation:", c07_rf_deviation, end="")
-        if c07_rf_deviation != deviation_default:
+        if self.unevaluated_test(idx, sparklealgo.test_c07_rf_deviation):
+            print(" | NOT EVALUATED")
+        elif c07_rf_deviation != deviation_default:
             if (
                 c07_rf_deviation
                 > self.sparkle.SDCAParams.algo_params["c07_rf_deviation_min_threshold"]
@@ -140,7 +167,9 @@ class SDCADebug:
             idx, "c14_bt_deviation", deviation_default
         )
         print("C14 BT deviation:", c14_bt_deviation, end="")
-        if c14_bt_deviation != deviation_default:
+        if self.unevaluated_test(idx, sparklealgo.test_c14_bt_deviation):
+            print(" | NOT EVALUATED")
+        elif c14_bt_deviation != deviation_default:
             if (
                 c14_bt_deviation
                 > self.sparkle.SDCAParams.algo_params["c14_bt_deviation_min_threshold"]
@@ -203,7 +232,9 @@ class SDCADebug:
             idx, "c14_bt_stdev", deviation_default
         )
         print("C14 BT stdev:", c14_bt_stdev, end="")
-        if c14_bt_stdev != deviation_default:
+        if self.unevaluated_test(idx, sparklealgo.test_c14_bt_standard_deviation):
+            print(" | NOT EVALUATED")
+        elif c14_bt_stdev != deviation_default:
             if (
                 c14_bt_stdev
                 <= self.sparkle.SDCAParams.algo_params[
@@ -236,7 +267,7 @@ class SDCADebug:
         )
         print("Algorithm passes:", algo_passes, end="")
         if algo_passes != debug_default:
-            if algo_passes <= self.sparkle.SDCAParams.algo_params["max_algo_passes"]:
+            if algo_passes <= self.max_algo_passes():
                 print(" | VALID")
             else:
                 print(" | FAIL")
@@ -294,3 +325,53 @@ class SDCADebug:
                 print(" | FAIL")
         else:
             print(" | N/A")
+
+    def backend_comparison(self, other):
+        """
+        Compares the sparkle pixels found in this scene with those found by another Sparkle object for the same scene, usually run with a different backend.
+        Prints and returns a report of how many sparkle pixels each found, and how many they disagree on
+        """
+        valid_sparkles = self.sparkle.valid_sparkles
+        other_valid_sparkles = other.valid_sparkles
+
+        if valid_sparkles.shape != other_valid_sparkles.shape:
+            raise Exception("Cannot compare Sparkle objects of different scenes")
+
+        # candidate pixels are those that reached the windowed deviation stage in either run
+        first_pass_flag = self.sparkle.SDCAFlags.algo_flag_def[
+            "pixel_considered_on_first_pass"
+        ]
+        candidates = self.sparkle.SDCAFlags.has_flag(
+            self.sparkle.SDCAFlags.algo_flags, first_pass_flag
+        ) | other.SDCAFlags.has_flag(other.SDCAFlags.algo_flags, first_pass_flag)
+        num_candidates = np.count_nonzero(candidates)
+
+        report = {
+            "backend": self.sparkle.backend,
+            "other_backend": other.backend,
+            "num_candidates": num_candidates,
+            "num_sparkle_pixels": np.count_nonzero(valid_sparkles),
+            "other_num_sparkle_pixels": np.count_nonzero(other_valid_sparkles),
+            "num_agreed": np.count_nonzero(valid_sparkles & other_valid_sparkles),
+            "num_only_backend": np.count_nonzero(
+                valid_sparkles & ~other_valid_sparkles
+            ),
+            "num_only_other_backend": np.count_nonzero(
+                ~valid_sparkles & other_valid_sparkles
+            ),
+        }
+        report["num_differing"] = (
+            report["num_only_backend"] + report["num_only_other_backend"]
+        )
+        report["differing_proportion_of_candidates"] = (
+            report["num_differing"] / num_candidates if num_candidates > 0 else 0.0
+        )
+
+        print("---------------------")
+        print("Backend comparison:", report["backend"], "|", report["other_backend"])
+        print("---------------------")
+        print("")
+        for key, value in report.items():
+            print(key + ":", value)
+
+        return report
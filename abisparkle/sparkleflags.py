@@ -19,11 +19,70 @@
 
 """Stores algorithm decisions per pixel index in an int64 bitfield"""
 
+import numba
 import numpy as np
+from heregoes.util import njit
 from numba.core import types as ntypes
 from numba.experimental import jitclass
 from numba.typed import Dict as ndict
 
+# whole-array flag operations on an int64 bitfield raster, usable from Numba kernels or plain Python on SDCAFlags.algo_flags
+
+
+@njit.heregoes_njit
+def set_flag_mask(bitfield, arr, flag):
+    """Sets flag in bitfield for every True pixel in arr"""
+    bit = np.int64(1) << np.int64(flag)
+    for y in numba.prange(bitfield.shape[0]):
+        for x in range(bitfield.shape[1]):
+            if arr[y, x]:
+                bitfield[y, x] |= bit
+
+
+@njit.heregoes_njit
+def clear_flag_mask(bitfield, arr, flag):
+    """Clears flag in bitfield for every True pixel in arr"""
+    bit = ~(np.int64(1) << np.int64(flag))
+    for y in numba.prange(bitfield.shape[0]):
+        for x in range(bitfield.shape[1]):
+            if arr[y, x]:
+                bitfield[y, x] &= bit
+
+
+@njit.heregoes_njit
+def flags_bits(flags):
+    # combines a sequence of flag values into one bitfield
+    bits = np.int64(0)
+    for flag in flags:
+        bits |= np.int64(1) << np.int64(flag)
+
+    return bits
+
+
+@njit.heregoes_njit
+def any_flags_mask(bitfield, flags):
+    """Returns a boolean raster of the pixels in bitfield that have any of flags"""
+    bits = flags_bits(flags)
+    mask = np.empty(bitfield.shape, dtype=np.bool_)
+    for y in numba.prange(bitfield.shape[0]):
+        for x in range(bitfield.shape[1]):
+            mask[y, x] = bitfield[y, x] & bits != 0
+
+    return mask
+
+
+@njit.heregoes_njit
+def all_flags_mask(bitfield, flags):
+    """Returns a boolean raster of the pixels in bitfield that have all of flags"""
+    bits = flags_bits(flags)
+    mask = np.empty(bitfield.shape, dtype=np.bool_)
+    for y in numba.prange(bitfield.shape[0]):
+        for x in range(bitfield.shape[1]):
+            mask[y, x] = bitfield[y, x] & bits == bits
+
+    return mask
+
+
 kv_ty = (ntypes.unicode_type, ntypes.int64)
 spec = [("algo_flag_def", ntypes.DictType(*kv_ty)), ("algo_flags", ntypes.int64[:, :])]
 
@@ -72,6 +131,13 @@ class SDCAFlags:
         self.algo_flag_def["flag_offset_algo_passes"] = ntypes.int64(30)
         self.algo_flag_def["pixel_considered_on_first_pass"] = ntypes.int64(31)
         self.algo_flag_def["pixel_considered_on_second_pass"] = ntypes.int64(32)
+        self.algo_flag_def["pixel_considered_on_third_pass"] = ntypes.int64(33)
+        self.algo_flag_def["pixel_considered_on_fourth_pass"] = ntypes.int64(34)
+        self.algo_flag_def["pixel_considered_on_fifth_pass"] = ntypes.int64(35)
+        self.algo_flag_def["pixel_considered_on_sixth_pass"] = ntypes.int64(36)
+        self.algo_flag_def["pixel_considered_on_seventh_pass"] = ntypes.int64(37)
+        self.algo_flag_def["pixel_considered_on_eighth_pass"] = ntypes.int64(38)
+        self.algo_flag_def["pixel_considered_on_ninth_pass"] = ntypes.int64(39)
 
         self.algo_flag_def["flag_offset_window_iterations"] = ntypes.int64(40)
         self.algo_flag_def["pixel_had_1_window_iterations"] = ntypes.int64(41)
@@ -92,15 +158,28 @@ class SDCAFlags:
     def set_flag(self, idx, flag):
         self.algo_flags[idx] |= np.int64(1) << np.int64(flag)
 
+    def clear_flag(self, idx, flag):
+        self.algo_flags[idx] &= ~(np.int64(1) << np.int64(flag))
+
     def set_mask_flag(self, arr, flag):
         # sets True pixels in arr with the provided flag value
-        for idx in np.argwhere(arr):
-            idx = tuple((idx[0], idx[1]))
-            self.set_flag(idx, flag)
+        set_flag_mask(self.algo_flags, arr, flag)
+
+    def clear_mask_flag(self, arr, flag):
+        # clears the provided flag value from True pixels in arr
+        clear_flag_mask(self.algo_flags, arr, flag)
 
     def has_flag(self, bitfield, flag):
         return bitfield | np.int64(1) << np.int64(flag) == bitfield
 
+    def has_any_flag(self, flags):
+        # returns a boolean raster of pixels that have any of the provided flag values
+        return any_flags_mask(self.algo_flags, flags)
+
+    def has_all_flags(self, flags):
+        # returns a boolean raster of pixels that have all of the provided flag values
+        return all_flags_mask(self.algo_flags, flags)
+
     def bitfield_decode(self, bitfield):
         flag_dict = {}
         for key in self.algo_flag_def.keys():
@@ -112,3 +191,16 @@ class SDCAFlags:
     def idx_decode(self, idx):
         bitfield = self.algo_flags[idx]
         return self.bitfield_decode(bitfield)
+
+    def num_algo_pass_flags(self):
+        # the number of pixel_considered_on_*_pass flags, which limits the passes that can be recorded
+        num_flags = 0
+        for value in self.algo_flag_def.values():
+            if (
+                self.algo_flag_def["flag_offset_algo_passes"]
+                < value
+                < self.algo_flag_def["flag_offset_window_iterations"]
+            ):
+                num_flags += 1
+
+        return num_flags
@@ -19,9 +19,18 @@
 
 """Creates color-coded imagery for interpreting algorithm decisions and input data quality flags (DQF)"""
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import cv2
+import numba
 import numpy as np
-from heregoes.util import crop_center
+from heregoes.util import crop_center, njit
+
+# the width in pixels of the outline of the cluster rectangles
+rectangle_thickness = 2
 
 
 class SDCAImage:
@@ -59,215 +68,229 @@ class SDCAImage:
             "processed_non_sparkle": (0, 0, 0),
         }
 
-        self.sparkle_image = np.zeros(self.sparkle.source_shape + (4,), dtype=np.uint8)
+        # debug image categories in increasing priority, each selected by any of its flags unless it has one of its excluded flags
+        self.debug_categories = [
+            ("unprocessed", ["unprocessed_pixel"], []),
+            # min thresholds, likely land
+            (
+                "land",
+                [
+                    "pixel_skipped_by_min_c02_rf_threshold",
+                    "pixel_skipped_by_min_c05_rf_threshold",
+                    "pixel_skipped_by_min_c07_rf_threshold",
+                    "pixel_skipped_by_min_c07_bt_threshold",
+                    "pixel_skipped_by_min_c14_bt_threshold",
+                ],
+                [],
+            ),
+            ("bad_data", ["pixel_preinvalidated_by_bad_data"], []),
+            ("water", ["pixel_preinvalidated_by_water_mask"], []),
+            ("cloud", ["pixel_skipped_by_cloud_mask"], []),
+            ("bad_dqf", ["pixel_preinvalidated_by_bad_dqf"], []),
+            (
+                "bad_geometry",
+                [
+                    "pixel_preinvalidated_by_max_sat_za_threshold",
+                    "pixel_preinvalidated_by_max_sun_za_threshold",
+                    "pixel_preinvalidated_by_min_glint_angle_threshold",
+                ],
+                [],
+            ),
+            ("border", ["pixel_skipped_by_border_mask"], []),
+            # pixels that went through iteration loop at least once and were not validated as sparkles
+            (
+                "processed_non_sparkle",
+                ["pixel_had_1_window_iterations"],
+                ["pixel_validated_by_window_deviation"],
+            ),
+        ]
+
+        # the Sparkle attributes holding the brightness values and the DQF behind each "<band>_sparkle" and "<band>_dqf" image
+        self.band_sources = {
+            "c02_rf": ("c02_image", "c02_image"),
+            "c05_rf": ("c05_image", "c05_image"),
+            "c07_rf": ("c07_nirrefl", "c07_image"),
+            "c07_bt": ("c07_image", "c07_image"),
+            "c14_bt": ("c14_image", "c14_image"),
+        }
+        self.image_names = ["debug_image", "sparkle_image", "masked_c02_rf_sparkle"]
+        for band in self.band_sources.keys():
+            self.image_names += [band + "_sparkle", band + "_dqf"]
+        self.full_window = (
+            slice(0, self.sparkle.source_shape[0]),
+            slice(0, self.sparkle.source_shape[1]),
+        )
+
+        self._sparkle_image = None
+        self._sparkle_pixels = None
+        self._cluster_rectangles = None
+        self._cluster_rectangle_bounds = None
 
-        for cluster_id, cluster_idx in self.sparkle.SDCAMeta.cluster_map.items():
-            max_radius = max(
-                self.sparkle.SDCAParams.algo_params["first_window_radius"],
-                max(
-                    [
-                        i["debug"]["window_radius"]
-                        for i in self.sparkle.SDCAMeta.get_cluster_members(cluster_id)
+    @property
+    def cluster_rectangles(self):
+        # the upper left and lower right corners of a rectangle that borders the actual window of the algorithm around each cluster
+        if self._cluster_rectangles is None:
+            self._cluster_rectangles = []
+            meta = self.sparkle.SDCAMeta
+            for cluster_id, cluster_idx in meta.cluster_map.items():
+                cluster = meta.clusters[cluster_id]
+                max_radius = max(
+                    self.sparkle.SDCAParams.algo_params["first_window_radius"],
+                    meta.debugs["window_radius"][
+                        meta.cluster_bounds[cluster] : meta.cluster_bounds[cluster + 1]
                     ]
-                ),
-            )
+                    .max()
+                    .item(),
+                )
 
-            # draw a yellow rectangle that borders the actual window of the algorithm
-            rectangle_ul = tuple(
-                (
-                    int(cluster_idx[1] - 2 - max_radius),
-                    int(cluster_idx[0] - 2 - max_radius),
+                rectangle_ul = tuple(
+                    (
+                        int(cluster_idx[1] - 2 - max_radius),
+                        int(cluster_idx[0] - 2 - max_radius),
+                    )
                 )
-            )
-            rectangle_lr = tuple(
-                (
-                    int(cluster_idx[1] + 2 + max_radius),
-                    int(cluster_idx[0] + 2 + max_radius),
+                rectangle_lr = tuple(
+                    (
+                        int(cluster_idx[1] + 2 + max_radius),
+                        int(cluster_idx[0] + 2 + max_radius),
+                    )
                 )
+                self._cluster_rectangles.append((rectangle_ul, rectangle_lr))
+
+        return self._cluster_rectangles
+
+    @property
+    def cluster_rectangle_bounds(self):
+        # the y0, x0, y1, x1 extent of each cluster rectangle including the width of its outline, in the order of cluster_rectangles
+        if self._cluster_rectangle_bounds is None:
+            self._cluster_rectangle_bounds = np.array(
+                [
+                    (
+                        rectangle_ul[1] - rectangle_thickness,
+                        rectangle_ul[0] - rectangle_thickness,
+                        rectangle_lr[1] + rectangle_thickness,
+                        rectangle_lr[0] + rectangle_thickness,
+                    )
+                    for rectangle_ul, rectangle_lr in self.cluster_rectangles
+                ],
+                dtype=np.int64,
+            ).reshape(-1, 4)
+
+        return self._cluster_rectangle_bounds
+
+    def draw_cluster_rectangles(self, img, color, window=None):
+        # draws the cluster rectangles on img, which covers window of the full image if provided
+        y0, x0 = (0, 0) if window is None else (window[0].start, window[1].start)
+        rectangles = self.cluster_rectangles
+        if window is not None:
+            # only the rectangles that intersect the window are drawn
+            bounds = self.cluster_rectangle_bounds
+            in_window = np.flatnonzero(
+                (bounds[:, 0] < window[0].stop)
+                & (bounds[:, 2] >= window[0].start)
+                & (bounds[:, 1] < window[1].stop)
+                & (bounds[:, 3] >= window[1].start)
             )
-            self.debug_image = cv2.rectangle(
-                self.debug_image,
-                pt1=rectangle_ul,
-                pt2=rectangle_lr,
-                color=self.color_map["valid_sparkle"][0:3],
-                thickness=2,
-            )
-            self.sparkle_image = cv2.rectangle(
-                self.sparkle_image,
-                pt1=rectangle_ul,
-                pt2=rectangle_lr,
-                color=self.color_map["valid_sparkle"],
-                thickness=2,
+            rectangles = [rectangles[i] for i in in_window]
+
+        for rectangle_ul, rectangle_lr in rectangles:
+            img = cv2.rectangle(
+                img,
+                pt1=(rectangle_ul[0] - x0, rectangle_ul[1] - y0),
+                pt2=(rectangle_lr[0] - x0, rectangle_lr[1] - y0),
+                color=color,
+                thickness=rectangle_thickness,
             )
 
+        return img
+
     @property
-    def debug_image(self):
-        if self._debug_image is None:
-            self._debug_image = np.zeros(
-                self.sparkle.source_shape + (3,), dtype=np.uint8
+    def sparkle_image(self):
+        if self._sparkle_image is None:
+            self._sparkle_image = self.draw_cluster_rectangles(
+                np.zeros(self.sparkle.source_shape + (4,), dtype=np.uint8),
+                self.color_map["valid_sparkle"],
             )
 
-            # unprocessed
-            self._debug_image[
-                np.nonzero(
-                    self.sparkle.SDCAFlags.has_flag(
-                        self.sparkle.SDCAFlags.algo_flags,
-                        self.sparkle.SDCAFlags.algo_flag_def["unprocessed_pixel"],
-                    )
-                )
-            ] = np.array(self.color_map["unprocessed"], dtype=np.uint8)
+        return self._sparkle_image
 
-            # min thresholds, likely land
-            self._debug_image[
-                np.nonzero(
-                    (
-                        self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_skipped_by_min_c02_rf_threshold"
-                            ],
-                        )
-                        | self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_skipped_by_min_c05_rf_threshold"
-                            ],
-                        )
-                        | self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_skipped_by_min_c07_rf_threshold"
-                            ],
-                        )
-                        | self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_skipped_by_min_c07_bt_threshold"
-                            ],
-                        )
-                        | self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_skipped_by_min_c14_bt_threshold"
-                            ],
-                        )
-                    )
-                )
-            ] = np.array(self.color_map["land"], dtype=np.uint8)
-
-            # bad data
-            self._debug_image[
-                np.nonzero(
-                    self.sparkle.SDCAFlags.has_flag(
-                        self.sparkle.SDCAFlags.algo_flags,
-                        self.sparkle.SDCAFlags.algo_flag_def[
-                            "pixel_preinvalidated_by_bad_data"
-                        ],
-                    )
-                )
-            ] = np.array(self.color_map["bad_data"], dtype=np.uint8)
-
-            # water
-            self._debug_image[
-                np.nonzero(
-                    self.sparkle.SDCAFlags.has_flag(
-                        self.sparkle.SDCAFlags.algo_flags,
-                        self.sparkle.SDCAFlags.algo_flag_def[
-                            "pixel_preinvalidated_by_water_mask"
-                        ],
-                    )
-                )
-            ] = np.array(self.color_map["water"], dtype=np.uint8)
-
-            # cloud
-            self._debug_image[
-                np.nonzero(
-                    self.sparkle.SDCAFlags.has_flag(
-                        self.sparkle.SDCAFlags.algo_flags,
-                        self.sparkle.SDCAFlags.algo_flag_def[
-                            "pixel_skipped_by_cloud_mask"
-                        ],
-                    )
-                )
-            ] = np.array(self.color_map["cloud"], dtype=np.uint8)
-
-            # bad dqf
-            self._debug_image[
-                np.nonzero(
-                    self.sparkle.SDCAFlags.has_flag(
-                        self.sparkle.SDCAFlags.algo_flags,
-                        self.sparkle.SDCAFlags.algo_flag_def[
-                            "pixel_preinvalidated_by_bad_dqf"
-                        ],
-                    )
-                )
-            ] = np.array(self.color_map["bad_dqf"], dtype=np.uint8)
+    @sparkle_image.setter
+    def sparkle_image(self, value):
+        self._sparkle_image = value
+        self._sparkle_pixels = None
 
-            # geometry
-            self._debug_image[
-                np.nonzero(
-                    (
-                        self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_preinvalidated_by_max_sat_za_threshold"
-                            ],
-                        )
-                        | self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_preinvalidated_by_max_sun_za_threshold"
-                            ],
-                        )
-                        | self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_preinvalidated_by_min_glint_angle_threshold"
-                            ],
-                        )
-                    )
-                )
-            ] = np.array(self.color_map["bad_geometry"], dtype=np.uint8)
-
-            # border
-            self._debug_image[
-                np.nonzero(
-                    self.sparkle.SDCAFlags.has_flag(
-                        self.sparkle.SDCAFlags.algo_flags,
-                        self.sparkle.SDCAFlags.algo_flag_def[
-                            "pixel_skipped_by_border_mask"
-                        ],
-                    )
-                )
-            ] = np.array(self.color_map["border"], dtype=np.uint8)
+    @property
+    def sparkle_pixels(self):
+        # the opaque pixels of sparkle_image, shared by every image it is overlaid on
+        if self._sparkle_pixels is None:
+            self._sparkle_pixels = opaque_pixels(self.sparkle_image)
+
+        return self._sparkle_pixels
+
+    def render_sparkle_images(self, bands=None, out=None):
+        """
+        Renders the "<band>_sparkle" image of each band in bands, or of every band if bands is None, from one shared set of sparkle pixels.
+        out may map bands to preallocated 3-channel uint8 arrays to render into, and the rendered images are returned in the same form
+        """
+        if bands is None:
+            bands = list(self.band_sources.keys())
+
+        if out is None:
+            out = {}
+
+        for band in bands:
+            out[band] = overlay_pixels(
+                getattr(self.sparkle, self.band_sources[band][0]).bv,
+                self.sparkle_pixels,
+                out=out.get(band),
+            )
+            setattr(self, "_" + band + "_sparkle", out[band])
 
-            # pixels that went through iteration loop at least once and were not validated as sparkles
-            self._debug_image[
-                np.nonzero(
-                    (
-                        self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_had_1_window_iterations"
-                            ],
-                        )
-                        & ~self.sparkle.SDCAFlags.has_flag(
-                            self.sparkle.SDCAFlags.algo_flags,
-                            self.sparkle.SDCAFlags.algo_flag_def[
-                                "pixel_validated_by_window_deviation"
-                            ],
-                        )
-                    )
-                )
-            ] = np.array(self.color_map["processed_non_sparkle"], dtype=np.uint8)
+        return out
 
-            # valid sparkles
-            self._debug_image[np.nonzero(self.sparkle.valid_sparkles)] = np.array(
-                self.color_map["valid_sparkle"][0:3], dtype=np.uint8
+    @property
+    def debug_image(self):
+        if self._debug_image is None:
+            self._debug_image = self.draw_cluster_rectangles(
+                self.debug_categories_image(),
+                self.color_map["valid_sparkle"][0:3],
             )
 
         return self._debug_image
 
+    def debug_categories_image(self, window=(slice(None), slice(None))):
+        # the debug image of window, without cluster rectangles
+        any_bits, excluded_bits, palette = self.debug_priority_table()
+        return debug_category_image(
+            np.ascontiguousarray(self.sparkle.SDCAFlags.algo_flags[window]),
+            np.ascontiguousarray(self.sparkle.valid_sparkles[window]),
+            any_bits,
+            excluded_bits,
+            palette,
+            np.array(self.color_map["valid_sparkle"][0:3], dtype=np.uint8),
+        )
+
+    def debug_priority_table(self):
+        """
+        Returns the bitfield that selects each debug category, the bitfield that excludes it, and its color, in the order of self.debug_categories.
+        Later categories take priority over earlier ones, and valid sparkles take priority over all of them
+        """
+        algo_flag_def = self.sparkle.SDCAFlags.algo_flag_def
+        any_bits = np.zeros(len(self.debug_categories), dtype=np.int64)
+        excluded_bits = np.zeros(len(self.debug_categories), dtype=np.int64)
+        palette = np.zeros((len(self.debug_categories), 3), dtype=np.uint8)
+
+        for i, (category, flags, excluded_flags) in enumerate(self.debug_categories):
+            for flag in flags:
+                any_bits[i] |= np.int64(1) << np.int64(algo_flag_def[flag])
+
+            for flag in excluded_flags:
+                excluded_bits[i] |= np.int64(1) << np.int64(algo_flag_def[flag])
+
+            palette[i] = self.color_map[category][0:3]
+
+        return any_bits, excluded_bits, palette
+
     @debug_image.setter
     def debug_image(self, value):
         self._debug_image = value
@@ -275,13 +298,13 @@ class SDCAImage:
     @property
     def masked_c02_rf_sparkle(self):
         if self._masked_c02_rf_sparkle is None:
-            self._masked_c02_rf_sparkle = overlay(
+            self._masked_c02_rf_sparkle = overlay_pixels(
                 np.where(
                     self.sparkle.SDCAMask.discard_mask == True,
                     np.uint8(0),
                     self.sparkle.c02_image.bv,
                 ),
-                self.sparkle_image,
+                self.sparkle_pixels,
             )
 
         return self._masked_c02_rf_sparkle
@@ -289,8 +312,8 @@ class SDCAImage:
     @property
     def c02_rf_sparkle(self):
         if self._c02_rf_sparkle is None:
-            self._c02_rf_sparkle = overlay(
-                self.sparkle.c02_image.bv, self.sparkle_image
+            self._c02_rf_sparkle = overlay_pixels(
+                self.sparkle.c02_image.bv, self.sparkle_pixels
             )
 
         return self._c02_rf_sparkle
@@ -298,8 +321,8 @@ class SDCAImage:
     @property
     def c02_rf_dqf(self):
         if self._c02_rf_dqf is None:
-            self._c02_rf_dqf = overlay(
-                self.sparkle.c02_image.bv, dqf_image(self.sparkle.c02_image.dqf)
+            self._c02_rf_dqf = overlay_dqf(
+                self.sparkle.c02_image.bv, self.sparkle.c02_image.dqf
             )
 
         return self._c02_rf_dqf
@@ -307,8 +330,8 @@ class SDCAImage:
     @property
     def c05_rf_sparkle(self):
         if self._c05_rf_sparkle is None:
-            self._c05_rf_sparkle = overlay(
-                self.sparkle.c05_image.bv, self.sparkle_image
+            self._c05_rf_sparkle = overlay_pixels(
+                self.sparkle.c05_image.bv, self.sparkle_pixels
             )
 
         return self._c05_rf_sparkle
@@ -316,8 +339,8 @@ class SDCAImage:
     @property
     def c05_rf_dqf(self):
         if self._c05_rf_dqf is None:
-            self._c05_rf_dqf = overlay(
-                self.sparkle.c05_image.bv, dqf_image(self.sparkle.c05_image.dqf)
+            self._c05_rf_dqf = overlay_dqf(
+                self.sparkle.c05_image.bv, self.sparkle.c05_image.dqf
             )
 
         return self._c05_rf_dqf
@@ -325,8 +348,8 @@ class SDCAImage:
     @property
     def c07_rf_sparkle(self):
         if self._c07_rf_sparkle is None:
-            self._c07_rf_sparkle = overlay(
-                self.sparkle.c07_nirrefl.bv, self.sparkle_image
+            self._c07_rf_sparkle = overlay_pixels(
+                self.sparkle.c07_nirrefl.bv, self.sparkle_pixels
             )
 
         return self._c07_rf_sparkle
@@ -334,8 +357,8 @@ class SDCAImage:
     @property
     def c07_rf_dqf(self):
         if self._c07_rf_dqf is None:
-            self._c07_rf_dqf = overlay(
-                self.sparkle.c07_nirrefl.bv, dqf_image(self.sparkle.c07_image.dqf)
+            self._c07_rf_dqf = overlay_dqf(
+                self.sparkle.c07_nirrefl.bv, self.sparkle.c07_image.dqf
             )
 
         return self._c07_rf_dqf
@@ -343,8 +366,8 @@ class SDCAImage:
     @property
     def c07_bt_sparkle(self):
         if self._c07_bt_sparkle is None:
-            self._c07_bt_sparkle = overlay(
-                self.sparkle.c07_image.bv, self.sparkle_image
+            self._c07_bt_sparkle = overlay_pixels(
+                self.sparkle.c07_image.bv, self.sparkle_pixels
             )
 
         return self._c07_bt_sparkle
@@ -352,8 +375,8 @@ class SDCAImage:
     @property
     def c07_bt_dqf(self):
         if self._c07_bt_dqf is None:
-            self._c07_bt_dqf = overlay(
-                self.sparkle.c07_image.bv, dqf_image(self.sparkle.c07_image.dqf)
+            self._c07_bt_dqf = overlay_dqf(
+                self.sparkle.c07_image.bv, self.sparkle.c07_image.dqf
             )
 
         return self._c07_bt_dqf
@@ -361,8 +384,8 @@ class SDCAImage:
     @property
     def c14_bt_sparkle(self):
         if self._c14_bt_sparkle is None:
-            self._c14_bt_sparkle = overlay(
-                self.sparkle.c14_image.bv, self.sparkle_image
+            self._c14_bt_sparkle = overlay_pixels(
+                self.sparkle.c14_image.bv, self.sparkle_pixels
             )
 
         return self._c14_bt_sparkle
@@ -370,39 +393,410 @@ class SDCAImage:
     @property
     def c14_bt_dqf(self):
         if self._c14_bt_dqf is None:
-            self._c14_bt_dqf = overlay(
-                self.sparkle.c14_image.bv, dqf_image(self.sparkle.c14_image.dqf)
+            self._c14_bt_dqf = overlay_dqf(
+                self.sparkle.c14_image.bv, self.sparkle.c14_image.dqf
             )
 
         return self._c14_bt_dqf
 
-    def get_crops(self, img):
-        crops = {}
+    def render_window(self, img, window):
+        """Renders only the window (a tuple of y and x slices) of the image that the property named img would render"""
+        full_frame = window == self.full_window
+
+        if img == "debug_image":
+            return self.draw_cluster_rectangles(
+                self.debug_categories_image(window),
+                self.color_map["valid_sparkle"][0:3],
+                window=window,
+            )
+
+        if img == "sparkle_image":
+            return self.sparkle_window(window)
+
+        if img == "masked_c02_rf_sparkle":
+            return overlay_pixels(
+                np.where(
+                    self.sparkle.SDCAMask.discard_mask[window] == True,
+                    np.uint8(0),
+                    self.sparkle.c02_image.bv[window],
+                ),
+                (
+                    self.sparkle_pixels
+                    if full_frame
+                    else opaque_pixels(self.sparkle_window(window))
+                ),
+            )
+
+        band, kind = img.rsplit("_", 1)
+        if band not in self.band_sources or kind not in ["sparkle", "dqf"]:
+            raise Exception("Unknown SDCAImage image " + str(img))
+
+        bv = getattr(self.sparkle, self.band_sources[band][0]).bv[window]
+        if kind == "sparkle":
+            return overlay_pixels(
+                bv,
+                (
+                    self.sparkle_pixels
+                    if full_frame
+                    else opaque_pixels(self.sparkle_window(window))
+                ),
+            )
+
+        dqf = getattr(self.sparkle, self.band_sources[band][1]).dqf[window]
+        return overlay_dqf(bv, dqf)
+
+    def sparkle_window(self, window):
+        # the window of sparkle_image, drawn on its own unless it is the full frame
+        if window == self.full_window:
+            return self.sparkle_image
+
+        return self.draw_cluster_rectangles(
+            np.zeros(
+                (
+                    window[0].stop - window[0].start,
+                    window[1].stop - window[1].start,
+                    4,
+                ),
+                dtype=np.uint8,
+            ),
+            self.color_map["valid_sparkle"],
+            window=window,
+        )
+
+    def render(self, img):
+        # returns the image already rendered by the property named img, or renders it without caching it
+        rendered = getattr(self, "_" + img, None)
+        if rendered is not None:
+            return rendered
+
+        return self.render_window(img, self.full_window)
+
+    def export(self, output_dir, imgs=None, format="jpg", quality=95, num_threads=4):
+        """
+        Renders and encodes each image named in imgs, or every image if imgs is None, to output_dir as <img>.<format> on a pool of num_threads threads.
+        Images are rendered one at a time, since the parallel Numba kernels behind them cannot be called from several threads at once,
+        while the encoding of rendered images overlaps on the pool. quality is the JPEG or WebP quality, or the PNG compression level.
+        Images that were not already rendered are not cached, so each is released once it is encoded and at most num_threads images are held at once.
+        Returns the path and the render and encode times in seconds of each image
+        """
+        if imgs is None:
+            imgs = self.image_names
+
+        if format in ["jpg", "jpeg"]:
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        elif format == "png":
+            params = [cv2.IMWRITE_PNG_COMPRESSION, int(quality)]
+        elif format == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+        else:
+            raise Exception("Unknown image format " + str(format))
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # renders shared between images are built before the pool starts, so that threads don't race to build them
+        self.cluster_rectangles
+        if any(img.endswith("sparkle") for img in imgs):
+            self.sparkle_pixels
+
+        render_lock = threading.Lock()
+
+        def _export(img):
+            path = output_dir.joinpath(img + "." + format)
+
+            with render_lock:
+                s_time = time.time()
+                rendered = self.render(img)
+                render_time = time.time() - s_time
+
+            s_time = time.time()
+            if not cv2.imwrite(str(path), rendered, params):
+                raise Exception("Could not write image " + str(path))
+            encode_time = time.time() - s_time
+
+            return {"path": path, "render": render_time, "encode": encode_time}
+
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            futures = {img: executor.submit(_export, img) for img in imgs}
+
+        return {img: future.result() for img, future in futures.items()}
+
+    def write_pyramid(
+        self,
+        output_dir,
+        img="c02_rf_sparkle",
+        num_levels=None,
+        tile_size=256,
+        format="png",
+    ):
+        """
+        Writes a tile pyramid of the image named img to output_dir/<img>/<level>/<tile row>_<tile column>.<format>, where level 0 is full resolution
+        and each level halves the one before it until a level fits in a single tile, or num_levels levels are written.
+        Band backgrounds are area-averaged, while DQF values, debug categories and sparkle rectangles keep the maximum of each 2x2 block so that sparkles remain visible.
+        The tiles of "sparkle_image" keep its alpha channel, so format must support transparency for them to be overlaid.
+        Each level is reduced from the previous level and its tiles are written as soon as it is built. Returns the shape of each level
+        """
+        sparkle_overlay = self.sparkle_image
+        values = None
+        if img == "debug_image":
+            kind = "debug"
+            background = None
+            any_bits, excluded_bits, palette = self.debug_priority_table()
+            values = debug_category_indices(
+                self.sparkle.SDCAFlags.algo_flags,
+                self.sparkle.valid_sparkles,
+                any_bits,
+                excluded_bits,
+            )
+            values_palette = np.concatenate(
+                (
+                    np.zeros((1, 3), dtype=np.uint8),
+                    palette,
+                    np.array([self.color_map["valid_sparkle"][0:3]], dtype=np.uint8),
+                )
+            )
+
+        elif img == "sparkle_image":
+            # the transparent sparkle image is written on its own, with its alpha channel reduced with the colors
+            kind = "rgba"
+            background = None
+
+        elif img == "masked_c02_rf_sparkle":
+            kind = "sparkle"
+            background = np.where(
+                self.sparkle.SDCAMask.discard_mask == True,
+                np.uint8(0),
+                self.sparkle.c02_image.bv,
+            )
+
+        else:
+            band, kind = img.rsplit("_", 1)
+            if band not in self.band_sources or kind not in ["sparkle", "dqf"]:
+                raise Exception("Unknown SDCAImage image " + str(img))
+
+            background = getattr(self.sparkle, self.band_sources[band][0]).bv
+            if kind == "dqf":
+                sparkle_overlay = None
+                values = getattr(self.sparkle, self.band_sources[band][1]).dqf.astype(
+                    np.uint8
+                )
+
+        output_dir = Path(output_dir).joinpath(img)
+        shapes = []
+        while True:
+            if kind == "debug":
+                rendered = np.take(values_palette, values, axis=0)
+                rendered = overlay_pixels(
+                    rendered, opaque_pixels(sparkle_overlay), out=rendered
+                )
+            elif kind == "sparkle":
+                rendered = overlay_pixels(background, opaque_pixels(sparkle_overlay))
+            elif kind == "rgba":
+                rendered = sparkle_overlay
+            else:
+                rendered = overlay_dqf(background, values)
+
+            level_dir = output_dir.joinpath(str(len(shapes)))
+            level_dir.mkdir(parents=True, exist_ok=True)
+            for y in range(0, rendered.shape[0], tile_size):
+                for x in range(0, rendered.shape[1], tile_size):
+                    path = level_dir.joinpath(
+                        str(y // tile_size) + "_" + str(x // tile_size) + "." + format
+                    )
+                    if not cv2.imwrite(
+                        str(path), rendered[y : y + tile_size, x : x + tile_size]
+                    ):
+                        raise Exception("Could not write image " + str(path))
+
+            shapes.append(rendered.shape[:2])
+            if (num_levels is not None and len(shapes) >= num_levels) or max(
+                rendered.shape[:2]
+            ) <= tile_size:
+                break
+
+            # the next level is reduced from this one rather than from full resolution
+            if background is not None:
+                background = reduce_area(background)
+
+            if values is not None:
+                values = reduce_max(values)
+
+            if sparkle_overlay is not None:
+                sparkle_overlay = reduce_max(sparkle_overlay)
+
+        return shapes
+
+    def crop_window(self, idx, crop_shape):
+        # a window around idx large enough that cropping crop_shape around idx from it matches cropping from the full image
+        return (
+            slice(
+                max(int(idx[0]) - crop_shape[0], 0),
+                min(int(idx[0]) + crop_shape[0] + 1, self.sparkle.source_shape[0]),
+            ),
+            slice(
+                max(int(idx[1]) - crop_shape[1], 0),
+                min(int(idx[1]) + crop_shape[1] + 1, self.sparkle.source_shape[1]),
+            ),
+        )
+
+    def get_crops(self, img, crop_shape=(201, 201)):
+        return self.get_all_crops([img], crop_shape=crop_shape)[img]
+
+    def get_all_crops(self, imgs=None, crop_shape=(201, 201)):
+        """
+        Returns a dict of crops around each cluster centroid for each image named in imgs, or every image if imgs is None.
+        Only the window around each cluster is rendered, so the full-resolution images are never built
+        """
+        if imgs is None:
+            imgs = self.image_names
+
+        crops = {img: {} for img in imgs}
         for cluster_id, cluster_idx in self.sparkle.SDCAMeta.cluster_map.items():
-            crops[cluster_id] = crop_center(getattr(self, img), cluster_idx, (201, 201))
+            window = self.crop_window(cluster_idx, crop_shape)
+            window_idx = (
+                int(cluster_idx[0]) - window[0].start,
+                int(cluster_idx[1]) - window[1].start,
+            )
+            for img in imgs:
+                crops[img][cluster_id] = crop_center(
+                    self.render_window(img, window), window_idx, crop_shape
+                )
 
         return crops
 
 
-def dqf_image(src):
-    img = np.stack((src,) * 4, axis=-1).astype(np.uint8)
+@njit.heregoes_njit_noparallel
+def debug_category(bits, valid_sparkle, any_bits, excluded_bits):
+    # 0 for no category, i + 1 for the highest priority matching category i, and len(any_bits) + 1 for valid sparkles
+    if valid_sparkle:
+        return any_bits.shape[0] + 1
+
+    for i in range(any_bits.shape[0] - 1, -1, -1):
+        if bits & any_bits[i] != 0 and bits & excluded_bits[i] == 0:
+            return i + 1
 
-    img[img[:, :, 3] == 1] = [0, 0, 255, 255]
-    img[img[:, :, 3] == 2] = [0, 255, 0, 255]
-    img[img[:, :, 3] == 3] = [255, 0, 0, 255]
-    img[img[:, :, 3] == 4] = [255, 0, 255, 255]
+    return 0
+
+
+@njit.heregoes_njit
+def debug_category_image(
+    bitfield, valid_sparkles, any_bits, excluded_bits, palette, valid_sparkle_color
+):
+    """Colors each pixel of bitfield by its highest priority debug category in one pass"""
+    img = np.zeros(bitfield.shape + (3,), dtype=np.uint8)
+    for y in numba.prange(bitfield.shape[0]):
+        for x in range(bitfield.shape[1]):
+            category = debug_category(
+                bitfield[y, x], valid_sparkles[y, x], any_bits, excluded_bits
+            )
+            if category == any_bits.shape[0] + 1:
+                img[y, x] = valid_sparkle_color
+            elif category > 0:
+                img[y, x] = palette[category - 1]
 
     return img
 
 
+@njit.heregoes_njit
+def debug_category_indices(bitfield, valid_sparkles, any_bits, excluded_bits):
+    """Returns the debug category of each pixel of bitfield as numbered by debug_category()"""
+    categories = np.zeros(bitfield.shape, dtype=np.uint8)
+    for y in numba.prange(bitfield.shape[0]):
+        for x in range(bitfield.shape[1]):
+            categories[y, x] = debug_category(
+                bitfield[y, x], valid_sparkles[y, x], any_bits, excluded_bits
+            )
+
+    return categories
+
+
+def reduce_area(arr):
+    # halves each dimension of arr, rounding up, by averaging the area of each output pixel
+    return cv2.resize(
+        arr,
+        ((arr.shape[1] + 1) // 2, (arr.shape[0] + 1) // 2),
+        interpolation=cv2.INTER_AREA,
+    )
+
+
+def reduce_max(arr):
+    # halves each dimension of arr, rounding up, by keeping the maximum of each 2x2 block so that sparse categories remain visible
+    padded = np.pad(
+        arr,
+        [(0, arr.shape[0] % 2), (0, arr.shape[1] % 2)] + [(0, 0)] * (arr.ndim - 2),
+    )
+    return padded.reshape(
+        (padded.shape[0] // 2, 2, padded.shape[1] // 2, 2) + padded.shape[2:]
+    ).max(axis=(1, 3))
+
+
+# colors of DQF values 1 through 4, with every other value v colored (v, v, v, v)
+dqf_palette = np.repeat(np.arange(256, dtype=np.uint8)[:, np.newaxis], 4, axis=1)
+dqf_palette[1] = [0, 0, 255, 255]
+dqf_palette[2] = [0, 255, 0, 255]
+dqf_palette[3] = [255, 0, 0, 255]
+dqf_palette[4] = [255, 0, 255, 255]
+
+
+def dqf_image(src, out=None):
+    # colors a DQF array as a 4-channel transparent image with one lookup into dqf_palette, written to out if it is provided
+    if out is None:
+        out = np.empty(src.shape + (4,), dtype=np.uint8)
+
+    return np.take(dqf_palette, src.astype(np.uint8, copy=False), axis=0, out=out)
+
+
+@njit.heregoes_njit
+def paint_palette(out, values, palette):
+    """Paints the color of each value in values on the 3-channel image out wherever that color is opaque in palette"""
+    for y in numba.prange(values.shape[0]):
+        for x in range(values.shape[1]):
+            color = palette[values[y, x]]
+            if color[3] == 255:
+                out[y, x, 0] = color[0]
+                out[y, x, 1] = color[1]
+                out[y, x, 2] = color[2]
+
+
+def overlay_dqf(background, dqf, out=None):
+    """
+    Overlays the colors of a DQF array on a 1 or 3-channel image "background", matching overlay(background, dqf_image(dqf))
+    without building the 4-channel DQF image. The result is written to out if it is provided
+    """
+    out = overlay_pixels(background, None, out=out)
+    paint_palette(
+        out, np.ascontiguousarray(dqf.astype(np.uint8, copy=False)), dqf_palette
+    )
+
+    return out
+
+
+def opaque_pixels(foreground):
+    # returns the indices and colors of the opaque pixels of a 4-channel transparent "foreground"
+    y, x = np.nonzero(foreground[:, :, 3] == 255)
+    return y, x, foreground[y, x, :3]
+
+
+def overlay_pixels(background, pixels, out=None):
+    """
+    Overlays the opaque pixels from opaque_pixels(), if any, on a 1 or 3-channel image "background", in one pass over the background.
+    The result is written to out if it is provided, which may be background itself if it already has 3 channels
+    """
+    if out is None:
+        out = np.empty(background.shape[:2] + (3,), dtype=np.uint8)
+
+    if background.ndim == 2:
+        np.copyto(out, background[:, :, np.newaxis], casting="unsafe")
+    elif out is not background:
+        np.copyto(out, background, casting="unsafe")
+
+    if pixels is not None:
+        y, x, colors = pixels
+        out[y, x] = colors
+
+    return out
+
+
 def overlay(background, foreground):
     # overlays a 4-channel transparent "foreground" on a 3-channel image "background"
-    if background.shape[-1] != 3:
-        img = np.stack((background,) * 3, axis=-1)
-    else:
-        img = background.copy()
-    img[foreground[:, :, 3] == 255, :] = foreground[foreground[:, :, 3] == 255, :][
-        :, :3
-    ]
-
-    return img
+    return overlay_pixels(background, opaque_pixels(foreground))
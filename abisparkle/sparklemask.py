@@ -19,8 +19,11 @@
 
 """Creates boolean masks used to filter the SDCA before the windowed deviation detection stage"""
 
+import numba
 import numpy as np
-from heregoes.util import fill_border, njit
+from heregoes.util import njit
+
+from abisparkle import sparklebits
 
 
 class SDCAMask:
@@ -28,329 +31,280 @@ class SDCAMask:
     def __init__(self, sparkle):
         self.sparkle = sparkle
 
-        self._bad_dqf_mask = None
-        self._validated_mask = None
-        self._invalidated_mask = None
-        self._skip_mask = None
+        self._packed_near_bad_dqf_mask = None
 
+        # masks are kept bit-packed to bound memory on full disk scenes, except discard_mask which the window kernels read pixel by pixel
         (
-            self.validated_mask,
-            self.invalidated_mask,
+            self.packed_validated_mask,
+            self.packed_invalidated_mask,
             self.discard_mask,
-            self.skip_mask,
-        ) = self._finalize(
-            self.validated_mask,
-            self.invalidated_mask,
-            self.skip_mask,
-            self.sparkle.SDCAFlags,
+            self.packed_skip_mask,
+            self.packed_bad_dqf_mask,
+        ) = self._masks(
+            c02_rf=self.sparkle.c02_image.cmi,
+            c05_rf=self.sparkle.c05_image.cmi,
+            c07_rf=self.sparkle.c07_nirrefl.rf,
+            c07_bt=self.sparkle.c07_image.cmi,
+            c14_bt=self.sparkle.c14_image.cmi,
+            c02_dqf=self.sparkle.c02_image.dqf,
+            c05_dqf=self.sparkle.c05_image.dqf,
+            c07_dqf=self.sparkle.c07_image.dqf,
+            c14_dqf=self.sparkle.c14_image.dqf,
+            water_mask=sparklebits.pack(self.sparkle.water_mask),
+            cloud_mask=sparklebits.pack(self.sparkle.cloud_mask),
+            sat_za=self.sparkle.nav.sat_za,
+            sun_za=self.sparkle.nav.sun_za,
+            glint_angle=self.sparkle.nav.glint_angle,
+            algo_params=self.sparkle.SDCAParams.algo_params,
+            algo_flags=self.sparkle.SDCAFlags,
         )
 
     @staticmethod
     @njit.heregoes_njit
-    def _finalize(validated_mask, invalidated_mask, skip_mask, algo_flags):
-        # make sure pre-validated pixels don't contain any pre-invalidated ones
-        validated_mask.ravel()[np.nonzero(invalidated_mask.ravel())] = False
-
-        # make a convenience mask for discarding validated and invalidated pixels from the statistical background of the moving window function
-        discard_mask = validated_mask | invalidated_mask
-
-        # make skip_mask contain validated_mask and invalidated_mask pixels
-        skip_mask.ravel()[np.nonzero(discard_mask.ravel())] = True
-
-        # set flags for pre-algo masking
-        algo_flags.set_mask_flag(
-            validated_mask,
-            algo_flags.algo_flag_def["pixel_validated_by_pre_algo_masking"],
+    def _masks(
+        c02_rf,
+        c05_rf,
+        c07_rf,
+        c07_bt,
+        c14_bt,
+        c02_dqf,
+        c05_dqf,
+        c07_dqf,
+        c14_dqf,
+        water_mask,
+        cloud_mask,
+        sat_za,
+        sun_za,
+        glint_angle,
+        algo_params,
+        algo_flags,
+    ):
+        """
+        Builds the pre-validated, pre-invalidated, discard, skip and bad DQF masks and sets their flags,
+        reading each input once per pixel. water_mask and cloud_mask are PackedMasks, and every mask is returned as a PackedMask except discard_mask
+        """
+        shape = c02_rf.shape
+        discard_mask = np.empty(shape, dtype=np.bool_)
+        validated_bits = np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+        skip_bits = np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+        invalidated_bits = np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+        bad_dqf_bits = np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+        bitfield = algo_flags.algo_flags
+
+        flag_def = algo_flags.algo_flag_def
+        prevalidated_by_max_rf_bit = np.int64(1) << np.int64(
+            flag_def["pixel_prevalidated_by_max_rf_thresholds"]
         )
-        algo_flags.set_mask_flag(
-            invalidated_mask,
-            algo_flags.algo_flag_def["pixel_invalidated_by_pre_algo_masking"],
+        bad_dqf_bit = np.int64(1) << np.int64(
+            flag_def["pixel_preinvalidated_by_bad_dqf"]
         )
-        algo_flags.set_mask_flag(
-            skip_mask, algo_flags.algo_flag_def["pixel_skipped_by_pre_algo_masking"]
+        bad_data_bit = np.int64(1) << np.int64(
+            flag_def["pixel_preinvalidated_by_bad_data"]
+        )
+        water_bit = np.int64(1) << np.int64(
+            flag_def["pixel_preinvalidated_by_water_mask"]
+        )
+        max_sat_za_bit = np.int64(1) << np.int64(
+            flag_def["pixel_preinvalidated_by_max_sat_za_threshold"]
+        )
+        max_sun_za_bit = np.int64(1) << np.int64(
+            flag_def["pixel_preinvalidated_by_max_sun_za_threshold"]
+        )
+        min_sun_za_bit = np.int64(1) << np.int64(
+            flag_def["pixel_preinvalidated_by_min_sun_za_threshold"]
+        )
+        min_glint_angle_bit = np.int64(1) << np.int64(
+            flag_def["pixel_preinvalidated_by_min_glint_angle_threshold"]
+        )
+        cloud_bit = np.int64(1) << np.int64(flag_def["pixel_skipped_by_cloud_mask"])
+        border_bit = np.int64(1) << np.int64(flag_def["pixel_skipped_by_border_mask"])
+        c02_rf_min_bit = np.int64(1) << np.int64(
+            flag_def["pixel_skipped_by_min_c02_rf_threshold"]
+        )
+        c05_rf_min_bit = np.int64(1) << np.int64(
+            flag_def["pixel_skipped_by_min_c05_rf_threshold"]
+        )
+        c07_rf_min_bit = np.int64(1) << np.int64(
+            flag_def["pixel_skipped_by_min_c07_rf_threshold"]
+        )
+        c07_bt_min_bit = np.int64(1) << np.int64(
+            flag_def["pixel_skipped_by_min_c07_bt_threshold"]
+        )
+        c14_bt_min_bit = np.int64(1) << np.int64(
+            flag_def["pixel_skipped_by_min_c14_bt_threshold"]
+        )
+        validated_bit = np.int64(1) << np.int64(
+            flag_def["pixel_validated_by_pre_algo_masking"]
+        )
+        invalidated_bit = np.int64(1) << np.int64(
+            flag_def["pixel_invalidated_by_pre_algo_masking"]
+        )
+        skipped_bit = np.int64(1) << np.int64(
+            flag_def["pixel_skipped_by_pre_algo_masking"]
         )
 
-        return validated_mask, invalidated_mask, discard_mask, skip_mask
-
-    @property
-    def bad_dqf_mask(self):
-        @njit.heregoes_njit
-        def _bad_dqf(c02_dqf, c05_dqf, c07_dqf, c14_dqf):
-            bad_dqf_mask = (
-                ((c02_dqf != 0) & (c02_dqf != 2))
-                | ((c05_dqf != 0) & (c05_dqf != 2))
-                | ((c07_dqf != 0) & (c07_dqf != 2))
-                | ((c14_dqf != 0) & (c14_dqf != 2))
-            )
-
-            return bad_dqf_mask
-
-        if self._bad_dqf_mask is None:
-            self._bad_dqf_mask = _bad_dqf(
-                c02_dqf=self.sparkle.c02_image.dqf,
-                c05_dqf=self.sparkle.c05_image.dqf,
-                c07_dqf=self.sparkle.c07_image.dqf,
-                c14_dqf=self.sparkle.c14_image.dqf,
-            )
-
-        return self._bad_dqf_mask
-
-    @property
-    def validated_mask(self):
-        @njit.heregoes_njit
-        def _validate(source_shape, c02_rf, c05_rf, c07_rf, algo_params, algo_flags):
-            validated_mask = np.full(source_shape, False)
-
-            max_rf_mask = (
-                (c02_rf > algo_params["c02_rf_max_threshold"])
-                & (c05_rf > algo_params["c05_rf_max_threshold"])
-                & (c07_rf > algo_params["c07_rf_max_threshold"])
-            )
-            max_rf_idx = np.nonzero(max_rf_mask.ravel())
-            validated_mask.ravel()[max_rf_idx] = True
-            algo_flags.set_mask_flag(
-                max_rf_mask,
-                algo_flags.algo_flag_def["pixel_prevalidated_by_max_rf_thresholds"],
-            )
-
-            return validated_mask
-
-        if self._validated_mask is None:
-            self._validated_mask = _validate(
-                source_shape=self.sparkle.source_shape,
-                c02_rf=self.sparkle.c02_image.cmi,
-                c05_rf=self.sparkle.c05_image.cmi,
-                c07_rf=self.sparkle.c07_nirrefl.rf,
-                algo_params=self.sparkle.SDCAParams.algo_params,
-                algo_flags=self.sparkle.SDCAFlags,
-            )
-
-        return self._validated_mask
-
-    @validated_mask.setter
-    def validated_mask(self, value):
-        self._validated_mask = value
-
-    @property
-    def invalidated_mask(self):
-        @njit.heregoes_njit
-        def _invalidate(
-            source_shape,
-            c02_rf,
-            c05_rf,
-            c07_rf,
-            c07_bt,
-            c14_bt,
-            bad_dqf_mask,
-            water_mask,
-            sat_za,
-            sun_za,
-            glint_angle,
-            algo_params,
-            algo_flags,
-        ):
-            invalidated_mask = np.full(source_shape, False)
-
-            # bad dqfs
-            bad_dqf_idx = np.nonzero(bad_dqf_mask.ravel())
-            invalidated_mask.ravel()[bad_dqf_idx] = True
-            algo_flags.set_mask_flag(
-                bad_dqf_mask,
-                algo_flags.algo_flag_def["pixel_preinvalidated_by_bad_dqf"],
-            )
-
-            # missing/bad data
-            bad_data_mask = (
-                ((c02_rf <= 0) | (c02_rf == np.nan))
-                | ((c05_rf <= 0) | (c05_rf == np.nan))
-                | ((c07_rf <= 0) | (c07_rf == np.nan))
-                | ((c07_bt <= 0) | (c07_bt == np.nan))
-                | ((c14_bt <= 0) | (c14_bt == np.nan))
-            )
-            bad_data_idx = np.nonzero(bad_data_mask.ravel())
-            invalidated_mask.ravel()[bad_data_idx] = True
-            algo_flags.set_mask_flag(
-                bad_data_mask,
-                algo_flags.algo_flag_def["pixel_preinvalidated_by_bad_data"],
-            )
-
-            # WaterMask has water as False and land as True, but we want to find water pixels as True so we invert it with ~
-            water_idx = np.nonzero(~water_mask.ravel())
-            invalidated_mask.ravel()[water_idx] = True
-            algo_flags.set_mask_flag(
-                ~water_mask,
-                algo_flags.algo_flag_def["pixel_preinvalidated_by_water_mask"],
-            )
-
-            # exclude by satellite zenith angle
-            sat_za_mask = sat_za > np.deg2rad(algo_params["max_sat_za_threshold"])
-            sat_za_idx = np.nonzero(sat_za_mask.ravel())
-            invalidated_mask.ravel()[sat_za_idx] = True
-            algo_flags.set_mask_flag(
-                sat_za_mask,
-                algo_flags.algo_flag_def[
-                    "pixel_preinvalidated_by_max_sat_za_threshold"
-                ],
-            )
-
-            # exclude by max sun zenith angle - day/night terminator
-            sun_za_max_mask = sun_za > np.deg2rad(algo_params["max_sun_za_threshold"])
-            sun_za_max_idx = np.nonzero(sun_za_max_mask.ravel())
-            invalidated_mask.ravel()[sun_za_max_idx] = True
-            algo_flags.set_mask_flag(
-                sun_za_max_mask,
-                algo_flags.algo_flag_def[
-                    "pixel_preinvalidated_by_max_sun_za_threshold"
-                ],
-            )
-
-            # exclude by min sun zenith angle - subsolar point as in FDCA
-            sun_za_min_mask = sun_za <= np.deg2rad(algo_params["min_sun_za_threshold"])
-            sun_za_min_idx = np.nonzero(sun_za_min_mask.ravel())
-            invalidated_mask.ravel()[sun_za_min_idx] = True
-            algo_flags.set_mask_flag(
-                sun_za_min_mask,
-                algo_flags.algo_flag_def[
-                    "pixel_preinvalidated_by_min_sun_za_threshold"
-                ],
-            )
+        max_sat_za = np.deg2rad(algo_params["max_sat_za_threshold"])
+        max_sun_za = np.deg2rad(algo_params["max_sun_za_threshold"])
+        min_sun_za = np.deg2rad(algo_params["min_sun_za_threshold"])
+        min_glint_angle = np.deg2rad(algo_params["min_glint_angle_threshold"])
+        border_width = np.int64(algo_params["exclude_border_width"])
+
+        for y in numba.prange(shape[0]):
+            for x in range(shape[1]):
+                flags = np.int64(0)
+
+                # pre-validate by max rf thresholds
+                if (
+                    (c02_rf[y, x] > algo_params["c02_rf_max_threshold"])
+                    and (c05_rf[y, x] > algo_params["c05_rf_max_threshold"])
+                    and (c07_rf[y, x] > algo_params["c07_rf_max_threshold"])
+                ):
+                    flags |= prevalidated_by_max_rf_bit
+
+                # bad dqfs
+                if (
+                    ((c02_dqf[y, x] != 0) and (c02_dqf[y, x] != 2))
+                    or ((c05_dqf[y, x] != 0) and (c05_dqf[y, x] != 2))
+                    or ((c07_dqf[y, x] != 0) and (c07_dqf[y, x] != 2))
+                    or ((c14_dqf[y, x] != 0) and (c14_dqf[y, x] != 2))
+                ):
+                    flags |= bad_dqf_bit
+                    bad_dqf_bits[y, x >> 3] |= np.uint8(1 << (x & 7))
+
+                # missing/bad data
+                if (
+                    (c02_rf[y, x] <= 0)
+                    or (c05_rf[y, x] <= 0)
+                    or (c07_rf[y, x] <= 0)
+                    or (c07_bt[y, x] <= 0)
+                    or (c14_bt[y, x] <= 0)
+                ):
+                    flags |= bad_data_bit
+
+                # WaterMask has water as False and land as True
+                if not water_mask.get((y, x)):
+                    flags |= water_bit
+
+                # exclude by satellite zenith angle
+                if sat_za[y, x] > max_sat_za:
+                    flags |= max_sat_za_bit
+
+                # exclude by max sun zenith angle - day/night terminator
+                if sun_za[y, x] > max_sun_za:
+                    flags |= max_sun_za_bit
+
+                # exclude by min sun zenith angle - subsolar point as in FDCA
+                if sun_za[y, x] <= min_sun_za:
+                    flags |= min_sun_za_bit
+
+                # exclude by glint angle as in FDCA
+                if glint_angle[y, x] <= min_glint_angle:
+                    flags |= min_glint_angle_bit
+
+                if cloud_mask.get((y, x)):
+                    flags |= cloud_bit
+
+                # exclude border
+                if (
+                    y < border_width
+                    or y >= shape[0] - border_width
+                    or x < border_width
+                    or x >= shape[1] - border_width
+                ):
+                    flags |= border_bit
+
+                # exclude by min thresholds
+                if c02_rf[y, x] <= algo_params["c02_rf_min_threshold"]:
+                    flags |= c02_rf_min_bit
+                if c05_rf[y, x] <= algo_params["c05_rf_min_threshold"]:
+                    flags |= c05_rf_min_bit
+                if c07_rf[y, x] <= algo_params["c07_rf_min_threshold"]:
+                    flags |= c07_rf_min_bit
+                if c07_bt[y, x] <= algo_params["c07_bt_min_threshold"]:
+                    flags |= c07_bt_min_bit
+                if c14_bt[y, x] <= algo_params["c14_bt_min_threshold"]:
+                    flags |= c14_bt_min_bit
+
+                invalidated = (
+                    flags
+                    & (
+                        bad_dqf_bit
+                        | bad_data_bit
+                        | water_bit
+                        | max_sat_za_bit
+                        | max_sun_za_bit
+                        | min_sun_za_bit
+                        | min_glint_angle_bit
+                    )
+                ) != 0
+
+                # make sure pre-validated pixels don't contain any pre-invalidated ones
+                validated = (
+                    flags & prevalidated_by_max_rf_bit != 0
+                ) and not invalidated
+
+                # make a convenience mask for discarding validated and invalidated pixels from the statistical background of the moving window function
+                discard_mask[y, x] = validated or invalidated
+
+                # make skip_mask contain validated_mask and invalidated_mask pixels
+                skip = discard_mask[y, x] or (
+                    flags
+                    & (
+                        cloud_bit
+                        | border_bit
+                        | c02_rf_min_bit
+                        | c05_rf_min_bit
+                        | c07_rf_min_bit
+                        | c07_bt_min_bit
+                        | c14_bt_min_bit
+                    )
+                    != 0
+                )
+
+                # set flags for pre-algo masking
+                if validated:
+                    flags |= validated_bit
+                    validated_bits[y, x >> 3] |= np.uint8(1 << (x & 7))
+                if invalidated:
+                    flags |= invalidated_bit
+                    invalidated_bits[y, x >> 3] |= np.uint8(1 << (x & 7))
+                if skip:
+                    flags |= skipped_bit
+                    skip_bits[y, x >> 3] |= np.uint8(1 << (x & 7))
+
+                bitfield[y, x] |= flags
+
+        return (
+            sparklebits.PackedMask(shape, validated_bits),
+            sparklebits.PackedMask(shape, invalidated_bits),
+            discard_mask,
+            sparklebits.PackedMask(shape, skip_bits),
+            sparklebits.PackedMask(shape, bad_dqf_bits),
+        )
 
-            # exclude by glint angle as in FDCA
-            glint_angle_mask = glint_angle <= np.deg2rad(
-                algo_params["min_glint_angle_threshold"]
-            )
-            glint_angle_idx = np.nonzero(glint_angle_mask.ravel())
-            invalidated_mask.ravel()[glint_angle_idx] = True
-            algo_flags.set_mask_flag(
-                glint_angle_mask,
-                algo_flags.algo_flag_def[
-                    "pixel_preinvalidated_by_min_glint_angle_threshold"
-                ],
-            )
+    # boolean copies of the packed masks for debugging, each allocating and unpacking a full frame
+    def unpack_validated_mask(self):
+        return self.packed_validated_mask.unpack()
 
-            return invalidated_mask
-
-        if self._invalidated_mask is None:
-            self._invalidated_mask = _invalidate(
-                source_shape=self.sparkle.source_shape,
-                c02_rf=self.sparkle.c02_image.cmi,
-                c05_rf=self.sparkle.c05_image.cmi,
-                c07_rf=self.sparkle.c07_nirrefl.rf,
-                c07_bt=self.sparkle.c07_image.cmi,
-                c14_bt=self.sparkle.c14_image.cmi,
-                bad_dqf_mask=self.bad_dqf_mask,
-                water_mask=self.sparkle.water_mask,
-                sat_za=self.sparkle.nav.sat_za,
-                sun_za=self.sparkle.nav.sun_za,
-                glint_angle=self.sparkle.nav.glint_angle,
-                algo_params=self.sparkle.SDCAParams.algo_params,
-                algo_flags=self.sparkle.SDCAFlags,
-            )
+    def unpack_invalidated_mask(self):
+        return self.packed_invalidated_mask.unpack()
 
-        return self._invalidated_mask
+    def unpack_skip_mask(self):
+        return self.packed_skip_mask.unpack()
 
-    @invalidated_mask.setter
-    def invalidated_mask(self, value):
-        self._invalidated_mask = value
+    def unpack_bad_dqf_mask(self):
+        return self.packed_bad_dqf_mask.unpack()
 
     @property
-    def skip_mask(self):
-        @njit.heregoes_njit
-        def _skip(
-            source_shape,
-            cloud_mask,
-            c02_rf,
-            c05_rf,
-            c07_rf,
-            c07_bt,
-            c14_bt,
-            algo_params,
-            algo_flags,
-        ):
-            skip_mask = np.full(source_shape, False)
-
-            cloud_idx = np.nonzero(cloud_mask.ravel())
-            skip_mask.ravel()[cloud_idx] = True
-            algo_flags.set_mask_flag(
-                cloud_mask, algo_flags.algo_flag_def["pixel_skipped_by_cloud_mask"]
-            )
-
-            # exclude border
-            border_mask = np.full(source_shape, False)
-            fill_border(
-                border_mask,
-                width=algo_params["exclude_border_width"],
-                fill=True,
-                copy=False,
-            )
-            border_idx = np.nonzero(border_mask.ravel())
-            skip_mask.ravel()[border_idx] = True
-            algo_flags.set_mask_flag(
-                border_mask, algo_flags.algo_flag_def["pixel_skipped_by_border_mask"]
-            )
-
-            # exclude by min c02 rf threshold
-            c02_rf_min_mask = c02_rf <= algo_params["c02_rf_min_threshold"]
-            c02_rf_min_idx = np.nonzero(c02_rf_min_mask.ravel())
-            skip_mask.ravel()[c02_rf_min_idx] = True
-            algo_flags.set_mask_flag(
-                c02_rf_min_mask,
-                algo_flags.algo_flag_def["pixel_skipped_by_min_c02_rf_threshold"],
-            )
-
-            # exclude by min c05 rf threshold
-            c05_rf_min_mask = c05_rf <= algo_params["c05_rf_min_threshold"]
-            c05_rf_min_idx = np.nonzero(c05_rf_min_mask.ravel())
-            skip_mask.ravel()[c05_rf_min_idx] = True
-            algo_flags.set_mask_flag(
-                c05_rf_min_mask,
-                algo_flags.algo_flag_def["pixel_skipped_by_min_c05_rf_threshold"],
-            )
-
-            # exclude by min c07 rf threshold
-            c07_rf_min_mask = c07_rf <= algo_params["c07_rf_min_threshold"]
-            c07_rf_min_idx = np.nonzero(c07_rf_min_mask.ravel())
-            skip_mask.ravel()[c07_rf_min_idx] = True
-            algo_flags.set_mask_flag(
-                c07_rf_min_mask,
-                algo_flags.algo_flag_def["pixel_skipped_by_min_c07_rf_threshold"],
-            )
-
-            # exclude by min c07 bt threshold
-            c07_bt_min_mask = c07_bt <= algo_params["c07_bt_min_threshold"]
-            c07_bt_min_idx = np.nonzero(c07_bt_min_mask.ravel())
-            skip_mask.ravel()[c07_bt_min_idx] = True
-            algo_flags.set_mask_flag(
-                c07_bt_min_mask,
-                algo_flags.algo_flag_def["pixel_skipped_by_min_c07_bt_threshold"],
-            )
-
-            # exclude by min c14 bt threshold
-            c14_bt_min_mask = c14_bt <= algo_params["c14_bt_min_threshold"]
-            c14_bt_min_idx = np.nonzero(c14_bt_min_mask.ravel())
-            skip_mask.ravel()[c14_bt_min_idx] = True
-            algo_flags.set_mask_flag(
-                c14_bt_min_mask,
-                algo_flags.algo_flag_def["pixel_skipped_by_min_c14_bt_threshold"],
-            )
-
-            return skip_mask
-
-        if self._skip_mask is None:
-            self._skip_mask = _skip(
-                source_shape=self.sparkle.source_shape,
-                cloud_mask=self.sparkle.cloud_mask,
-                c02_rf=self.sparkle.c02_image.cmi,
-                c05_rf=self.sparkle.c05_image.cmi,
-                c07_rf=self.sparkle.c07_nirrefl.rf,
-                c07_bt=self.sparkle.c07_image.cmi,
-                c14_bt=self.sparkle.c14_image.cmi,
-                algo_params=self.sparkle.SDCAParams.algo_params,
-                algo_flags=self.sparkle.SDCAFlags,
+    def packed_near_bad_dqf_mask(self):
+        # pixels within exclude_dqf_radius of a bad DQF, found once per scene by dilating the packed bad DQF mask with a square window
+        if self._packed_near_bad_dqf_mask is None:
+            self._packed_near_bad_dqf_mask = sparklebits.dilate(
+                self.packed_bad_dqf_mask,
+                int(self.sparkle.SDCAParams.algo_params["exclude_dqf_radius"]),
             )
 
-        return self._skip_mask
+        return self._packed_near_bad_dqf_mask
 
-    @skip_mask.setter
-    def skip_mask(self, value):
-        self._skip_mask = value
+    def unpack_near_bad_dqf_mask(self):
+        return self.packed_near_bad_dqf_mask.unpack()
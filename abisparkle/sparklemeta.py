@@ -19,7 +19,10 @@
 
 """Stores indices and associated algorithm metadata for detected sparkle pixels"""
 
+import json
+import math
 import uuid
+from collections.abc import Sequence
 
 import numpy as np
 from heregoes.goesr.abi import rad_wvn2wvl
@@ -31,12 +34,71 @@ db_time_format = "%Y-%m-%dT%H:%M:%SZ"
 safe_time_format = "%Y-%m-%dT%H%M%SZ"
 
 
+def _rounded(values, decimals, degrees=False):
+    # rounds each value as np.round(value.item(), decimals) would, in float64
+    values = np.asarray(values, dtype=np.float64)
+    if degrees:
+        values = np.rad2deg(values)
+
+    return np.round(values, decimals)
+
+
+def _google_maps(lat, lon):
+    return f"https://www.google.com/maps/@?api=1&map_action=map&center={lat},{lon}&zoom=14&basemap=satellite"
+
+
+def _json_value(value):
+    # encodes a Python scalar exactly as json.dumps would
+    if isinstance(value, float) and math.isfinite(value):
+        return repr(value)
+
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+
+    return json.dumps(value)
+
+
+def _json_object(items):
+    # encodes (key, already encoded value) pairs as a JSON object with json.dumps' default separators
+    return "{" + ", ".join('"' + k + '": ' + v for k, v in items) + "}"
+
+
+def _json_columns(columns, row=None):
+    if row is None:
+        return _json_object([(k, _json_value(v)) for k, v in columns.items()])
+
+    return _json_object([(k, _json_value(v[row].item())) for k, v in columns.items()])
+
+
+class SDCARecords(Sequence):
+    """Read-only sequence of sparkle pixel metadata records, each materialized as a nested dict when it is accessed"""
+
+    def __init__(self, meta):
+        self.meta = meta
+
+    def __len__(self):
+        return self.meta.num_rows
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.meta.record(i) for i in range(*row.indices(len(self)))]
+
+        if row < 0:
+            row += len(self)
+
+        if not 0 <= row < len(self):
+            raise IndexError("Sparkle metadata row out of range")
+
+        return self.meta.record(row)
+
+    def __iter__(self):
+        return self.meta.records()
+
+
 class SDCAMeta:
     def __init__(self, sparkle):
         self.sparkle = sparkle
 
-        self.algo_meta = []
-
         self.valid_clusters, self.num_clusters = ndimage.label(
             sparkle.valid_sparkles, structure=np.ones((3, 3))
         )
@@ -44,272 +106,375 @@ class SDCAMeta:
         # maps cluster UUIDs to cluster centroid indices
         self.cluster_map = {}
 
+        # maps pixel indices to rows of the metadata columns, and cluster UUIDs to their cluster number and the range of rows of their members
+        self.rows = {}
+        self.clusters = {}
+        self.num_rows = 0
+
+        if self.num_clusters == 0:
+            return
+
+        # group the indices of every labeled pixel by cluster with one stable sort, so that each cluster's members stay in raster order
+        labeled_idx = np.argwhere(self.valid_clusters)
+        labels = self.valid_clusters[labeled_idx[:, 0], labeled_idx[:, 1]]
+        label_order = np.argsort(labels, kind="stable")
+        labeled_idx = labeled_idx[label_order]
+        self.cluster_bounds = np.searchsorted(
+            labels[label_order], np.arange(1, self.num_clusters + 2)
+        )
+        self.cluster_sizes = np.diff(self.cluster_bounds)
+        self.cluster_centroids = np.floor(
+            np.add.reduceat(labeled_idx, self.cluster_bounds[:-1], axis=0)
+            / self.cluster_sizes[:, np.newaxis]
+        ).astype(np.uint16)
+
+        # every row of the metadata columns is a sparkle pixel, and rows are grouped by cluster
+        self.num_rows = labeled_idx.shape[0]
+        self.y = np.ascontiguousarray(labeled_idx[:, 0])
+        self.x = np.ascontiguousarray(labeled_idx[:, 1])
+        self.row_clusters = np.repeat(np.arange(self.num_clusters), self.cluster_sizes)
+
+        # everything below is computed once over the arrays of all sparkle pixels and cluster centroids
+        nav = sparkle.nav
+        stats = self.sparkle.SDCAStats
+        y = self.y
+        x = self.x
+        centroid_y = self.cluster_centroids[:, 0]
+        centroid_x = self.cluster_centroids[:, 1]
+
+        self.centroid_lat = _rounded(nav.lat_deg[centroid_y, centroid_x], 5)
+        self.centroid_lon = _rounded(nav.lon_deg[centroid_y, centroid_x], 5)
+        (
+            centroid_omega,
+            centroid_beta,
+            centroid_gamma,
+        ) = SparkleNavigation.calc_reflections(
+            nav.sun_az[centroid_y, centroid_x],
+            nav.sun_za[centroid_y, centroid_x],
+            nav.sat_az[centroid_y, centroid_x],
+            nav.sat_za[centroid_y, centroid_x],
+        )
+        self.centroid_omega_deg = _rounded(centroid_omega, 5, degrees=True)
+        self.centroid_beta_deg = _rounded(centroid_beta, 6, degrees=True)
+        self.centroid_gamma_deg = _rounded(centroid_gamma, 5, degrees=True)
+
+        self.lat = _rounded(nav.lat_deg[y, x], 5)
+        self.lon = _rounded(nav.lon_deg[y, x], 5)
+        omega, beta, gamma = SparkleNavigation.calc_reflections(
+            nav.sun_az[y, x], nav.sun_za[y, x], nav.sat_az[y, x], nav.sat_za[y, x]
+        )
+        area_m = super(type(nav), nav).pixel_area(
+            nav.y_rad[y, x],
+            nav.x_rad[y, x],
+            np.full(y.shape, nav.abi_data["goes_imager_projection"].semi_major_axis),
+            np.full(
+                y.shape,
+                nav.abi_data["goes_imager_projection"].perspective_point_height,
+            ),
+            np.full(y.shape, nav.abi_data.resolution_ifov),
+        )
+
+        # store the emissive radiance in wavelength space to match reflective radiance
+        c07_rad_wvl = rad_wvn2wvl(
+            sparkle.c07_image.rad[y, x],
+            *sparkle.c07_image.abi_data.instrument_coefficients.eqw,
+        )
+        c14_rad_wvl = rad_wvn2wvl(
+            sparkle.c14_image.rad[y, x],
+            *sparkle.c14_image.abi_data.instrument_coefficients.eqw,
+        )
+
+        self.dqfs = {
+            "c02": sparkle.c02_image.dqf[y, x],
+            "c05": sparkle.c05_image.dqf[y, x],
+            "c07": sparkle.c07_image.dqf[y, x],
+            "c14": sparkle.c14_image.dqf[y, x],
+        }
+        self.rads = {
+            "c02": _rounded(sparkle.c02_image.rad[y, x], 5),
+            "c05": _rounded(sparkle.c05_image.rad[y, x], 5),
+            "c07": _rounded(c07_rad_wvl, 5),
+            "c14": _rounded(c14_rad_wvl, 5),
+        }
+        self.rfs = {
+            "c02": _rounded(sparkle.c02_image.cmi[y, x], 7),
+            "c05": _rounded(sparkle.c05_image.cmi[y, x], 7),
+            "c07": _rounded(sparkle.c07_nirrefl.rf[y, x], 7),
+        }
+        self.bts = {
+            "c07": _rounded(sparkle.c07_image.cmi[y, x], 5),
+            "c14": _rounded(sparkle.c14_image.cmi[y, x], 5),
+        }
+
+        # statistics are stored as float32 and rounded in float64 like the per-pixel values
+        self.devs = {
+            "c02_rf": _rounded(stats.get_deviations(y, x, "c02_rf_deviation"), 7),
+            "c05_rf": _rounded(stats.get_deviations(y, x, "c05_rf_deviation"), 7),
+            "c07_rf": _rounded(stats.get_deviations(y, x, "c07_rf_deviation"), 7),
+            "c14_bt": _rounded(stats.get_deviations(y, x, "c14_bt_deviation"), 5),
+        }
+        self.stdevs = {
+            "c02_rf": _rounded(stats.get_deviations(y, x, "c02_rf_stdev"), 7),
+            "c05_rf": _rounded(stats.get_deviations(y, x, "c05_rf_stdev"), 7),
+            "c07_rf": _rounded(stats.get_deviations(y, x, "c07_rf_stdev"), 7),
+            "c14_bt": _rounded(stats.get_deviations(y, x, "c14_bt_stdev"), 5),
+        }
+
+        self.navs = {
+            # these angles are already calculated in SDCA for an entire image
+            "sun_za_deg": _rounded(nav.sun_za[y, x], 6, degrees=True),
+            "sun_az_deg": _rounded(nav.sun_az[y, x], 5, degrees=True),
+            "sat_za_deg": _rounded(nav.sat_za[y, x], 6, degrees=True),
+            "sat_az_deg": _rounded(nav.sat_az[y, x], 5, degrees=True),
+            "glint_angle_deg": _rounded(nav.glint_angle[y, x], 5, degrees=True),
+            # these are only calculated for sparkle pixels
+            "omega_deg": _rounded(omega, 5, degrees=True),
+            "beta_deg": _rounded(beta, 6, degrees=True),
+            "gamma_deg": _rounded(gamma, 5, degrees=True),
+            "area_m": _rounded(area_m, 2),
+        }
+
+        self.debugs = {
+            "algo_passes": stats.get_debugs(y, x, "algo_passes").astype(np.int64),
+            "window_radius": stats.get_debugs(y, x, "window_radius").astype(np.int64),
+            "window_iterations": stats.get_debugs(y, x, "window_iterations").astype(
+                np.int64
+            ),
+            "window_valid_proportion": _rounded(
+                stats.get_debugs(y, x, "window_valid_proportion"), 7
+            ),
+        }
+
+        self.time_coverage_start = (
+            sparkle.c02_image.abi_data.time_coverage_start.strftime(db_time_format)
+        )
+        self.time_coverage_end = sparkle.c02_image.abi_data.time_coverage_end.strftime(
+            db_time_format
+        )
+        self.files = {
+            "c02": sparkle.c02_image.abi_data.dataset_name,
+            "c05": sparkle.c05_image.abi_data.dataset_name,
+            "c07": sparkle.c07_image.abi_data.dataset_name,
+            "c14": sparkle.c14_image.abi_data.dataset_name,
+        }
+
+        self.rows = dict(zip(zip(y.tolist(), x.tolist()), range(self.num_rows)))
+
         # for each cluster of adjacent True pixels in the valid_sparkle image:
-        for cluster in range(1, self.num_clusters + 1):
-            # get some information about each cluster
+        for cluster in range(self.num_clusters):
             cluster_id = (
                 sparkle.source_abi_data.time_coverage_start.strftime(safe_time_format)
                 + "_"
                 + str(uuid.uuid4())
             )
-            cluster_centroid_idx = tuple(
-                np.floor(
-                    np.mean(np.nonzero(self.valid_clusters == cluster), axis=1)
-                ).astype(np.uint16)
-            )
-
-            cluster_centroid_lat = float(
-                np.round(sparkle.nav.lat_deg[cluster_centroid_idx].item(), 5)
-            )
-            cluster_centroid_lon = float(
-                np.round(sparkle.nav.lon_deg[cluster_centroid_idx].item(), 5)
-            )
-
-            (
-                cluster_centroid_omega,
-                cluster_centroid_beta,
-                cluster_centroid_gamma,
-            ) = SparkleNavigation.calc_reflections(
-                np.atleast_1d(sparkle.nav.sun_az[cluster_centroid_idx]),
-                np.atleast_1d(sparkle.nav.sun_za[cluster_centroid_idx]),
-                np.atleast_1d(sparkle.nav.sat_az[cluster_centroid_idx]),
-                np.atleast_1d(sparkle.nav.sat_za[cluster_centroid_idx]),
-            )
-
-            self.cluster_map[str(cluster_id)] = cluster_centroid_idx
-            num_in_cluster = np.count_nonzero(self.valid_clusters == cluster)
-
-            # for each index in each cluster:
-            for idx in np.argwhere(self.valid_clusters == cluster):
-                idx = tuple((int((idx[0])), int(idx[1])))
-
-                idx_lat = float(np.round(sparkle.nav.lat_deg[idx].item(), 5))
-                idx_lon = float(np.round(sparkle.nav.lon_deg[idx].item(), 5))
-
-                # these values are calculated explicitly rather than creating a single-index SparkleNavigation object for each index, or computing on an entire image
-                idx_omega, idx_beta, idx_gamma = SparkleNavigation.calc_reflections(
-                    np.atleast_1d(sparkle.nav.sun_az[idx]),
-                    np.atleast_1d(sparkle.nav.sun_za[idx]),
-                    np.atleast_1d(sparkle.nav.sat_az[idx]),
-                    np.atleast_1d(sparkle.nav.sat_za[idx]),
-                )
-                idx_area_m = super(type(sparkle.nav), sparkle.nav).pixel_area(
-                    np.atleast_1d(sparkle.nav.y_rad[idx]),
-                    np.atleast_1d(sparkle.nav.x_rad[idx]),
-                    np.atleast_1d(
-                        sparkle.nav.abi_data["goes_imager_projection"].semi_major_axis
-                    ),
-                    np.atleast_1d(
-                        sparkle.nav.abi_data[
-                            "goes_imager_projection"
-                        ].perspective_point_height
-                    ),
-                    np.atleast_1d(sparkle.nav.abi_data.resolution_ifov),
-                )
-
-                # store the emissive radiance in wavelength space to match reflective radiance
-                c07_rad_wvl = rad_wvn2wvl(
-                    np.atleast_1d(sparkle.c07_image.rad[idx]),
-                    *sparkle.c07_image.abi_data.instrument_coefficients.eqw,
-                )
-                c14_rad_wvl = rad_wvn2wvl(
-                    np.atleast_1d(sparkle.c14_image.rad[idx]),
-                    *sparkle.c14_image.abi_data.instrument_coefficients.eqw,
-                )
-
-                idx_meta = {
-                    "event": "valid_sparkle",
-                    "time_coverage_start": sparkle.c02_image.abi_data.time_coverage_start.strftime(
-                        db_time_format
-                    ),
-                    "time_coverage_end": sparkle.c02_image.abi_data.time_coverage_end.strftime(
-                        db_time_format
-                    ),
-                    "y": int(idx[0]),
-                    "x": int(idx[1]),
-                    "lat": idx_lat,
-                    "lon": idx_lon,
-                    "google_maps": f"https://www.google.com/maps/@?api=1&map_action=map&center={idx_lat},{idx_lon}&zoom=14&basemap=satellite",
-                    "cluster": {
-                        "id": str(cluster_id),
-                        "centroid_y": int(cluster_centroid_idx[0]),
-                        "centroid_x": int(cluster_centroid_idx[1]),
-                        "centroid_lat": cluster_centroid_lat,
-                        "centroid_lon": cluster_centroid_lon,
-                        "centroid_google_maps": f"https://www.google.com/maps/@?api=1&map_action=map&center={cluster_centroid_lat},{cluster_centroid_lon}&zoom=14&basemap=satellite",
-                        "centroid_omega_deg": float(
-                            np.round(np.rad2deg(cluster_centroid_omega.item()), 5)
-                        ),
-                        "centroid_beta_deg": float(
-                            np.round(np.rad2deg(cluster_centroid_beta.item()), 6)
-                        ),
-                        "centroid_gamma_deg": float(
-                            np.round(np.rad2deg(cluster_centroid_gamma.item()), 5)
-                        ),
-                        "size": num_in_cluster,
-                    },
-                    "files": {
-                        "c02": sparkle.c02_image.abi_data.dataset_name,
-                        "c05": sparkle.c05_image.abi_data.dataset_name,
-                        "c07": sparkle.c07_image.abi_data.dataset_name,
-                        "c14": sparkle.c14_image.abi_data.dataset_name,
-                    },
-                    "dqfs": {
-                        "c02": int(sparkle.c02_image.dqf[idx].item()),
-                        "c05": int(sparkle.c05_image.dqf[idx].item()),
-                        "c07": int(sparkle.c07_image.dqf[idx].item()),
-                        "c14": int(sparkle.c14_image.dqf[idx].item()),
-                    },
-                    "rads": {
-                        "c02": float(np.round(sparkle.c02_image.rad[idx].item(), 5)),
-                        "c05": float(np.round(sparkle.c05_image.rad[idx].item(), 5)),
-                        "c07": float(np.round(c07_rad_wvl.item(), 5)),
-                        "c14": float(np.round(c14_rad_wvl.item(), 5)),
-                    },
-                    "rfs": {
-                        "c02": float(np.round(sparkle.c02_image.cmi[idx].item(), 7)),
-                        "c05": float(np.round(sparkle.c05_image.cmi[idx].item(), 7)),
-                        "c07": float(np.round(sparkle.c07_nirrefl.rf[idx].item(), 7)),
-                    },
-                    "bts": {
-                        "c07": float(np.round(sparkle.c07_image.cmi[idx].item(), 5)),
-                        "c14": float(np.round(sparkle.c14_image.cmi[idx].item(), 5)),
-                    },
-                    "devs": {
-                        "c02_rf": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c02_rf_deviation"
-                                ),
-                                7,
-                            )
-                        ),
-                        "c05_rf": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c05_rf_deviation"
-                                ),
-                                7,
-                            )
-                        ),
-                        "c07_rf": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c07_rf_deviation"
-                                ),
-                                7,
-                            )
-                        ),
-                        "c14_bt": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c14_bt_deviation"
-                                ),
-                                5,
-                            )
-                        ),
-                    },
-                    "stdevs": {
-                        "c02_rf": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c02_rf_stdev"
-                                ),
-                                7,
-                            )
-                        ),
-                        "c05_rf": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c05_rf_stdev"
-                                ),
-                                7,
-                            )
-                        ),
-                        "c07_rf": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c07_rf_stdev"
-                                ),
-                                7,
-                            )
-                        ),
-                        "c14_bt": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_deviation(
-                                    idx, "c14_bt_stdev"
-                                ),
-                                5,
-                            )
-                        ),
-                    },
-                    "nav": {
-                        # these angles are already calculated in SDCA for an entire image
-                        "sun_za_deg": float(
-                            np.round(np.rad2deg(sparkle.nav.sun_za[idx].item()), 6)
-                        ),
-                        "sun_az_deg": float(
-                            np.round(np.rad2deg(sparkle.nav.sun_az[idx].item()), 5)
-                        ),
-                        "sat_za_deg": float(
-                            np.round(np.rad2deg(sparkle.nav.sat_za[idx].item()), 6)
-                        ),
-                        "sat_az_deg": float(
-                            np.round(np.rad2deg(sparkle.nav.sat_az[idx].item()), 5)
-                        ),
-                        "glint_angle_deg": float(
-                            np.round(np.rad2deg(sparkle.nav.glint_angle[idx].item()), 5)
-                        ),
-                        # these are calculated on a per-pixel basis for sparklemeta
-                        "omega_deg": float(np.round(np.rad2deg(idx_omega.item()), 5)),
-                        "beta_deg": float(np.round(np.rad2deg(idx_beta.item()), 6)),
-                        "gamma_deg": float(np.round(np.rad2deg(idx_gamma.item()), 5)),
-                        "area_m": float(np.round(idx_area_m.item(), 2)),
-                    },
-                    "flags": list(sparkle.SDCAFlags.idx_decode(idx).values()),
-                    "debug": {
-                        "algo_passes": int(
-                            self.sparkle.SDCAStats.get_debug(idx, "algo_passes")
-                        ),
-                        "window_radius": int(
-                            self.sparkle.SDCAStats.get_debug(idx, "window_radius")
-                        ),
-                        "window_iterations": int(
-                            self.sparkle.SDCAStats.get_debug(idx, "window_iterations")
-                        ),
-                        "window_valid_proportion": float(
-                            np.round(
-                                self.sparkle.SDCAStats.get_debug(
-                                    idx, "window_valid_proportion"
-                                ),
-                                7,
-                            )
-                        ),
-                    },
-                }
-
-                self.algo_meta.append(idx_meta)
+            self.cluster_map[cluster_id] = tuple(self.cluster_centroids[cluster])
+            self.clusters[cluster_id] = cluster
+
+        self.cluster_ids = list(self.clusters.keys())
+
+    @property
+    def algo_meta(self):
+        return SDCARecords(self)
+
+    def cluster_record(self, cluster):
+        cluster_lat = self.centroid_lat[cluster].item()
+        cluster_lon = self.centroid_lon[cluster].item()
+
+        return {
+            "id": self.cluster_ids[cluster],
+            "centroid_y": int(self.cluster_centroids[cluster, 0]),
+            "centroid_x": int(self.cluster_centroids[cluster, 1]),
+            "centroid_lat": cluster_lat,
+            "centroid_lon": cluster_lon,
+            "centroid_google_maps": _google_maps(cluster_lat, cluster_lon),
+            "centroid_omega_deg": self.centroid_omega_deg[cluster].item(),
+            "centroid_beta_deg": self.centroid_beta_deg[cluster].item(),
+            "centroid_gamma_deg": self.centroid_gamma_deg[cluster].item(),
+            "size": int(self.cluster_sizes[cluster]),
+        }
+
+    def record(self, row):
+        """Materializes the nested metadata dict of one row of the metadata columns"""
+        idx = (int(self.y[row]), int(self.x[row]))
+        lat = self.lat[row].item()
+        lon = self.lon[row].item()
+
+        return {
+            "event": "valid_sparkle",
+            "time_coverage_start": self.time_coverage_start,
+            "time_coverage_end": self.time_coverage_end,
+            "y": idx[0],
+            "x": idx[1],
+            "lat": lat,
+            "lon": lon,
+            "google_maps": _google_maps(lat, lon),
+            "cluster": self.cluster_record(self.row_clusters[row]),
+            "files": dict(self.files),
+            "dqfs": {k: v[row].item() for k, v in self.dqfs.items()},
+            "rads": {k: v[row].item() for k, v in self.rads.items()},
+            "rfs": {k: v[row].item() for k, v in self.rfs.items()},
+            "bts": {k: v[row].item() for k, v in self.bts.items()},
+            "devs": {k: v[row].item() for k, v in self.devs.items()},
+            "stdevs": {k: v[row].item() for k, v in self.stdevs.items()},
+            "nav": {k: v[row].item() for k, v in self.navs.items()},
+            "flags": list(self.sparkle.SDCAFlags.idx_decode(idx).values()),
+            "debug": {k: v[row].item() for k, v in self.debugs.items()},
+        }
+
+    def records(self, start=0, stop=None):
+        """Streams the nested metadata dicts of a range of rows, one at a time"""
+        if stop is None:
+            stop = self.num_rows
+
+        for row in range(start, stop):
+            yield self.record(row)
 
     def get_idx(self, idx):
         y, x = idx
-        for i in self.algo_meta:
-            if i["y"] == y and i["x"] == x:
-                return i
+        row = self.rows.get((int(y), int(x)))
+        if row is None:
+            return None
 
-        return None
+        return self.record(row)
 
     def get_cluster_members(self, cluster_id):
-        cluster_members = []
-        for i in self.algo_meta:
-            if i["cluster"]["id"] == cluster_id:
-                cluster_members.append(i)
+        cluster = self.clusters.get(cluster_id)
+        if cluster is None:
+            return []
 
-        return cluster_members
+        return list(
+            self.records(self.cluster_bounds[cluster], self.cluster_bounds[cluster + 1])
+        )
 
     def get_clusters(self):
-        clusters = []
+        return [self.cluster_record(cluster) for cluster in range(self.num_clusters)]
+
+    def write_events(self, dest, format="ndjson", verbosity="members"):
+        """
+        Streams sparkle events to a path or file-like object, one per line, straight from the metadata columns.
+        format is "ndjson" for newline-delimited JSON or "geojson" for a GeoJSON FeatureCollection of points.
+        verbosity is "members" for an event per sparkle pixel or "clusters" for an event per cluster centroid
+        """
+        if format not in ["ndjson", "geojson"]:
+            raise Exception("Unknown event format " + str(format))
+
+        if verbosity not in ["members", "clusters"]:
+            raise Exception("Unknown event verbosity " + str(verbosity))
+
+        if hasattr(dest, "write"):
+            self._write_events(dest, format, verbosity)
+
+        else:
+            with open(dest, "w") as f:
+                self._write_events(f, format, verbosity)
+
+    def _write_events(self, f, format, verbosity):
+        if format == "geojson":
+            f.write('{"type": "FeatureCollection", "features": [\n')
+
+        separator = ""
+        for cluster in range(self.num_clusters):
+            cluster_json = self._cluster_json(cluster)
+
+            if verbosity == "clusters":
+                events = [
+                    (
+                        cluster_json,
+                        self.centroid_lat[cluster].item(),
+                        self.centroid_lon[cluster].item(),
+                    )
+                ]
+
+            else:
+                events = (
+                    (
+                        self._record_json(row, cluster_json),
+                        self.lat[row].item(),
+                        self.lon[row].item(),
+                    )
+                    for row in range(
+                        self.cluster_bounds[cluster], self.cluster_bounds[cluster + 1]
+                    )
+                )
 
-        for cluster_id in self.cluster_map.keys():
-            clusters.append(self.get_cluster_members(cluster_id)[0]["cluster"])
+            for event, lat, lon in events:
+                if format == "geojson":
+                    event = (
+                        '{"type": "Feature", "geometry": {"type": "Point", "coordinates": ['
+                        + _json_value(lon)
+                        + ", "
+                        + _json_value(lat)
+                        + ']}, "properties": '
+                        + event
+                        + "}"
+                    )
+
+                f.write(separator + event)
+                separator = ",\n" if format == "geojson" else "\n"
+
+        if format == "geojson":
+            f.write("\n]}\n")
+
+        elif separator:
+            f.write("\n")
+
+    def _cluster_json(self, cluster):
+        lat = self.centroid_lat[cluster].item()
+        lon = self.centroid_lon[cluster].item()
+
+        return _json_object(
+            [
+                ("id", _json_value(self.cluster_ids[cluster])),
+                ("centroid_y", _json_value(int(self.cluster_centroids[cluster, 0]))),
+                ("centroid_x", _json_value(int(self.cluster_centroids[cluster, 1]))),
+                ("centroid_lat", _json_value(lat)),
+                ("centroid_lon", _json_value(lon)),
+                ("centroid_google_maps", _json_value(_google_maps(lat, lon))),
+                (
+                    "centroid_omega_deg",
+                    _json_value(self.centroid_omega_deg[cluster].item()),
+                ),
+                (
+                    "centroid_beta_deg",
+                    _json_value(self.centroid_beta_deg[cluster].item()),
+                ),
+                (
+                    "centroid_gamma_deg",
+                    _json_value(self.centroid_gamma_deg[cluster].item()),
+                ),
+                ("size", _json_value(int(self.cluster_sizes[cluster]))),
+            ]
+        )
 
-        return clusters
+    def _record_json(self, row, cluster_json):
+        # serializes the same record as record(row), without materializing its dicts
+        idx = (int(self.y[row]), int(self.x[row]))
+        lat = self.lat[row].item()
+        lon = self.lon[row].item()
+
+        return _json_object(
+            [
+                ("event", '"valid_sparkle"'),
+                ("time_coverage_start", _json_value(self.time_coverage_start)),
+                ("time_coverage_end", _json_value(self.time_coverage_end)),
+                ("y", _json_value(idx[0])),
+                ("x", _json_value(idx[1])),
+                ("lat", _json_value(lat)),
+                ("lon", _json_value(lon)),
+                ("google_maps", _json_value(_google_maps(lat, lon))),
+                ("cluster", cluster_json),
+                ("files", _json_columns(self.files)),
+                ("dqfs", _json_columns(self.dqfs, row)),
+                ("rads", _json_columns(self.rads, row)),
+                ("rfs", _json_columns(self.rfs, row)),
+                ("bts", _json_columns(self.bts, row)),
+                ("devs", _json_columns(self.devs, row)),
+                ("stdevs", _json_columns(self.stdevs, row)),
+                ("nav", _json_columns(self.navs, row)),
+                (
+                    "flags",
+                    json.dumps(list(self.sparkle.SDCAFlags.idx_decode(idx).values())),
+                ),
+                ("debug", _json_columns(self.debugs, row)),
+            ]
+        )
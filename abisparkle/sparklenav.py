@@ -19,6 +19,11 @@
 
 """Runs the standard ABI navigation routines as well as calculations for specular reflection vectors"""
 
+import hashlib
+import shutil
+import tempfile
+from pathlib import Path
+
 import numpy as np
 from heregoes import navigation
 from heregoes.util import njit
@@ -136,6 +141,7 @@ class FastSparkleNavigation(SparkleNavigation):
         sat_az,
         precise_sun=False,
         subsample_factor=1,
+        area_m=None,
     ):
         self.abi_data = abi_data
         self.lat_deg = lat_deg[::subsample_factor, ::subsample_factor]
@@ -154,7 +160,11 @@ class FastSparkleNavigation(SparkleNavigation):
 
         self._sun_za = None
         self._sun_az = None
+
+        # area_m is calculated when it is first read unless it is provided
         self._area_m = None
+        if area_m is not None:
+            self._area_m = area_m[::subsample_factor, ::subsample_factor]
 
         self.time = self.abi_data.midpoint_time
 
@@ -167,3 +177,92 @@ class FastSparkleNavigation(SparkleNavigation):
 
         if self.hae_m.shape != self.lat_deg.shape:
             self.hae_m = np.full(self.lat_deg.shape, self.hae_m, dtype=np.float32)
+
+
+class NavigationCache:
+    """
+    Persists the navigation fields of fixed ABI sectors that don't change from scan to scan, keyed by platform, scene, and the extents and resolution of the fixed grid.
+    Cached fields are stored as float32 .npy files and memory-mapped into a FastSparkleNavigation, so only the Sun and reflection terms are calculated for each scan
+    """
+
+    # only these sectors keep the same fixed grid from scan to scan
+    fixed_scenes = ["Full Disk", "CONUS"]
+
+    # fields of SparkleNavigation that only depend on the fixed grid and the satellite
+    static_fields = ["lat_deg", "lon_deg", "sat_za", "sat_az", "area_m"]
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+
+    def key(self, abi_data):
+        # identifies the fixed grid of abi_data, or returns None if its sector moves between scans
+        scene_id = str(getattr(abi_data, "scene_id", ""))
+        if scene_id not in self.fixed_scenes:
+            return None
+
+        x = abi_data["x"][...]
+        y = abi_data["y"][...]
+        grid = (
+            str(getattr(abi_data, "platform_ID", "")),
+            scene_id,
+            y.shape[0],
+            x.shape[0],
+            float(y[0]),
+            float(y[-1]),
+            float(x[0]),
+            float(x[-1]),
+            float(abi_data.resolution_ifov),
+        )
+
+        return (
+            grid[0]
+            + "_"
+            + scene_id.replace(" ", "")
+            + "_"
+            + hashlib.sha1(repr(grid).encode()).hexdigest()[:16]
+        )
+
+    def get(self, abi_data, precise_sun=False):
+        """
+        Returns a navigation of abi_data built from the cached fields of its fixed grid.
+        On the first scan of a fixed grid, the full navigation is calculated, cached and returned
+        """
+        key = self.key(abi_data)
+        if key is None:
+            return SparkleNavigation(abi_data, precise_sun=precise_sun)
+
+        entry_dir = self.cache_dir.joinpath(key)
+        if not entry_dir.exists():
+            nav = SparkleNavigation(abi_data, precise_sun=precise_sun)
+            self.store(entry_dir, nav)
+            return nav
+
+        fields = {
+            field: np.load(entry_dir.joinpath(field + ".npy"), mmap_mode="r")
+            for field in self.static_fields
+        }
+        return FastSparkleNavigation(
+            abi_data,
+            fields["lat_deg"],
+            fields["lon_deg"],
+            fields["sat_za"],
+            fields["sat_az"],
+            precise_sun=precise_sun,
+            area_m=fields["area_m"],
+        )
+
+    def store(self, entry_dir, nav):
+        # writes to a temporary directory first so that concurrent readers never see a partial entry
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.cache_dir))
+        for field in self.static_fields:
+            np.save(
+                tmp_dir.joinpath(field + ".npy"),
+                np.ma.filled(getattr(nav, field), np.nan).astype(np.float32),
+            )
+
+        try:
+            tmp_dir.rename(entry_dir)
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp_dir)
@@ -38,10 +38,15 @@ class SDCAParams:
 
         self.algo_params["min_daylit_portion_of_land"] = ntypes.float32(0.1)
         self.algo_params["max_algo_passes"] = ntypes.float32(2.0)
+        self.algo_params["max_frozen_algo_passes"] = ntypes.float32(9.0)
+        # candidates whose background windows are unchanged since the previous pass keep their previous result instead of being re-evaluated
+        self.algo_params["reuse_unchanged_windows"] = ntypes.float32(1.0)
 
         self.algo_params["first_window_radius"] = ntypes.float32(15.0)
         self.algo_params["max_window_radius_iter"] = ntypes.float32(3.0)
         self.algo_params["min_window_clean_proportion_threshold"] = ntypes.float32(0.75)
+        # rows the summed-area tables of the "sat" backend extend past the largest window, trading memory for fewer rebuilds
+        self.algo_params["window_table_advance_rows"] = ntypes.float32(32.0)
 
         self.algo_params["exclude_border_width"] = ntypes.float32(15.0)
         self.algo_params["exclude_dqf_radius"] = ntypes.float32(10.0)
@@ -68,5 +73,16 @@ class SDCAParams:
         self.algo_params["c14_bt_standard_deviation_max_threshold"] = ntypes.float32(
             8.0
         )
+
+        # the sparkle validation tests stop at the first failure in this order, unless full_window_statistics records every test for debugging.
+        # With learn_test_order, tests that reject the most candidates in a scene are moved first on later passes, which makes the statistics
+        # recorded for rejected candidates depend on the rest of the scene
+        self.algo_params["full_window_statistics"] = ntypes.float32(0.0)
+        self.algo_params["learn_test_order"] = ntypes.float32(0.0)
+        self.algo_params["c02_rf_deviation_test_order"] = ntypes.float32(1.0)
+        self.algo_params["c05_rf_deviation_test_order"] = ntypes.float32(2.0)
+        self.algo_params["c07_rf_deviation_test_order"] = ntypes.float32(3.0)
+        self.algo_params["c14_bt_deviation_test_order"] = ntypes.float32(4.0)
+        self.algo_params["c14_bt_standard_deviation_test_order"] = ntypes.float32(5.0)
         #############################################################################
         #############################################################################
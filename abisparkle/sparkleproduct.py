@@ -0,0 +1,197 @@
+# Copyright (c) 2021-2023.
+
+# Author(s):
+
+#   Harry Dove-Robinson <admin@wx-star.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Writes algorithm flags, masks, cluster labels and statistics to a compressed netCDF4 product on the C02 grid"""
+
+import netCDF4
+import numpy as np
+
+from abisparkle.sparklemeta import db_time_format
+
+# attributes of the fixed grid projection carried over from the source C02 image
+projection_attrs = [
+    "grid_mapping_name",
+    "perspective_point_height",
+    "semi_major_axis",
+    "semi_minor_axis",
+    "inverse_flattening",
+    "latitude_of_projection_origin",
+    "longitude_of_projection_origin",
+    "sweep_angle_axis",
+]
+
+
+class SDCAProduct:
+    def __init__(self, sparkle):
+        self.sparkle = sparkle
+
+    def write(self, path, chunk_size=512, complevel=4):
+        """
+        Writes a CF-style netCDF4 product to path. Rasters are stored in chunk_size x chunk_size tiles with zlib and shuffle compression,
+        so the mostly-zero rasters of a scene compress to a few MB and reading back a sub-region only decompresses the tiles it overlaps
+        """
+        sparkle = self.sparkle
+        source_abi_data = sparkle.source_abi_data
+        chunks = (
+            min(chunk_size, sparkle.source_shape[0]),
+            min(chunk_size, sparkle.source_shape[1]),
+        )
+        compression = {"zlib": True, "shuffle": True, "complevel": complevel}
+
+        with netCDF4.Dataset(path, "w", format="NETCDF4") as ds:
+            ds.Conventions = "CF-1.7"
+            ds.title = (
+                "ABI Sparkle Detection and Characterization Algorithm (SDCA) product"
+            )
+            ds.time_coverage_start = source_abi_data.time_coverage_start.strftime(
+                db_time_format
+            )
+            ds.time_coverage_end = source_abi_data.time_coverage_end.strftime(
+                db_time_format
+            )
+            ds.source_c02 = sparkle.c02_image.abi_data.dataset_name
+            ds.source_c05 = sparkle.c05_image.abi_data.dataset_name
+            ds.source_c07 = sparkle.c07_image.abi_data.dataset_name
+            ds.source_c14 = sparkle.c14_image.abi_data.dataset_name
+
+            ds.createDimension("y", sparkle.source_shape[0])
+            ds.createDimension("x", sparkle.source_shape[1])
+
+            # a dimension of size 0 would be unlimited, so the cluster and candidate dimensions are only written when they have members
+            coords, table, _ = sparkle.SDCAStats.export()
+            ds.num_clusters = np.int32(sparkle.SDCAMeta.num_clusters)
+            ds.num_candidates = np.int32(coords.shape[0])
+
+            #############################################################################
+            #################################fixed grid##################################
+            for dim in ["y", "x"]:
+                var = ds.createVariable(dim, np.float64, (dim,))
+                var.units = "rad"
+                var.axis = dim.upper()
+                var.standard_name = "projection_" + dim + "_coordinate"
+                var[:] = source_abi_data[dim][...]
+
+            projection = ds.createVariable("goes_imager_projection", np.int32)
+            for attr in projection_attrs:
+                value = getattr(source_abi_data["goes_imager_projection"], attr, None)
+                if value is not None:
+                    projection.setncattr(attr, value)
+            #############################################################################
+            #############################################################################
+
+            #############################################################################
+            ###################################rasters###################################
+            flag_def = sorted(
+                (bit, name)
+                for name, bit in sparkle.SDCAFlags.algo_flag_def.items()
+                if not name.startswith("flag_offset")
+            )
+            algo_flags = ds.createVariable(
+                "algo_flags", np.int64, ("y", "x"), chunksizes=chunks, **compression
+            )
+            algo_flags.long_name = "SDCA algorithm flag bitfield"
+            algo_flags.grid_mapping = "goes_imager_projection"
+            algo_flags.flag_masks = np.array(
+                [np.int64(1) << np.int64(bit) for bit, _ in flag_def], dtype=np.int64
+            )
+            algo_flags.flag_meanings = " ".join(name for _, name in flag_def)
+            algo_flags[:] = sparkle.SDCAFlags.algo_flags
+
+            validated_mask = ds.createVariable(
+                "validated_mask", np.uint8, ("y", "x"), chunksizes=chunks, **compression
+            )
+            validated_mask.long_name = "Valid sparkle mask"
+            validated_mask.grid_mapping = "goes_imager_projection"
+            validated_mask.flag_values = np.array([0, 1], dtype=np.uint8)
+            validated_mask.flag_meanings = "not_sparkle valid_sparkle"
+            validated_mask[:] = sparkle.valid_sparkles.astype(np.uint8)
+
+            cluster_label = ds.createVariable(
+                "cluster_label", np.int32, ("y", "x"), chunksizes=chunks, **compression
+            )
+            cluster_label.long_name = (
+                "Sparkle cluster label, indexing the cluster dimension from 1"
+            )
+            cluster_label.grid_mapping = "goes_imager_projection"
+            cluster_label[:] = sparkle.SDCAMeta.valid_clusters.astype(np.int32)
+            #############################################################################
+            #############################################################################
+
+            #############################################################################
+            ##################################clusters###################################
+            if sparkle.SDCAMeta.num_clusters > 0:
+                ds.createDimension("cluster", sparkle.SDCAMeta.num_clusters)
+
+                cluster_id = ds.createVariable("cluster_id", str, ("cluster",))
+                cluster_id.long_name = "Sparkle cluster UUID"
+                cluster_centroid_y = ds.createVariable(
+                    "cluster_centroid_y", np.int32, ("cluster",)
+                )
+                cluster_centroid_x = ds.createVariable(
+                    "cluster_centroid_x", np.int32, ("cluster",)
+                )
+                cluster_size = ds.createVariable("cluster_size", np.int32, ("cluster",))
+
+                cluster_id[:] = np.array(sparkle.SDCAMeta.cluster_ids, dtype=object)
+                cluster_centroid_y[:] = sparkle.SDCAMeta.cluster_centroids[:, 0]
+                cluster_centroid_x[:] = sparkle.SDCAMeta.cluster_centroids[:, 1]
+                cluster_size[:] = sparkle.SDCAMeta.cluster_sizes
+            #############################################################################
+            #############################################################################
+
+            #############################################################################
+            ###########################sparse candidate stats############################
+            if coords.shape[0] > 0:
+                ds.createDimension("candidate", coords.shape[0])
+
+                candidate_y = ds.createVariable(
+                    "candidate_y", np.int32, ("candidate",), **compression
+                )
+                candidate_y.long_name = "Row of the candidate pixel on the y dimension"
+                candidate_y[:] = coords[:, 0]
+                candidate_x = ds.createVariable(
+                    "candidate_x", np.int32, ("candidate",), **compression
+                )
+                candidate_x.long_name = (
+                    "Column of the candidate pixel on the x dimension"
+                )
+                candidate_x[:] = coords[:, 1]
+
+                # statistics that were never set for a candidate are stored as the fill value
+                columns = dict(sparkle.SDCAStats.deviation_columns)
+                columns.update(sparkle.SDCAStats.debug_columns)
+                for name, column in columns.items():
+                    var = ds.createVariable(
+                        name,
+                        np.float32,
+                        ("candidate",),
+                        fill_value=np.float32(np.nan),
+                        **compression,
+                    )
+                    var.coordinates = "candidate_y candidate_x"
+                    var[:] = table[:, column]
+            #############################################################################
+            #############################################################################
+
+
+def read_region(path, variable, y_slice, x_slice):
+    """Reads a sub-region of a raster variable from a product written by SDCAProduct, decompressing only the chunks it overlaps"""
+    with netCDF4.Dataset(path, "r") as ds:
+        ds.set_auto_mask(False)
+        return ds[variable][y_slice, x_slice]
@@ -19,68 +19,236 @@
 
 """Stores algorithm-generated statistics and debug information per pixel index"""
 
+import numpy as np
 from numba.core import types as ntypes
 from numba.experimental import jitclass
 from numba.typed import Dict as ndict
 
-ndict_inner_kv_ty = (ntypes.unicode_type, ntypes.float32)
-ndict_outer_kv_ty = (
-    ntypes.UniTuple(ntypes.int64, 2),
-    ntypes.DictType(*ndict_inner_kv_ty),
+# columns of the statistics table, in the order they are exported
+c02_rf_deviation_column = 0
+c05_rf_deviation_column = 1
+c07_rf_deviation_column = 2
+c14_bt_deviation_column = 3
+c02_rf_stdev_column = 4
+c05_rf_stdev_column = 5
+c07_rf_stdev_column = 6
+c14_bt_stdev_column = 7
+algo_passes_column = 8
+window_radius_column = 9
+window_iterations_column = 10
+window_valid_proportion_column = 11
+unevaluated_tests_column = 12
+num_columns = 13
+
+# rows allocated for the first pixels, doubled whenever the table fills up
+initial_rows = 1024
+
+# names of the sparkle validation tests, indexed like the test_* definitions of sparklealgo
+test_names = (
+    "c02_rf_deviation",
+    "c05_rf_deviation",
+    "c07_rf_deviation",
+    "c14_bt_deviation",
+    "c14_bt_standard_deviation",
 )
+num_tests = len(test_names)
+test_evaluations_column = 0
+test_rejections_column = 1
+
+column_kv_ty = (ntypes.unicode_type, ntypes.int64)
+rows_kv_ty = (ntypes.UniTuple(ntypes.int64, 2), ntypes.int64)
+counter_kv_ty = (ntypes.unicode_type, ntypes.int64)
 spec = [
-    ("deviation_statistics", ntypes.DictType(*ndict_outer_kv_ty)),
-    ("debug_statistics", ntypes.DictType(*ndict_outer_kv_ty)),
-    ("_empty_child", ntypes.DictType(*ndict_inner_kv_ty)),
+    ("deviation_columns", ntypes.DictType(*column_kv_ty)),
+    ("debug_columns", ntypes.DictType(*column_kv_ty)),
+    ("rows", ntypes.DictType(*rows_kv_ty)),
+    ("num_rows", ntypes.int64),
+    ("coords", ntypes.int64[:, ::1]),
+    ("table", ntypes.float32[:, ::1]),
+    ("assigned", ntypes.int64[::1]),
+    ("counters", ntypes.DictType(*counter_kv_ty)),
+    ("test_counts", ntypes.int64[:, ::1]),
 ]
 
 
 @jitclass(spec)
 class SDCAStats:
     def __init__(self):
-        self.deviation_statistics = ndict.empty(*ndict_outer_kv_ty)
-        self.debug_statistics = ndict.empty(*ndict_outer_kv_ty)
-        self._empty_child = ndict.empty(*ndict_inner_kv_ty)
-
-    def _init_child(self, _dict, idx):
-        _dict[idx] = self._empty_child.copy()
-
-    def _is_empty_child(self, _dict, idx):
-        try:
-            val = _dict.get(idx)
-
-            return val is None or val == self._empty_child
-
-        except:
-            return True
+        #############################################################################
+        ###########################set up statistics columns#########################
+        self.deviation_columns = ndict.empty(*column_kv_ty)
+        self.deviation_columns["c02_rf_deviation"] = c02_rf_deviation_column
+        self.deviation_columns["c05_rf_deviation"] = c05_rf_deviation_column
+        self.deviation_columns["c07_rf_deviation"] = c07_rf_deviation_column
+        self.deviation_columns["c14_bt_deviation"] = c14_bt_deviation_column
+        self.deviation_columns["c02_rf_stdev"] = c02_rf_stdev_column
+        self.deviation_columns["c05_rf_stdev"] = c05_rf_stdev_column
+        self.deviation_columns["c07_rf_stdev"] = c07_rf_stdev_column
+        self.deviation_columns["c14_bt_stdev"] = c14_bt_stdev_column
+
+        self.debug_columns = ndict.empty(*column_kv_ty)
+        self.debug_columns["algo_passes"] = algo_passes_column
+        self.debug_columns["window_radius"] = window_radius_column
+        self.debug_columns["window_iterations"] = window_iterations_column
+        self.debug_columns["window_valid_proportion"] = window_valid_proportion_column
+        self.debug_columns["unevaluated_tests"] = unevaluated_tests_column
+        #############################################################################
+        #############################################################################
+
+        # each pixel with statistics is given the next row of the table, which holds nan until a column is set
+        self.rows = ndict.empty(*rows_kv_ty)
+        self.num_rows = 0
+        self.coords = np.zeros((initial_rows, 2), dtype=np.int64)
+        self.table = np.full((initial_rows, num_columns), np.nan, dtype=np.float32)
+
+        # bitfield of the columns that have been set for each row
+        self.assigned = np.zeros(initial_rows, dtype=np.int64)
+
+        self.counters = ndict.empty(*counter_kv_ty)
+
+        # evaluations and rejections of each sparkle validation test, kept by index since they are counted for every evaluated candidate
+        self.test_counts = np.zeros((num_tests, 2), dtype=np.int64)
+
+    def _grow(self):
+        coords = np.zeros((2 * self.coords.shape[0], 2), dtype=np.int64)
+        coords[: self.num_rows] = self.coords[: self.num_rows]
+        self.coords = coords
+
+        table = np.full(
+            (2 * self.table.shape[0], num_columns), np.nan, dtype=np.float32
+        )
+        table[: self.num_rows] = self.table[: self.num_rows]
+        self.table = table
+
+        assigned = np.zeros(2 * self.assigned.shape[0], dtype=np.int64)
+        assigned[: self.num_rows] = self.assigned[: self.num_rows]
+        self.assigned = assigned
+
+    def row(self, idx):
+        # returns the row of idx, adding one if idx has no statistics yet
+        idx = (np.int64(idx[0]), np.int64(idx[1]))
+        if idx in self.rows:
+            return self.rows[idx]
+
+        if self.num_rows == self.table.shape[0]:
+            self._grow()
+
+        row = self.num_rows
+        self.rows[idx] = row
+        self.coords[row, 0] = idx[0]
+        self.coords[row, 1] = idx[1]
+        self.num_rows += 1
+
+        return row
+
+    def set_value(self, row, column, value):
+        self.table[row, column] = ntypes.float32(value)
+        self.assigned[row] |= np.int64(1) << np.int64(column)
+
+    def clear_value(self, row, column):
+        self.table[row, column] = np.nan
+        self.assigned[row] &= ~(np.int64(1) << np.int64(column))
+
+    def get_value(self, idx, column, default=ntypes.float32(0.0)):
+        idx = (np.int64(idx[0]), np.int64(idx[1]))
+        if column == -1 or idx not in self.rows:
+            return default
 
-    def _set(self, _dict, idx, key, value):
-        _dict[idx][key] = ntypes.float32(value)
+        row = self.rows[idx]
+        if not self.assigned[row] & (np.int64(1) << np.int64(column)):
+            return default
 
-    def _get(self, _dict, idx, key, default=ntypes.float32(0.0)):
-        try:
-            if self._is_empty_child(_dict, idx):
-                return default
+        return self.table[row, column]
 
-            else:
-                return _dict[idx][key]
+    def column(self, columns, key):
+        # typed dict .get() with a default is typed as optional, so unknown keys are checked explicitly
+        if key in columns:
+            return columns[key]
 
-        except:
-            return default
+        return -1
 
     # @jitclass is experimental so these are concrete methods for now
     def set_deviation(self, idx, key, value):
-        if self._is_empty_child(self.deviation_statistics, idx):
-            self._init_child(self.deviation_statistics, idx)
-        self._set(self.deviation_statistics, idx, key, value)
+        self.set_value(self.row(idx), self.deviation_columns[key], value)
 
     def set_debug(self, idx, key, value):
-        if self._is_empty_child(self.debug_statistics, idx):
-            self._init_child(self.debug_statistics, idx)
-        self._set(self.debug_statistics, idx, key, value)
+        self.set_value(self.row(idx), self.debug_columns[key], value)
 
     def get_deviation(self, idx, key, default=ntypes.float32(0.0)):
-        return self._get(self.deviation_statistics, idx, key, default=default)
+        return self.get_value(
+            idx, self.column(self.deviation_columns, key), default=default
+        )
 
     def get_debug(self, idx, key, default=ntypes.float32(0.0)):
-        return self._get(self.debug_statistics, idx, key, default=default)
+        return self.get_value(
+            idx, self.column(self.debug_columns, key), default=default
+        )
+
+    def get_values(self, y, x, column, default=ntypes.float32(0.0)):
+        # gathers one column for many pixel indices at once, with the same defaults as get_value
+        values = np.empty(y.shape[0], dtype=np.float32)
+        for i in range(y.shape[0]):
+            values[i] = self.get_value((y[i], x[i]), column, default=default)
+
+        return values
+
+    def get_deviations(self, y, x, key, default=ntypes.float32(0.0)):
+        return self.get_values(
+            y, x, self.column(self.deviation_columns, key), default=default
+        )
+
+    def get_debugs(self, y, x, key, default=ntypes.float32(0.0)):
+        return self.get_values(
+            y, x, self.column(self.debug_columns, key), default=default
+        )
+
+    def export(self):
+        """
+        Returns the pixel index of each row, the table with a column per statistic in the order of the *_column definitions,
+        and the bitfield of the columns that were set for each row. Columns that were never set for a row hold nan
+        """
+        return (
+            self.coords[: self.num_rows].copy(),
+            self.table[: self.num_rows].copy(),
+            self.assigned[: self.num_rows].copy(),
+        )
+
+    # scene-wide counts of algorithm events
+    def add_counter(self, key, value):
+        if key in self.counters:
+            value += self.counters[key]
+
+        self.counters[key] = value
+
+    def add_test_counts(self, tests_evaluated, tests_failed):
+        # tests_evaluated and tests_failed are bitfields of the tests evaluated and failed for one candidate
+        for test in range(num_tests):
+            self.test_counts[test, test_evaluations_column] += (
+                tests_evaluated >> test
+            ) & 1
+            self.test_counts[test, test_rejections_column] += (tests_failed >> test) & 1
+
+    def export_counters(self):
+        """
+        Returns every scene-wide count by name, including the "<test>_evaluations" and "<test>_rejections" counts of each sparkle validation test
+        """
+        counters = ndict.empty(*counter_kv_ty)
+        for key, value in self.counters.items():
+            counters[key] = value
+
+        for test in range(num_tests):
+            counters[test_names[test] + "_evaluations"] = self.test_counts[
+                test, test_evaluations_column
+            ]
+            counters[test_names[test] + "_rejections"] = self.test_counts[
+                test, test_rejections_column
+            ]
+
+        return counters
+
+    def get_counter(self, key):
+        counters = self.export_counters()
+        if key in counters:
+            return counters[key]
+
+        return 0
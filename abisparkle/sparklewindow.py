@@ -0,0 +1,229 @@
+# Copyright (c) 2021-2023.
+
+# Author(s):
+
+#   Harry Dove-Robinson <admin@wx-star.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Summed-area tables for constant-time window statistics in the windowed deviation stage"""
+
+import numpy as np
+from numba.core import types as ntypes
+from numba.experimental import jitclass
+
+# validations recorded since the last table build before the tables are rebuilt
+max_pending = 256
+
+spec = [
+    ("c02_rf", ntypes.float32[:, ::1]),
+    ("c05_rf", ntypes.float32[:, ::1]),
+    ("c07_rf", ntypes.float32[:, ::1]),
+    ("c14_bt", ntypes.float32[:, ::1]),
+    ("discard_mask", ntypes.boolean[:, ::1]),
+    ("max_radius", ntypes.int64),
+    ("strip_rows", ntypes.int64),
+    ("y0", ntypes.int64),
+    ("y1", ntypes.int64),
+    ("offsets", ntypes.float64[::1]),
+    ("sums", ntypes.float64[:, :, ::1]),
+    ("sumsqs", ntypes.float64[:, :, ::1]),
+    ("counts", ntypes.int32[:, :, ::1]),
+    ("pending", ntypes.int64[:, ::1]),
+    ("num_pending", ntypes.int64),
+]
+
+
+@jitclass(spec)
+class SDCAWindowTables:
+    def __init__(
+        self, c02_rf, c05_rf, c07_rf, c14_bt, discard_mask, max_radius, advance_rows
+    ):
+        self.c02_rf = c02_rf
+        self.c05_rf = c05_rf
+        self.c07_rf = c07_rf
+        self.c14_bt = c14_bt
+        self.discard_mask = discard_mask
+
+        # the tables cover a horizontal strip of the image rather than the full frame to bound memory on full disk scenes,
+        # and are rebuilt from the current discard_mask as the raster-ordered candidates move down the image.
+        # The strip holds the 2 * max_radius + 1 rows of the largest window plus advance_rows, so the candidates can move down advance_rows rows between rebuilds.
+        # Each row of the strip takes 20 bytes per image column for each of the 4 bands, about 210 MB for a full disk C02 scene with the default parameters
+        self.max_radius = max_radius
+        self.strip_rows = min(2 * max_radius + 1 + advance_rows, discard_mask.shape[0])
+        self.y0 = 0
+        self.y1 = 0
+
+        self.offsets = np.zeros(4, dtype=np.float64)
+        self.sums = np.zeros(
+            (4, self.strip_rows + 1, discard_mask.shape[1] + 1), dtype=np.float64
+        )
+        self.sumsqs = np.zeros(
+            (4, self.strip_rows + 1, discard_mask.shape[1] + 1), dtype=np.float64
+        )
+        self.counts = np.zeros(
+            (4, self.strip_rows + 1, discard_mask.shape[1] + 1), dtype=np.int32
+        )
+
+        # pixels added to discard_mask since the tables were built, subtracted from each window query
+        self.pending = np.zeros((max_pending, 2), dtype=np.int64)
+        self.num_pending = 0
+
+    def _band(self, band):
+        if band == 0:
+            return self.c02_rf
+        elif band == 1:
+            return self.c05_rf
+        elif band == 2:
+            return self.c07_rf
+        else:
+            return self.c14_bt
+
+    def build(self, y0):
+        self.y0 = y0
+        self.y1 = min(y0 + self.strip_rows, self.discard_mask.shape[0])
+        self.num_pending = 0
+
+        for band in range(4):
+            arr = self._band(band)
+
+            # shift each band by a representative value so the sums of squares don't lose precision to cancellation
+            self.offsets[band] = 0.0
+            for y in range(self.y0, self.y1):
+                found = False
+                for x in range(arr.shape[1]):
+                    if not self.discard_mask[y, x] and not np.isnan(arr[y, x]):
+                        self.offsets[band] = arr[y, x]
+                        found = True
+                        break
+                if found:
+                    break
+
+            for y in range(self.y0, self.y1):
+                row = y - self.y0 + 1
+                row_sum = 0.0
+                row_sumsq = 0.0
+                row_count = 0
+                for x in range(arr.shape[1]):
+                    if not self.discard_mask[y, x] and not np.isnan(arr[y, x]):
+                        value = arr[y, x] - self.offsets[band]
+                        row_sum += value
+                        row_sumsq += value * value
+                        row_count += 1
+
+                    self.sums[band, row, x + 1] = (
+                        self.sums[band, row - 1, x + 1] + row_sum
+                    )
+                    self.sumsqs[band, row, x + 1] = (
+                        self.sumsqs[band, row - 1, x + 1] + row_sumsq
+                    )
+                    self.counts[band, row, x + 1] = (
+                        self.counts[band, row - 1, x + 1] + row_count
+                    )
+
+    def ensure(self, idx, radius):
+        # rebuild the tables if the window around idx is not covered by the current strip
+        y_min = max(idx[0] - radius, 0)
+        y_max = min(idx[0] + radius + 1, self.discard_mask.shape[0])
+        if y_min < self.y0 or y_max > self.y1:
+            self.build(max(idx[0] - self.max_radius, 0))
+
+    def discard(self, idx):
+        # records a pixel newly added to discard_mask
+        if self.num_pending == max_pending:
+            # too many corrections to apply per query, so mark the tables stale to rebuild them on the next query
+            self.y1 = 0
+            self.num_pending = 0
+            return
+
+        self.pending[self.num_pending, 0] = idx[0]
+        self.pending[self.num_pending, 1] = idx[1]
+        self.num_pending += 1
+
+    def band_statistics(self, band, idx, radius):
+        # mean and standard deviation of the band in the window of radius around idx, excluding idx and discarded pixels
+        radius = np.int64(radius)
+        self.ensure(idx, radius)
+        arr = self._band(band)
+
+        y_min = max(idx[0] - radius, 0)
+        y_max = min(idx[0] + radius + 1, arr.shape[0])
+        x_min = max(idx[1] - radius, 0)
+        x_max = min(idx[1] + radius + 1, arr.shape[1])
+
+        r0 = y_min - self.y0
+        r1 = y_max - self.y0
+        window_sum = (
+            self.sums[band, r1, x_max]
+            - self.sums[band, r0, x_max]
+            - self.sums[band, r1, x_min]
+            + self.sums[band, r0, x_min]
+        )
+        window_sumsq = (
+            self.sumsqs[band, r1, x_max]
+            - self.sumsqs[band, r0, x_max]
+            - self.sumsqs[band, r1, x_min]
+            + self.sumsqs[band, r0, x_min]
+        )
+        window_count = np.int64(
+            self.counts[band, r1, x_max]
+            - self.counts[band, r0, x_max]
+            - self.counts[band, r1, x_min]
+            + self.counts[band, r0, x_min]
+        )
+
+        # remove the center pixel, which is never part of its own statistical background
+        if not self.discard_mask[idx] and not np.isnan(arr[idx]):
+            value = arr[idx] - self.offsets[band]
+            window_sum -= value
+            window_sumsq -= value * value
+            window_count -= 1
+
+        # remove pixels discarded since the tables were built
+        for i in range(self.num_pending):
+            y = self.pending[i, 0]
+            x = self.pending[i, 1]
+            if y < y_min or y >= y_max or x < x_min or x >= x_max:
+                continue
+
+            if not np.isnan(arr[y, x]):
+                value = arr[y, x] - self.offsets[band]
+                window_sum -= value
+                window_sumsq -= value * value
+                window_count -= 1
+
+        if window_count == 0:
+            return np.nan, np.nan
+
+        mean = window_sum / window_count
+        variance = max(window_sumsq / window_count - mean * mean, 0.0)
+
+        return mean + self.offsets[band], np.sqrt(variance)
+
+    def window_statistics(self, idx, radius):
+        c02_rf_mean, c02_rf_stdev = self.band_statistics(0, idx, radius)
+        c05_rf_mean, c05_rf_stdev = self.band_statistics(1, idx, radius)
+        c07_rf_mean, c07_rf_stdev = self.band_statistics(2, idx, radius)
+        c14_bt_mean, c14_bt_stdev = self.band_statistics(3, idx, radius)
+
+        return (
+            c02_rf_mean,
+            c05_rf_mean,
+            c07_rf_mean,
+            c14_bt_mean,
+            c02_rf_stdev,
+            c05_rf_stdev,
+            c07_rf_stdev,
+            c14_bt_stdev,
+        )
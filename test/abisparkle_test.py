@@ -17,11 +17,28 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+import json
+import shutil
 from pathlib import Path
 
 import cv2
+import netCDF4
 import numpy as np
-from abisparkle import sdca
+from heregoes.util import crop_center
+from scipy import ndimage
+
+from abisparkle import (
+    sdca,
+    sparklealgo,
+    sparklebits,
+    sparkleflags,
+    sparkleimage,
+    sparklemask,
+    sparklenav,
+    sparkleproduct,
+    sparklestats,
+)
 
 SCRIPT_PATH = Path(__file__).parent.resolve()
 input_dir = SCRIPT_PATH.joinpath("input")
@@ -30,7 +47,10 @@ output_dir = SCRIPT_PATH.joinpath("output")
 output_dir.mkdir(parents=True, exist_ok=True)
 
 for output_file in output_dir.glob("*"):
-    output_file.unlink()
+    if output_file.is_dir():
+        shutil.rmtree(output_file)
+    else:
+        output_file.unlink()
 
 
 c02_nc = input_dir.joinpath(
@@ -332,7 +352,7 @@ def test_border_and_water_and_cloud():
             sparkle.SDCAFlags.algo_flag_def["pixel_skipped_by_cloud_mask"],
         )
         == sparkle.cloud_mask[border_and_water_and_cloud_idx]
-        == sparkle.SDCAMask.skip_mask[border_and_water_and_cloud_idx]
+        == sparkle.SDCAMask.packed_skip_mask.get(border_and_water_and_cloud_idx)
         == True
     )
     assert (
@@ -341,7 +361,7 @@ def test_border_and_water_and_cloud():
             sparkle.SDCAFlags.algo_flag_def["pixel_preinvalidated_by_water_mask"],
         )
         == ~sparkle.water_mask[border_and_water_and_cloud_idx]
-        == sparkle.SDCAMask.invalidated_mask[border_and_water_and_cloud_idx]
+        == sparkle.SDCAMask.packed_invalidated_mask.get(border_and_water_and_cloud_idx)
         == True
     )
 
@@ -380,3 +400,573 @@ def test_nirrefl():
     assert sparkle.c07_nirrefl.rf.dtype == np.float32
     assert sparkle.c07_nirrefl.rf[cluster_centroid_idx_1].item() == 10.882698059082031
     assert sparkle.c07_nirrefl.rf[cluster_centroid_idx_2].item() == 0.23989787697792053
+
+
+def assert_backend_matches(backend, **kwargs):
+    # test that an algorithm backend reproduces the per-pixel window backend
+    sparkle_backend = sdca.Sparkle(
+        c02_nc,
+        c05_nc,
+        c07_nc,
+        c14_nc,
+        water_mask=sparkle.water_mask,
+        nav=sparkle.nav,
+        backend=backend,
+        **kwargs,
+    )
+    assert np.array_equal(sparkle_backend.valid_sparkles, sparkle.valid_sparkles)
+    assert np.array_equal(
+        sparkle_backend.SDCAFlags.algo_flags, sparkle.SDCAFlags.algo_flags
+    )
+
+    for key in [
+        "c02_rf_deviation",
+        "c05_rf_deviation",
+        "c07_rf_deviation",
+        "c14_bt_deviation",
+        "c02_rf_stdev",
+        "c05_rf_stdev",
+        "c07_rf_stdev",
+        "c14_bt_stdev",
+    ]:
+        assert np.isclose(
+            sparkle_backend.SDCAStats.get_deviation(cluster_centroid_idx_2, key),
+            sparkle.SDCAStats.get_deviation(cluster_centroid_idx_2, key),
+            rtol=1e-5,
+        )
+
+
+def test_sat_backend():
+    assert_backend_matches("sat")
+
+
+def test_tiled_backend():
+    assert_backend_matches("tiled", num_threads=2)
+
+
+def test_dqf_neighbors():
+    # test that pixels invalidated by a DQF neighbor are all within exclude_dqf_radius of a bad DQF
+    dqf_neighbor_mask = sparkle.SDCAFlags.has_flag(
+        sparkle.SDCAFlags.algo_flags,
+        sparkle.SDCAFlags.algo_flag_def["pixel_invalidated_by_dqf_neighbor"],
+    )
+    outside_near_bad_dqf_mask = sparklebits.mask_not(
+        sparkle.SDCAMask.packed_near_bad_dqf_mask
+    )
+    assert (
+        sparklebits.mask_and(
+            sparklebits.pack(dqf_neighbor_mask), outside_near_bad_dqf_mask
+        ).count()
+        == 0
+    )
+    assert (
+        sparklebits.mask_and(
+            sparkle.SDCAMask.packed_bad_dqf_mask, outside_near_bad_dqf_mask
+        ).count()
+        == 0
+    )
+
+
+def test_avoided_reevaluations():
+    # test that the second pass skips candidates whose windows are unchanged, but still flags them as considered on that pass
+    assert sparkle.SDCAStats.get_counter("avoided_reevaluations") > 0
+    second_pass_mask = sparkle.SDCAFlags.has_flag(
+        sparkle.SDCAFlags.algo_flags,
+        sparkle.SDCAFlags.algo_flag_def["flag_offset_algo_passes"] + 2,
+    )
+    assert np.count_nonzero(second_pass_mask) >= sparkle.SDCAStats.get_counter(
+        "avoided_reevaluations"
+    )
+
+    # skipped candidates end with the same flags and validated pixels as re-evaluating every candidate on every pass
+    scene = copy.copy(sparkle)
+    scene.SDCAFlags = sparkleflags.SDCAFlags(sparkle.source_shape)
+    scene_mask = sparklemask.SDCAMask(scene)
+    algo_params = sparkle.SDCAParams.algo_params.copy()
+    algo_params["reuse_unchanged_windows"] = np.float32(0.0)
+    algo_stats = sparklestats.SDCAStats()
+    validated_mask = sparkle.algo(
+        c02_rf=sparkle.c02_image.cmi,
+        c05_rf=sparkle.c05_image.cmi,
+        c07_rf=sparkle.c07_nirrefl.rf,
+        c14_bt=sparkle.c14_image.cmi,
+        validated_mask=scene_mask.packed_validated_mask,
+        discard_mask=scene_mask.discard_mask,
+        skip_mask=scene_mask.packed_skip_mask,
+        near_bad_dqf_mask=scene_mask.packed_near_bad_dqf_mask,
+        algo_params=algo_params,
+        algo_flags=scene.SDCAFlags,
+        algo_stats=algo_stats,
+    )
+    assert algo_stats.get_counter("avoided_reevaluations") == 0
+    assert np.array_equal(validated_mask.unpack(), sparkle.valid_sparkles)
+    assert np.array_equal(scene.SDCAFlags.algo_flags, sparkle.SDCAFlags.algo_flags)
+
+
+def test_frozen_backend():
+    # test that the frozen background backend is compared against the sequential backend over the same candidate pixels
+    sparkle_frozen = sdca.Sparkle(
+        c02_nc,
+        c05_nc,
+        c07_nc,
+        c14_nc,
+        water_mask=sparkle.water_mask,
+        nav=sparkle.nav,
+        backend="frozen",
+    )
+    report = sparkle.SDCADebug.backend_comparison(sparkle_frozen)
+    assert report["num_sparkle_pixels"] == num_sparkle_pixels
+    assert (
+        report["num_agreed"] + report["num_only_other_backend"]
+        == report["other_num_sparkle_pixels"]
+    )
+    assert report["num_differing"] <= report["num_candidates"]
+
+    # the frozen backend stops at a fixed point, so a further pass from its final masks validates nothing new
+    algo_params = sparkle_frozen.SDCAParams.algo_params.copy()
+    algo_params["max_frozen_algo_passes"] = np.float32(1.0)
+    further_validated_mask = sparklealgo.sparkle_frozen(
+        c02_rf=sparkle_frozen.c02_image.cmi,
+        c05_rf=sparkle_frozen.c05_image.cmi,
+        c07_rf=sparkle_frozen.c07_nirrefl.rf,
+        c14_bt=sparkle_frozen.c14_image.cmi,
+        validated_mask=sparklebits.mask_copy(
+            sparkle_frozen.SDCAMask.packed_validated_mask
+        ),
+        discard_mask=sparkle_frozen.SDCAMask.discard_mask.copy(),
+        skip_mask=sparklebits.mask_copy(sparkle_frozen.SDCAMask.packed_skip_mask),
+        near_bad_dqf_mask=sparkle_frozen.SDCAMask.packed_near_bad_dqf_mask,
+        algo_params=algo_params,
+        algo_flags=sparkleflags.SDCAFlags(sparkle_frozen.source_shape),
+        algo_stats=sparklestats.SDCAStats(),
+    )
+    assert np.array_equal(
+        further_validated_mask.unpack(), sparkle_frozen.valid_sparkles
+    )
+
+    # max_frozen_algo_passes is limited to the passes that have a pixel_considered_on_*_pass flag
+    algo_params["max_frozen_algo_passes"] = np.float32(100.0)
+    algo_flags = sparkleflags.SDCAFlags(sparkle_frozen.source_shape)
+    assert algo_flags.num_algo_pass_flags() == 9
+    sparklealgo.sparkle_frozen(
+        c02_rf=sparkle_frozen.c02_image.cmi,
+        c05_rf=sparkle_frozen.c05_image.cmi,
+        c07_rf=sparkle_frozen.c07_nirrefl.rf,
+        c14_bt=sparkle_frozen.c14_image.cmi,
+        validated_mask=sparklebits.mask_copy(
+            sparkle_frozen.SDCAMask.packed_validated_mask
+        ),
+        discard_mask=sparkle_frozen.SDCAMask.discard_mask.copy(),
+        skip_mask=sparklebits.mask_copy(sparkle_frozen.SDCAMask.packed_skip_mask),
+        near_bad_dqf_mask=sparkle_frozen.SDCAMask.packed_near_bad_dqf_mask,
+        algo_params=algo_params,
+        algo_flags=algo_flags,
+        algo_stats=sparklestats.SDCAStats(),
+    )
+    # a tenth pass would be recorded on the window iteration offset, which is never set otherwise
+    assert not algo_flags.has_any_flag(
+        np.array(
+            [algo_flags.algo_flag_def["flag_offset_window_iterations"]],
+            dtype=np.int64,
+        )
+    ).any()
+
+
+def test_unevaluated_tests():
+    # test that every sparkle validation test was evaluated for validated pixels, and that rejected pixels skipped the tests after their first failure
+    assert sparkle.SDCAStats.get_debug(cluster_centroid_idx_2, "unevaluated_tests") == 0
+    assert sparkle.SDCAStats.get_counter(
+        "c14_bt_standard_deviation_evaluations"
+    ) < sparkle.SDCAStats.get_counter("c02_rf_deviation_evaluations") + (
+        sparkle.SDCAStats.get_counter("c05_rf_deviation_evaluations")
+    )
+
+
+def test_compare_backends():
+    # test that the backends that reproduce the per-pixel window backend are reported as equivalent by the harness
+    report = sparkle.compare_backends(names=["window", "sat", "tiled"])
+    for name in ["window", "sat", "tiled"]:
+        assert report[name]["equivalent"]
+        assert report[name]["time"] > 0
+
+
+def test_stats_export():
+    # test that the exported statistics table matches the per-pixel statistics
+    coords, table, assigned = sparkle.SDCAStats.export()
+    row = np.nonzero(
+        (coords[:, 0] == cluster_centroid_idx_2[0])
+        & (coords[:, 1] == cluster_centroid_idx_2[1])
+    )[0][0]
+    assert table[row, sparklestats.c05_rf_deviation_column] == (
+        sparkle.SDCAStats.get_deviation(cluster_centroid_idx_2, "c05_rf_deviation")
+    )
+    assert table[row, sparklestats.window_radius_column] == (
+        sparkle.SDCAStats.get_debug(cluster_centroid_idx_2, "window_radius")
+    )
+    assert np.unique(coords, axis=0).shape[0] == coords.shape[0]
+
+    # the statistics of bands that were not evaluated on a candidate's last evaluation are cleared rather than left from an earlier pass
+    unevaluated_tests = table[:, sparklestats.unevaluated_tests_column].astype(np.int64)
+    for test, column in [
+        (sparklealgo.test_c02_rf_deviation, sparklestats.c02_rf_deviation_column),
+        (sparklealgo.test_c05_rf_deviation, sparklestats.c05_rf_deviation_column),
+        (sparklealgo.test_c07_rf_deviation, sparklestats.c07_rf_deviation_column),
+    ]:
+        unevaluated = (unevaluated_tests & (1 << test)) != 0
+        assert np.isnan(table[unevaluated, column]).all()
+        assert not (assigned[unevaluated] & (1 << column)).any()
+
+
+def test_flag_masks():
+    # test that the multi-flag rasters agree with testing each flag separately
+    flags = (
+        sparkle.SDCAFlags.algo_flag_def["pixel_skipped_by_cloud_mask"],
+        sparkle.SDCAFlags.algo_flag_def["pixel_skipped_by_border_mask"],
+    )
+    cloud_mask = sparkle.SDCAFlags.has_flag(sparkle.SDCAFlags.algo_flags, flags[0])
+    border_mask = sparkle.SDCAFlags.has_flag(sparkle.SDCAFlags.algo_flags, flags[1])
+    assert np.array_equal(
+        sparkle.SDCAFlags.has_any_flag(flags), cloud_mask | border_mask
+    )
+    assert np.array_equal(
+        sparkle.SDCAFlags.has_all_flags(flags), cloud_mask & border_mask
+    )
+    assert sparkle.SDCAFlags.has_all_flags(flags)[border_and_water_and_cloud_idx]
+
+
+def test_packed_masks():
+    # test that the packed masks hold the same pixels as the boolean masks they replace
+    # each boolean mask is unpacked once, since unpacking allocates a full frame
+    bad_dqf_mask = sparkle.SDCAMask.unpack_bad_dqf_mask()
+    invalidated_mask = sparkle.SDCAMask.unpack_invalidated_mask()
+    packed_bad_dqf_mask = sparkle.SDCAMask.packed_bad_dqf_mask
+    assert packed_bad_dqf_mask.count() == np.count_nonzero(bad_dqf_mask)
+    assert np.array_equal(packed_bad_dqf_mask.nonzero(), np.argwhere(bad_dqf_mask))
+    assert np.array_equal(
+        sparklebits.mask_not(packed_bad_dqf_mask).unpack(), ~bad_dqf_mask
+    )
+    assert np.array_equal(
+        sparklebits.mask_or(
+            packed_bad_dqf_mask, sparkle.SDCAMask.packed_invalidated_mask
+        ).unpack(),
+        bad_dqf_mask | invalidated_mask,
+    )
+    assert packed_bad_dqf_mask.window_count(
+        cluster_centroid_idx_1, 20
+    ) == np.count_nonzero(
+        bad_dqf_mask[
+            cluster_centroid_idx_1[0] - 20 : cluster_centroid_idx_1[0] + 21,
+            cluster_centroid_idx_1[1] - 20 : cluster_centroid_idx_1[1] + 21,
+        ]
+    )
+
+    # the near bad DQF mask is dilated without unpacking, and should match a square maximum filter
+    exclude_dqf_radius = int(sparkle.SDCAParams.algo_params["exclude_dqf_radius"])
+    assert np.array_equal(
+        sparkle.SDCAMask.unpack_near_bad_dqf_mask(),
+        ndimage.maximum_filter(
+            bad_dqf_mask, size=2 * exclude_dqf_radius + 1, mode="constant", cval=0
+        ),
+    )
+
+
+def test_vectorized_meta():
+    # metadata computed over all sparkle pixels at once should match the per-pixel values
+    for i in sparkle.SDCAMeta.algo_meta:
+        idx = (i["y"], i["x"])
+        assert i["lat"] == float(np.round(sparkle.nav.lat_deg[idx].item(), 5))
+        assert i["nav"]["omega_deg"] == float(
+            np.round(np.rad2deg(sparkle.nav.omega[idx].item()), 5)
+        )
+        assert i["rfs"]["c02"] == float(np.round(sparkle.c02_image.cmi[idx].item(), 7))
+        assert i["devs"]["c14_bt"] == float(
+            np.round(float(sparkle.SDCAStats.get_deviation(idx, "c14_bt_deviation")), 5)
+        )
+        assert i["devs"]["c02_rf"] == float(
+            np.round(float(sparkle.SDCAStats.get_deviation(idx, "c02_rf_deviation")), 7)
+        )
+        assert i["stdevs"]["c02_rf"] == float(
+            np.round(float(sparkle.SDCAStats.get_deviation(idx, "c02_rf_stdev")), 7)
+        )
+        assert i["dqfs"]["c07"] == int(sparkle.c07_image.dqf[idx].item())
+
+
+def test_meta_records():
+    # test that records built on demand from the metadata columns agree between each lookup
+    meta = sparkle.SDCAMeta
+    assert len(list(meta.records())) == num_sparkle_pixels
+    assert meta.get_idx((0, 0)) is None
+    for cluster in meta.get_clusters():
+        members = meta.get_cluster_members(cluster["id"])
+        assert len(members) == cluster["size"]
+        assert all(i["cluster"] == cluster for i in members)
+        assert members[0] == meta.get_idx((members[0]["y"], members[0]["x"]))
+
+
+def test_write_events():
+    # test that streamed events match the records they serialize
+    events_ndjson = output_dir.joinpath("events.ndjson")
+    sparkle.SDCAMeta.write_events(events_ndjson)
+    events = [json.loads(i) for i in events_ndjson.read_text().splitlines()]
+    assert events == list(sparkle.SDCAMeta.records())
+
+    events_geojson = output_dir.joinpath("clusters.geojson")
+    sparkle.SDCAMeta.write_events(
+        events_geojson, format="geojson", verbosity="clusters"
+    )
+    features = json.loads(events_geojson.read_text())["features"]
+    assert [i["properties"] for i in features] == sparkle.SDCAMeta.get_clusters()
+    assert features[0]["geometry"]["coordinates"] == [
+        features[0]["properties"]["centroid_lon"],
+        features[0]["properties"]["centroid_lat"],
+    ]
+
+
+def test_product():
+    # test that the netCDF4 product round-trips the flags, masks and cluster labels
+    product_nc = output_dir.joinpath("sparkle_product.nc")
+    sparkle.SDCAProduct.write(product_nc)
+    y, x = cluster_centroid_idx_1
+    region = (slice(y - 10, y + 11), slice(x - 10, x + 11))
+    assert np.array_equal(
+        sparkleproduct.read_region(product_nc, "algo_flags", *region),
+        sparkle.SDCAFlags.algo_flags[region],
+    )
+    assert np.array_equal(
+        sparkleproduct.read_region(product_nc, "validated_mask", *region),
+        sparkle.valid_sparkles[region],
+    )
+    assert np.array_equal(
+        sparkleproduct.read_region(product_nc, "cluster_label", *region),
+        sparkle.SDCAMeta.valid_clusters[region],
+    )
+
+
+def test_empty_product():
+    # test that a scene without sparkles or candidates writes a product without the cluster and candidate dimensions
+    scene = copy.copy(sparkle)
+    scene.valid_sparkles = np.zeros(sparkle.source_shape, dtype=np.bool_)
+    scene.SDCAMeta = copy.copy(sparkle.SDCAMeta)
+    scene.SDCAMeta.num_clusters = 0
+    scene.SDCAMeta.valid_clusters = np.zeros(sparkle.source_shape, dtype=np.int32)
+    scene.SDCAStats = sparklestats.SDCAStats()
+
+    product_nc = output_dir.joinpath("empty_product.nc")
+    sparkleproduct.SDCAProduct(scene).write(product_nc)
+    with netCDF4.Dataset(product_nc, "r") as ds:
+        assert ds.num_clusters == 0
+        assert ds.num_candidates == 0
+        assert "cluster" not in ds.dimensions
+        assert "candidate" not in ds.dimensions
+        assert not any(i.isunlimited() for i in ds.dimensions.values())
+    assert not sparkleproduct.read_region(
+        product_nc, "validated_mask", slice(None), slice(None)
+    ).any()
+
+
+def test_debug_image():
+    # test that the one-pass debug image matches painting each category over the last
+    flags = sparkle.SDCAFlags
+    expected = np.zeros(sparkle.source_shape + (3,), dtype=np.uint8)
+    for category, any_flags, excluded_flags in sparkle.SDCAImage.debug_categories:
+        mask = flags.has_any_flag(
+            np.array([flags.algo_flag_def[i] for i in any_flags], dtype=np.int64)
+        )
+        if excluded_flags:
+            mask &= ~flags.has_any_flag(
+                np.array(
+                    [flags.algo_flag_def[i] for i in excluded_flags], dtype=np.int64
+                )
+            )
+        expected[mask] = sparkle.SDCAImage.color_map[category][0:3]
+    expected[sparkle.valid_sparkles] = sparkle.SDCAImage.color_map["valid_sparkle"][0:3]
+
+    any_bits, excluded_bits, palette = sparkle.SDCAImage.debug_priority_table()
+    assert np.array_equal(
+        sparkleimage.debug_category_image(
+            flags.algo_flags,
+            sparkle.valid_sparkles,
+            any_bits,
+            excluded_bits,
+            palette,
+            np.array(sparkle.SDCAImage.color_map["valid_sparkle"][0:3], dtype=np.uint8),
+        ),
+        expected,
+    )
+
+
+def test_crops():
+    # test that crops rendered from windows match crops of the full-resolution images
+    crops = sparkle.SDCAImage.get_all_crops(
+        ["debug_image", "c02_rf_sparkle", "c07_rf_dqf"]
+    )
+    for img, img_crops in crops.items():
+        assert len(img_crops) == num_sparkle_clusters
+        for cluster_id, cluster_idx in sparkle.SDCAMeta.cluster_map.items():
+            assert np.array_equal(
+                img_crops[cluster_id],
+                crop_center(getattr(sparkle.SDCAImage, img), cluster_idx, (201, 201)),
+            )
+
+    # windows only draw the cluster rectangles whose bounds intersect them
+    assert sparkle.SDCAImage.cluster_rectangle_bounds.shape == (
+        len(sparkle.SDCAImage.cluster_rectangles),
+        4,
+    )
+
+
+def test_sparkle_overlays():
+    # test that every band rendered into preallocated outputs matches overlaying the full sparkle image
+    out = {
+        "c02_rf": np.zeros(sparkle.source_shape + (3,), dtype=np.uint8),
+        "c14_bt": np.zeros(sparkle.source_shape + (3,), dtype=np.uint8),
+    }
+    rendered = sparkle.SDCAImage.render_sparkle_images(["c02_rf", "c14_bt"], out=out)
+    assert rendered["c02_rf"] is out["c02_rf"]
+
+    opaque = sparkle.SDCAImage.sparkle_image[:, :, 3] == 255
+    for band, bv in [
+        ("c02_rf", sparkle.c02_image.bv),
+        ("c14_bt", sparkle.c14_image.bv),
+    ]:
+        expected = np.stack((bv,) * 3, axis=-1)
+        expected[opaque] = sparkle.SDCAImage.sparkle_image[opaque][:, :3]
+        assert np.array_equal(rendered[band], expected)
+
+
+def test_dqf_image():
+    # test that the palette lookup matches coloring each DQF value in turn, and that composition matches overlaying it
+    dqf = sparkle.c02_image.dqf
+    expected = np.stack((dqf,) * 4, axis=-1).astype(np.uint8)
+    expected[expected[:, :, 3] == 1] = [0, 0, 255, 255]
+    expected[expected[:, :, 3] == 2] = [0, 255, 0, 255]
+    expected[expected[:, :, 3] == 3] = [255, 0, 0, 255]
+    expected[expected[:, :, 3] == 4] = [255, 0, 255, 255]
+    assert np.array_equal(sparkleimage.dqf_image(dqf), expected)
+
+    assert np.array_equal(
+        sparkleimage.overlay_dqf(sparkle.c02_image.bv, dqf),
+        sparkleimage.overlay(sparkle.c02_image.bv, expected),
+    )
+
+
+def test_export():
+    # test that exported images are written once each and match their properties
+    timings = sparkle.SDCAImage.export(
+        output_dir,
+        imgs=["c02_rf_sparkle", "c14_bt_dqf", "debug_image"],
+        format="png",
+        quality=1,
+        num_threads=2,
+    )
+    assert len(timings) == 3
+    for img, timing in timings.items():
+        assert timing["render"] >= 0 and timing["encode"] >= 0
+        assert np.array_equal(
+            cv2.imread(str(timing["path"])), getattr(sparkle.SDCAImage, img)
+        )
+
+    # images that were not rendered before are rendered on the pool without caching them
+    uncached_image = sparkleimage.SDCAImage(sparkle)
+    uncached_dir = output_dir.joinpath("uncached_export")
+    timings = uncached_image.export(
+        uncached_dir,
+        imgs=["c05_rf_sparkle", "c07_rf_dqf", "debug_image"],
+        format="png",
+        quality=1,
+        num_threads=3,
+    )
+    assert uncached_image._debug_image is None
+    for img, timing in timings.items():
+        assert np.array_equal(
+            cv2.imread(str(timing["path"])), getattr(sparkle.SDCAImage, img)
+        )
+
+
+def test_pyramid():
+    # test that each pyramid level halves the last, and that sparkles remain visible at every level
+    shapes = sparkle.SDCAImage.write_pyramid(
+        output_dir, img="debug_image", tile_size=512
+    )
+    assert shapes[0] == sparkle.source_shape
+    for shape, next_shape in zip(shapes, shapes[1:]):
+        assert next_shape == ((shape[0] + 1) // 2, (shape[1] + 1) // 2)
+    assert max(shapes[-1]) <= 512
+
+    valid_sparkle_color = sparkle.SDCAImage.color_map["valid_sparkle"][0:3]
+    for level in range(len(shapes)):
+        tiles = [
+            cv2.imread(str(tile))
+            for tile in output_dir.joinpath("debug_image", str(level)).glob("*.png")
+        ]
+        assert any(
+            np.any(np.all(tile == valid_sparkle_color, axis=-1)) for tile in tiles
+        )
+
+    # the transparent sparkle image keeps opaque sparkle pixels at every level
+    rgba_shapes = sparkle.SDCAImage.write_pyramid(
+        output_dir, img="sparkle_image", tile_size=512
+    )
+    assert rgba_shapes == shapes
+    tiles = [
+        cv2.imread(str(tile), cv2.IMREAD_UNCHANGED)
+        for tile in output_dir.joinpath(
+            "sparkle_image", str(len(rgba_shapes) - 1)
+        ).glob("*.png")
+    ]
+    assert all(tile.shape[2] == 4 for tile in tiles)
+    assert any(np.any(tile[..., 3] > 0) for tile in tiles)
+
+
+def test_nav_cache():
+    # test that mesoscale sectors aren't cached, and that cached fields round-trip through memory-mapped files
+    nav_cache = sparklenav.NavigationCache(output_dir.joinpath("nav_cache"))
+    assert nav_cache.key(sparkle.source_abi_data) is None
+    assert isinstance(
+        nav_cache.get(sparkle.source_abi_data), sparklenav.SparkleNavigation
+    )
+
+    entry_dir = output_dir.joinpath("nav_cache", "M1")
+    nav_cache.store(entry_dir, sparkle.nav)
+    for field in nav_cache.static_fields:
+        cached = np.load(entry_dir.joinpath(field + ".npy"), mmap_mode="r")
+        assert cached.dtype == np.float32
+        assert np.allclose(
+            cached, getattr(sparkle.nav, field), equal_nan=True, rtol=1e-6
+        )
+
+
+class FixedSectorData:
+    # presents the mesoscale test scene as a Full Disk scene so that the navigation cache stores its fixed grid
+    scene_id = "Full Disk"
+
+    def __init__(self, abi_data):
+        self.abi_data = abi_data
+
+    def __getattr__(self, name):
+        return getattr(self.abi_data, name)
+
+    def __getitem__(self, key):
+        return self.abi_data[key]
+
+
+def test_nav_cache_fixed_sector():
+    # test that the first scan of a fixed sector is calculated and cached, and that later scans are navigated from the cache
+    nav_cache = sparklenav.NavigationCache(output_dir.joinpath("nav_cache_fixed"))
+    abi_data = FixedSectorData(sparkle.source_abi_data)
+    assert nav_cache.key(abi_data) is not None
+
+    nav = nav_cache.get(abi_data)
+    assert not isinstance(nav, sparklenav.FastSparkleNavigation)
+    assert output_dir.joinpath("nav_cache_fixed", nav_cache.key(abi_data)).exists()
+
+    cached_nav = nav_cache.get(abi_data)
+    assert isinstance(cached_nav, sparklenav.FastSparkleNavigation)
+    for field in ["sat_za", "sun_za", "glint_angle", "area_m"]:
+        assert np.allclose(
+            np.ma.filled(getattr(cached_nav, field), np.nan),
+            np.ma.filled(getattr(nav, field), np.nan),
+            equal_nan=True,
+            rtol=1e-5,
+            atol=1e-6,
+        )